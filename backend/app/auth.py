@@ -1,3 +1,6 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Any
 
@@ -5,10 +8,25 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 
 from .config import get_settings
+from .services.cache import TTLCache
 
 pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 settings = get_settings()
 
+# pbkdf2_sha256单次计算耗时数十毫秒，放到独立线程池中执行，避免阻塞事件循环；
+# 信号量限制同时进行（含排队）的计算数量，突发登录时多余的请求在协程中等待
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hash",
+)
+_hash_semaphore = asyncio.Semaphore(settings.PASSWORD_HASH_CONCURRENCY)
+
+# 已验证的令牌缓存到其exp为止，避免每个请求重复做签名校验
+_token_cache = TTLCache(
+    maxsize=settings.AUTH_CACHE_SIZE,
+    ttl=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60 if settings.AUTH_CACHE_TTL > 0 else 0,
+)
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """校验密码"""
@@ -20,6 +38,22 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """在哈希线程池中校验密码"""
+    async with _hash_semaphore:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _hash_executor, verify_password, plain_password, hashed_password
+        )
+
+
+async def get_password_hash_async(password: str) -> str:
+    """在哈希线程池中生成密码哈希"""
+    async with _hash_semaphore:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor, get_password_hash, password)
+
+
 def create_access_token(
     data: dict[str, Any],
     expires_delta: timedelta | None = None,
@@ -51,3 +85,19 @@ def decode_access_token(token: str) -> dict[str, Any] | None:
         return payload
     except JWTError:
         return None
+
+
+def decode_access_token_cached(token: str) -> dict[str, Any] | None:
+    """解析JWT令牌，校验通过的结果缓存至令牌过期"""
+    payload = _token_cache.get(token)
+    if payload is not None:
+        return payload
+    payload = decode_access_token(token)
+    if payload is None:
+        return None
+    exp = payload.get("exp")
+    expires_at = None
+    if exp is not None:
+        expires_at = time.monotonic() + (float(exp) - time.time())
+    _token_cache.set(token, payload, expires_at)
+    return payload
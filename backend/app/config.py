@@ -6,6 +6,8 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+DEFAULT_QWEN_API_BASE = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+
 
 class Settings:
     """全局配置，从环境变量中读取"""
@@ -20,17 +22,87 @@ class Settings:
     MILVUS_PORT: str = os.getenv("MILVUS_PORT", "19530")
     MILVUS_DATABASE: str = os.getenv("MILVUS_DATABASE", "itcast")
     MILVUS_COLLECTION: str = os.getenv("MILVUS_COLLECTION", "innerQA")
+    # Milvus索引：auto时按向量数选择FLAT/HNSW/IVF_SQ8，也可固定为FLAT、HNSW、IVF_FLAT或IVF_SQ8；
+    # 每写入MILVUS_INDEX_CHECK_ROWS行检查一次是否需要按新规模重建索引
+    MILVUS_INDEX_TYPE: str = os.getenv("MILVUS_INDEX_TYPE", "auto")
+    MILVUS_INDEX_CHECK_ROWS: int = int(os.getenv("MILVUS_INDEX_CHECK_ROWS", "10000"))
 
     QWEN_API_KEY: str = os.getenv("QWEN_API_KEY", "")
     QWEN_MODEL: str = os.getenv("QWEN_MODEL", "qwen-max")
+    # OpenAI兼容接口地址；测试模式下只有改为非默认地址（如本地模拟服务）时才会真实调用
+    QWEN_API_BASE: str = os.getenv("QWEN_API_BASE", DEFAULT_QWEN_API_BASE)
+    # 大模型流式调用的读超时（两个片段之间的最长间隔）与连接超时（秒）
+    QWEN_TIMEOUT: float = float(os.getenv("QWEN_TIMEOUT", "60"))
+    QWEN_CONNECT_TIMEOUT: float = float(os.getenv("QWEN_CONNECT_TIMEOUT", "10"))
+    # 对冲请求（默认关闭）：LLM_HEDGE_AFTER大于0时，该秒数内未收到首个片段则再发起一路请求，
+    # 采用先返回的一路；对冲路径默认使用QWEN_MODEL，LLM_HEDGE_MODEL可另行指定
+    LLM_HEDGE_AFTER: float = float(os.getenv("LLM_HEDGE_AFTER", "0"))
+    LLM_HEDGE_MODEL: str = os.getenv("LLM_HEDGE_MODEL", "")
     MAX_HISTORY_ROUNDS: int = int(os.getenv("MAX_HISTORY_ROUNDS", "5"))
+    # 提示词预算：知识库上下文与历史对话共享，单位为token或char
+    PROMPT_BUDGET: int = int(os.getenv("PROMPT_BUDGET", "6000"))
+    PROMPT_BUDGET_UNIT: str = os.getenv("PROMPT_BUDGET_UNIT", "token")
+    # 历史对话最多占用的预算比例，其余留给知识库上下文
+    HISTORY_BUDGET_RATIO: float = float(os.getenv("HISTORY_BUDGET_RATIO", "0.4"))
+    # 进程内缓存最近对话的会话数；超出MAX_HISTORY_ROUNDS的更早轮次压缩为滚动摘要，
+    # 摘要长度不超过HISTORY_SUMMARY_BUDGET（单位同PROMPT_BUDGET_UNIT）
+    HISTORY_CACHE_SESSIONS: int = int(os.getenv("HISTORY_CACHE_SESSIONS", "1024"))
+    HISTORY_SUMMARY_BUDGET: int = int(os.getenv("HISTORY_SUMMARY_BUDGET", "300"))
+    # 删除知识库与会话时每批删除的行数（每批一个事务）
+    BULK_DELETE_BATCH_SIZE: int = int(os.getenv("BULK_DELETE_BATCH_SIZE", "5000"))
+    # 大模型调用的并发上限（按429与首token延迟在MIN与MAX之间自适应）、全局排队上限与最长排队时间（秒）
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+    LLM_MIN_CONCURRENCY: int = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+    LLM_MAX_QUEUE: int = int(os.getenv("LLM_MAX_QUEUE", "100"))
+    LLM_QUEUE_TIMEOUT: float = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+    # 流式回答缓冲：回答结束后保留STREAM_BUFFER_TTL秒供断线续传，最多STREAM_BUFFER_MAX个；
+    # 客户端断开后生成继续STREAM_RESUME_GRACE秒等待重连
+    STREAM_BUFFER_TTL: float = float(os.getenv("STREAM_BUFFER_TTL", "300"))
+    STREAM_BUFFER_MAX: int = int(os.getenv("STREAM_BUFFER_MAX", "1000"))
+    STREAM_RESUME_GRACE: float = float(os.getenv("STREAM_RESUME_GRACE", "30"))
 
     JWT_SECRET_KEY: str = os.getenv("JWT_SECRET_KEY", "CHANGE_ME")
     JWT_ALGORITHM: str = os.getenv("JWT_ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(
         os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "120")
     )
+    # 已认证用户的缓存有效期（秒）与容量，有效期为0时关闭令牌与用户缓存
+    AUTH_CACHE_TTL: float = float(os.getenv("AUTH_CACHE_TTL", "30"))
+    AUTH_CACHE_SIZE: int = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+    # 密码哈希线程池大小与同时进行（含排队）的哈希计算上限
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+    PASSWORD_HASH_CONCURRENCY: int = int(os.getenv("PASSWORD_HASH_CONCURRENCY", "16"))
+    # 图形验证码有效期（秒）、存储上限与预渲染池大小
+    CAPTCHA_TTL: float = float(os.getenv("CAPTCHA_TTL", "300"))
+    CAPTCHA_STORE_SIZE: int = int(os.getenv("CAPTCHA_STORE_SIZE", "10000"))
+    CAPTCHA_POOL_SIZE: int = int(os.getenv("CAPTCHA_POOL_SIZE", "64"))
+    # 是否采集请求与RAG各阶段耗时指标（/api/metrics），以及是否输出Server-Timing响应头
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "1") == "1"
+    SERVER_TIMING: bool = os.getenv("SERVER_TIMING", "0") == "1"
     TESTING: bool = os.getenv("TESTING", "0") == "1"
+    # 进程角色：all挂载全部接口；chat只挂载认证、对话与任务接口；ingest只挂载认证、知识库与任务接口。
+    # 按角色分开部署时由反向代理按路径把/api/chat与/api/knowledge分发到对应进程
+    WORKER_ROLE: str = os.getenv("WORKER_ROLE", "all")
+    # 启动预热：填充数据库连接池、加载向量与关键词索引、回放最近WARMUP_QUESTIONS个用户问题，
+    # 完成或超过WARMUP_TIMEOUT秒后/api/health/ready才返回就绪；WARMUP_ENABLED=0时启动即就绪
+    WARMUP_ENABLED: bool = os.getenv("WARMUP_ENABLED", "1") == "1"
+    WARMUP_DB_CONNECTIONS: int = int(os.getenv("WARMUP_DB_CONNECTIONS", "5"))
+    WARMUP_QUESTIONS: int = int(os.getenv("WARMUP_QUESTIONS", "50"))
+    WARMUP_TIMEOUT: float = float(os.getenv("WARMUP_TIMEOUT", "120"))
+    # 知识库快照导出时每批读取并编码的文档块数（每批为快照中的一个压缩数据块）
+    SNAPSHOT_BATCH_SIZE: int = int(os.getenv("SNAPSHOT_BATCH_SIZE", "2000"))
+    # 本地持久化数据（关键词索引、本地向量库等）的根目录
+    DATA_DIR: str = os.getenv("DATA_DIR", "./storage")
+    # 本地向量库（未连接Milvus时使用）：向量数达到LOCAL_ANN_MIN_ROWS后建立IVF近似索引，
+    # LOCAL_ANN_NLIST为0时按向量数自动确定列表数，LOCAL_ANN_NPROBE为检索时探查的列表数
+    LOCAL_ANN_MIN_ROWS: int = int(os.getenv("LOCAL_ANN_MIN_ROWS", "20000"))
+    LOCAL_ANN_NLIST: int = int(os.getenv("LOCAL_ANN_NLIST", "0"))
+    LOCAL_ANN_NPROBE: int = int(os.getenv("LOCAL_ANN_NPROBE", "16"))
+    # 建立索引时的向量编码：float32（不压缩）、int8（标量量化）或pq（乘积量化，LOCAL_PQ_SUBVECTORS字节/向量）；
+    # 有损编码检索后从原始向量精确重排前LOCAL_VECTOR_RERANK*top_k个候选，为0时不重排
+    LOCAL_VECTOR_CODEC: str = os.getenv("LOCAL_VECTOR_CODEC", "float32")
+    LOCAL_VECTOR_RERANK: int = int(os.getenv("LOCAL_VECTOR_RERANK", "4"))
+    LOCAL_PQ_SUBVECTORS: int = int(os.getenv("LOCAL_PQ_SUBVECTORS", "32"))
 
     @property
     def sqlalchemy_database_uri(self) -> str:
@@ -1,16 +1,43 @@
-from typing import Annotated
+from typing import Annotated, NamedTuple
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import event, select
 
-from .auth import decode_access_token
+from .auth import decode_access_token_cached
+from .config import get_settings
 from .db import get_db
 from .models import User
+from .services.cache import TTLCache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+settings = get_settings()
+
+
+class _CachedUser(NamedTuple):
+    """认证缓存中保存的用户字段：不可变，不绑定任何数据库会话"""
+
+    id: int
+    username: str
+    is_active: bool
+
+
+# 以(用户ID, 令牌)为键缓存已认证用户的字段，短有效期内免去每个请求的用户查询
+_user_cache = TTLCache(maxsize=settings.AUTH_CACHE_SIZE, ttl=settings.AUTH_CACHE_TTL)
+
+
+def invalidate_user(user_id: int) -> None:
+    """使指定用户的全部认证缓存失效（禁用用户等场景）"""
+    _user_cache.discard_where(lambda key: key[0] == user_id)
+
+
+@event.listens_for(User.is_active, "set")
+def _on_user_active_set(target: User, value, oldvalue, initiator) -> None:
+    if target.id is not None and not value:
+        invalidate_user(target.id)
+
 
 async def get_current_user(
     token: Annotated[str, Depends(oauth2_scheme)],
@@ -22,16 +49,23 @@ async def get_current_user(
         detail="认证失败，请重新登录",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    payload = decode_access_token(token)
+    payload = decode_access_token_cached(token)
     if payload is None:
         raise credentials_exception
     user_id: int | None = payload.get("sub")  # type: ignore[assignment]
     if user_id is None:
         raise credentials_exception
 
+    cache_key = (int(user_id), token)
+    cached = _user_cache.get(cache_key)
+    if cached is not None:
+        # 每个请求构造新的User，不在请求之间共享绑定了其他会话的ORM对象
+        return User(id=cached.id, username=cached.username, is_active=cached.is_active)
+
     result = await db.execute(select(User).where(User.id == int(user_id)))
     user = result.scalar_one_or_none()
     if user is None or not user.is_active:
         raise credentials_exception
+    _user_cache.set(cache_key, _CachedUser(user.id, user.username, user.is_active))
     return user
 
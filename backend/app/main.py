@@ -1,15 +1,46 @@
+import asyncio
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
-from .routers import api_router
+from .config import get_settings
+from .metrics import MetricsMiddleware
+from .routers import build_api_router
+from .services.bulk_delete import resume_deletes
+from .services.warmup import warmup
 
+# 各进程角色负责恢复的删除任务
+ROLE_DELETE_KINDS = {
+    "all": ("knowledge_base", "chat_session"),
+    "chat": ("chat_session",),
+    "ingest": ("knowledge_base",),
+}
 
-def create_app() -> FastAPI:
-    """创建FastAPI应用实例"""
-    app = FastAPI(title="文旅智能问答系统", version="1.0.0")
+
+def create_app(role: str | None = None) -> FastAPI:
+    """创建FastAPI应用实例，role为进程角色（默认取WORKER_ROLE）"""
+    settings = get_settings()
+    role = role or settings.WORKER_ROLE
+
+    @asynccontextmanager
+    async def lifespan(_: FastAPI):
+        # 预热在后台进行，期间存活检查正常、就绪检查返回503
+        task = None
+        if settings.WARMUP_ENABLED:
+            task = asyncio.create_task(warmup.run(role))
+        else:
+            warmup.mark_ready()
+        # 数据库中标记为删除中的对象（如删除期间进程重启）重新提交删除任务
+        resume = asyncio.create_task(resume_deletes(ROLE_DELETE_KINDS.get(role, ())))
+        yield
+        for t in (task, resume):
+            if t is not None and not t.done():
+                t.cancel()
+
+    app = FastAPI(title="文旅智能问答系统", version="1.0.0", lifespan=lifespan)
 
     app.add_middleware(
         CORSMiddleware,
@@ -17,9 +48,11 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["Server-Timing"],
     )
+    app.add_middleware(MetricsMiddleware)
 
-    app.include_router(api_router)
+    app.include_router(build_api_router(role))
 
     dist_path = Path(__file__).resolve().parents[2] / "frontend" / "dist"
     if dist_path.exists():
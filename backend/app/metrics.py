@@ -0,0 +1,251 @@
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Sequence
+
+from .config import get_settings
+
+settings = get_settings()
+
+# 延迟直方图的默认分桶（秒），覆盖毫秒级的缓存命中到分钟级的大文件入库
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+    0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)  # fmt: skip
+
+# 当前请求已完成的阶段耗时，供Server-Timing响应头使用
+_request_timings: contextvars.ContextVar[list[tuple[str, float]] | None] = (
+    contextvars.ContextVar("request_timings", default=None)
+)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Prometheus风格的累计分桶直方图"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: dict[tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            items = [(k, [list(v[0]), v[1], v[2]]) for k, v in self._series.items()]
+        for labels, (counts, total, count) in sorted(items):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _format_labels(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {count}")
+            suffix = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+class Counter:
+    """Prometheus风格的计数器"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+        ]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    """Prometheus风格的仪表值"""
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+_registry: list[Histogram | Counter] = []
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Histogram:
+    metric = Histogram(name, documentation, labelnames)
+    _registry.append(metric)
+    return metric
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    metric = Counter(name, documentation, labelnames)
+    _registry.append(metric)
+    return metric
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    metric = Gauge(name, documentation, labelnames)
+    _registry.append(metric)
+    return metric
+
+
+def render_metrics() -> str:
+    """按Prometheus文本格式导出全部指标"""
+    lines: list[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = histogram(
+    "rag_stage_duration_seconds",
+    "RAG流水线各阶段耗时",
+    ("pipeline", "stage"),
+)
+REQUEST_SECONDS = histogram(
+    "http_request_duration_seconds",
+    "HTTP请求总耗时（流式响应包含完整的流式输出时间）",
+    ("method", "route", "status"),
+)
+
+
+def record_stage(pipeline: str, stage: str, seconds: float) -> None:
+    """记录一个阶段的耗时，并计入当前请求的Server-Timing"""
+    if not settings.METRICS_ENABLED:
+        return
+    STAGE_SECONDS.observe(seconds, pipeline, stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+class _StageTimer:
+    __slots__ = ("pipeline", "stage", "start")
+
+    def __init__(self, pipeline: str, stage: str):
+        self.pipeline = pipeline
+        self.stage = stage
+
+    def __enter__(self) -> "_StageTimer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        record_stage(self.pipeline, self.stage, time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullTimer":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def stage(pipeline: str, name: str) -> _StageTimer | _NullTimer:
+    """计时上下文：with stage("chat", "embedding"): ...，关闭指标时为空操作"""
+    if not settings.METRICS_ENABLED:
+        return _NULL_TIMER
+    return _StageTimer(pipeline, name)
+
+
+def _server_timing_header(timings: list[tuple[str, float]], total: float) -> bytes:
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings]
+    parts.append(f"app;dur={total * 1000:.1f}")
+    return ", ".join(parts).encode("latin-1")
+
+
+class MetricsMiddleware:
+    """记录请求耗时，并可选地在响应头中输出Server-Timing
+
+    流式响应的响应头在首个数据帧之前发送，因此Server-Timing只包含
+    开始输出之前已完成的阶段（检索、历史等），生成阶段只计入直方图。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        timings: list[tuple[str, float]] = []
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if settings.SERVER_TIMING:
+                    header = _server_timing_header(timings, time.perf_counter() - start)
+                    message = {
+                        **message,
+                        "headers": [*message.get("headers", []), (b"server-timing", header)],
+                    }
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_timings.reset(token)
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status_code),
+            )
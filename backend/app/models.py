@@ -5,6 +5,7 @@ from sqlalchemy import (
     Column,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
@@ -33,12 +34,15 @@ class KnowledgeBase(Base):
     description = Column(String(255), nullable=True)
     created_by = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
+    # 删除请求在同一事务中置位，后台任务按批删除期间列表与查询接口据此隐藏
+    deleting = Column(Boolean, nullable=False, default=False, server_default="0")
 
     creator = relationship("User")
     documents = relationship(
         "Document",
         back_populates="knowledge_base",
         cascade="all, delete-orphan",
+        passive_deletes=True,
     )
 
 
@@ -46,9 +50,15 @@ class Document(Base):
     __tablename__ = "documents"
 
     id = Column(Integer, primary_key=True, index=True)
-    kb_id = Column(Integer, ForeignKey("knowledge_bases.id"), nullable=False)
+    kb_id = Column(
+        Integer,
+        ForeignKey("knowledge_bases.id", ondelete="CASCADE"),
+        nullable=False,
+    )
     filename = Column(String(255), nullable=False)
     original_path = Column(String(255), nullable=True)
+    # 提取文本在文本缓存中的键（内容sha256），重新切块时据此读取
+    text_hash = Column(String(64), nullable=True, index=True)
     status = Column(String(32), default="pending")
     created_at = Column(DateTime, default=datetime.utcnow)
 
@@ -57,6 +67,7 @@ class Document(Base):
         "DocumentChunk",
         back_populates="document",
         cascade="all, delete-orphan",
+        passive_deletes=True,
     )
 
 
@@ -64,36 +75,64 @@ class DocumentChunk(Base):
     __tablename__ = "document_chunks"
 
     id = Column(Integer, primary_key=True, index=True)
-    doc_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
-    kb_id = Column(Integer, ForeignKey("knowledge_bases.id"), nullable=False)
+    doc_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False)
+    kb_id = Column(
+        Integer,
+        ForeignKey("knowledge_bases.id", ondelete="CASCADE"),
+        nullable=False,
+    )
     chunk_index = Column(Integer, nullable=False)
     content = Column(Text, nullable=False)
+    heading = Column(String(255), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     document = relationship("Document", back_populates="chunks")
 
+    __table_args__ = (
+        Index("ix_document_chunks_doc_chunk", "doc_id", "chunk_index"),
+        # MySQL使用ngram分词的全文索引支持中文关键词检索，其他数据库不创建
+        Index(
+            "ft_document_chunks_content",
+            "content",
+            mysql_prefix="FULLTEXT",
+            mysql_with_parser="ngram",
+        ).ddl_if(dialect="mysql"),
+    )
+
 
 class ChatSession(Base):
     __tablename__ = "chat_sessions"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     name = Column(String(128), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # 更早轮次的抽取式滚动摘要，与消息总数（用于校验进程内的历史缓存）
+    summary = Column(Text, nullable=True)
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    deleting = Column(Boolean, nullable=False, default=False, server_default="0")
 
     user = relationship("User")
     messages = relationship(
         "ChatMessage",
         back_populates="session",
         cascade="all, delete-orphan",
+        passive_deletes=True,
     )
 
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        Index("ix_chat_messages_session_created", "session_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(Integer, ForeignKey("chat_sessions.id"), nullable=False)
+    session_id = Column(
+        Integer,
+        ForeignKey("chat_sessions.id", ondelete="CASCADE"),
+        nullable=False,
+    )
     role = Column(String(16), nullable=False)
     content = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
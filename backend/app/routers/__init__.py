@@ -1,11 +1,21 @@
-from fastapi import APIRouter
-
-from . import auth, chat, knowledge
+import importlib
 
+from fastapi import APIRouter
 
-api_router = APIRouter(prefix="/api")
+# 各进程角色挂载的路由模块；未挂载的模块（及其依赖）不会被导入
+ROLE_ROUTERS = {
+    "all": ("auth", "knowledge", "chat", "jobs", "metrics", "health"),
+    "chat": ("auth", "chat", "jobs", "metrics", "health"),
+    "ingest": ("auth", "knowledge", "jobs", "metrics", "health"),
+}
 
-api_router.include_router(auth.router)
-api_router.include_router(knowledge.router)
-api_router.include_router(chat.router)
 
+def build_api_router(role: str = "all") -> APIRouter:
+    """按进程角色组装/api下的路由"""
+    if role not in ROLE_ROUTERS:
+        raise ValueError(f"不支持的进程角色: {role}")
+    api_router = APIRouter(prefix="/api")
+    for name in ROLE_ROUTERS[role]:
+        module = importlib.import_module(f"{__name__}.{name}")
+        api_router.include_router(module.router)
+    return api_router
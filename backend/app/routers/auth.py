@@ -1,43 +1,28 @@
 from datetime import timedelta
 from typing import Annotated
 
-from captcha.image import ImageCaptcha
 from fastapi import APIRouter, Depends, HTTPException, Response, UploadFile, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..auth import create_access_token, get_password_hash, verify_password
+from ..auth import create_access_token, get_password_hash_async, verify_password_async
 from ..config import get_settings
 from ..db import get_db
 from ..models import User
 from ..schemas import ResponseModel, Token, UserCreate, UserLogin, UserOut
+from ..services.captcha import captcha_service
 
 
 router = APIRouter(prefix="/auth", tags=["用户与认证"])
 
 settings = get_settings()
 
-_captcha_store: dict[str, str] = {}
-
 
 @router.get("/captcha", response_model=ResponseModel)
 async def get_captcha() -> ResponseModel:
     """获取图形验证码，返回base64图片和验证码ID"""
-    import base64
-    import io
-    import secrets
-    import string
-
-    image = ImageCaptcha(width=120, height=40)
-    chars = string.digits
-    code = "".join(secrets.choice(chars) for _ in range(4))
-    captcha_id = secrets.token_hex(16)
-    _captcha_store[captcha_id] = code
-
-    data = image.generate(code)
-    image_bytes = io.BytesIO(data.read())
-    base64_str = base64.b64encode(image_bytes.getvalue()).decode("ascii")
+    captcha_id, base64_str = await captcha_service.issue()
     return ResponseModel(
         code=0,
         message="成功",
@@ -58,7 +43,7 @@ async def register(
 
     user = User(
         username=payload.username,
-        password_hash=get_password_hash(payload.password),
+        password_hash=await get_password_hash_async(payload.password),
     )
     db.add(user)
     await db.commit()
@@ -79,14 +64,15 @@ async def login(
     if not settings.TESTING:
         if not payload.captcha_id or not payload.captcha_code:
             raise HTTPException(status_code=400, detail="验证码不能为空")
-        real_code = _captcha_store.get(payload.captcha_id)
-        if not real_code or real_code.lower() != payload.captcha_code.lower():
+        if not captcha_service.verify(payload.captcha_id, payload.captcha_code):
             raise HTTPException(status_code=400, detail="验证码错误或已过期")
 
     stmt = select(User).where(User.username == payload.username)
     result = await db.execute(stmt)
     user = result.scalar_one_or_none()
-    if user is None or not verify_password(payload.password, user.password_hash):
+    if user is None or not await verify_password_async(
+        payload.password, user.password_hash
+    ):
         raise HTTPException(status_code=400, detail="账号或密码错误")
 
     access_token = create_access_token(
@@ -1,20 +1,36 @@
+import asyncio
+import json
+import logging
+import time
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException
 from fastapi.responses import StreamingResponse
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..config import get_settings
-from ..db import get_db
+from ..db import AsyncSessionLocal, get_db
 from ..dependencies import get_current_user
+from ..metrics import record_stage, stage
 from ..models import ChatSession, User
-from ..schemas import ChatRequest, ChatSessionCreate, ChatSessionOut, ResponseModel
+from ..schemas import (
+    ChatRequest,
+    ChatSessionCreate,
+    ChatSessionOut,
+    DeleteJobOut,
+    ResponseModel,
+)
+from ..services.bulk_delete import start_delete
+from ..services.llm_scheduler import SchedulerRejected, llm_scheduler
+from ..services.stream_buffer import StreamBuffer, parse_event_id, stream_registry
 from ..services.rag import (
-    build_context_from_milvus,
+    build_context,
     call_qwen_stream,
     get_chat_history,
+    prefetch_chunks,
     save_chat_messages,
+    split_prompt_budget,
 )
 
 
@@ -22,6 +38,8 @@ router = APIRouter(prefix="/chat", tags=["对话问答"])
 
 settings = get_settings()
 
+logger = logging.getLogger(__name__)
+
 
 @router.post("/sessions", response_model=ResponseModel)
 async def create_session(
@@ -49,7 +67,7 @@ async def list_sessions(
     """列出当前用户的对话Session"""
     stmt = (
         select(ChatSession)
-        .where(ChatSession.user_id == current_user.id)
+        .where(ChatSession.user_id == current_user.id, ChatSession.deleting.is_(False))
         .order_by(ChatSession.created_at.desc())
     )
     result = await db.execute(stmt)
@@ -67,18 +85,21 @@ async def delete_session(
     db: Annotated[AsyncSession, Depends(get_db)],
     current_user: Annotated[User, Depends(get_current_user)],
 ) -> ResponseModel:
-    """删除对话Session"""
-    stmt = select(ChatSession).where(
+    """删除对话Session（后台按批删除消息，返回删除任务）"""
+    stmt = select(ChatSession.id).where(
         ChatSession.id == session_id,
         ChatSession.user_id == current_user.id,
     )
-    result = await db.execute(stmt)
-    session = result.scalar_one_or_none()
-    if session is None:
+    if (await db.execute(stmt)).scalar_one_or_none() is None:
         raise HTTPException(status_code=404, detail="会话不存在")
-    await db.delete(session)
-    await db.commit()
-    return ResponseModel(code=0, message="删除成功", data=None)
+    job = await start_delete(db, "chat_session", session_id, current_user.id)
+    return ResponseModel(code=0, message="删除任务已提交", data=DeleteJobOut.from_orm(job))
+
+
+def _cancel(task: asyncio.Task) -> None:
+    """取消后台任务，并取回其结果以免出现未处理异常的警告"""
+    task.cancel()
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
 
 
 @router.post("/stream")
@@ -86,55 +107,132 @@ async def chat_stream(
     payload: ChatRequest,
     db: Annotated[AsyncSession, Depends(get_db)],
     current_user: Annotated[User, Depends(get_current_user)],
+    last_event_id: Annotated[str | None, Header()] = None,
 ):
-    """流式对话接口"""
-    stmt = select(ChatSession).where(
-        ChatSession.id == payload.session_id,
-        ChatSession.user_id == current_user.id,
+    """流式对话接口
+
+    检索（向量化、向量/关键词检索、回填文档块）在请求开始时即作为后台任务启动，
+    与会话校验、历史加载并发执行；会话校验失败或请求中断时取消检索。
+    大模型调用经llm_scheduler准入与按用户公平排队，排队过长时直接返回429。
+
+    回答在后台任务中生成并写入stream_registry，每条事件带id；断线后携带Last-Event-ID重连时
+    从缓冲中续传，不重新生成。客户端断开后生成继续STREAM_RESUME_GRACE秒等待重连。
+    """
+    resume = parse_event_id(last_event_id)
+    if resume is not None:
+        buffer = stream_registry.get(resume[0], current_user.id)
+        if buffer is None:
+            raise HTTPException(status_code=410, detail="回答已过期，请重新提问")
+        return StreamingResponse(
+            buffer.read(resume[1], stream_registry.grace),
+            media_type="text/event-stream",
+        )
+
+    retrieval = asyncio.create_task(
+        prefetch_chunks(
+            payload.kb_ids,
+            payload.question,
+            nprobe=payload.nprobe,
+            ef=payload.ef,
+        )
     )
-    result = await db.execute(stmt)
-    session = result.scalar_one_or_none()
-    if session is None:
-        raise HTTPException(status_code=404, detail="会话不存在")
-
-    history_rounds = (
-        payload.history_rounds
-        if payload.history_rounds is not None
-        else settings.MAX_HISTORY_ROUNDS
-    )
-    history = await get_chat_history(db, session.id, history_rounds)
-
-    context = await build_context_from_milvus(db, payload.kb_ids, payload.question)
-    llm_stream = await call_qwen_stream(
-        question=payload.question,
-        context=context,
-        history=history,
-        temperature=payload.temperature,
-        top_p=payload.top_p,
-        max_tokens=payload.max_tokens,
-    )
-
-    async def event_generator():
+    try:
+        stmt = select(ChatSession).where(
+            ChatSession.id == payload.session_id,
+            ChatSession.user_id == current_user.id,
+        )
+        with stage("chat", "session"):
+            result = await db.execute(stmt)
+            session = result.scalar_one_or_none()
+        if session is None or session.deleting:
+            raise HTTPException(status_code=404, detail="会话不存在")
+
+        history_rounds = (
+            payload.history_rounds
+            if payload.history_rounds is not None
+            else settings.MAX_HISTORY_ROUNDS
+        )
+        with stage("chat", "history"):
+            history = await get_chat_history(db, session, history_rounds)
+        history, context_budget = split_prompt_budget(payload.question, history)
+
+        with stage("chat", "retrieval_wait"):
+            chunks, scores = await retrieval
+    except BaseException:
+        _cancel(retrieval)
+        raise
+    context = build_context(chunks, scores, budget=context_budget)
+    try:
+        # 名额在检索完成后才申请，避免检索期间占用大模型并发
+        ticket = llm_scheduler.submit(current_user.id)
+    except SchedulerRejected:
+        raise HTTPException(
+            status_code=429,
+            detail="当前咨询人数较多，请稍后重试",
+            headers={"Retry-After": str(int(llm_scheduler.queue_timeout))},
+        )
+    try:
+        llm_stream = await call_qwen_stream(
+            question=payload.question,
+            context=context,
+            history=history,
+            temperature=payload.temperature,
+            top_p=payload.top_p,
+            max_tokens=payload.max_tokens,
+        )
+    except BaseException as exc:
+        ticket.release(error=exc)
+        raise
+
+    async def produce(buffer: StreamBuffer):
         answer_parts: list[str] = []
+        first_token_latency: float | None = None
+        error: BaseException | None = None
+        queued = time.perf_counter()
+        started = queued
         try:
+            # 排队期间推送排队事件（event: queue），position为排在前面的请求数
+            async for position in ticket.wait():
+                buffer.publish(json.dumps({"position": position}), event="queue")
+            started = time.perf_counter()
+            record_stage("chat", "llm_queue", started - queued)
             async for token in llm_stream:
+                if not answer_parts:
+                    first_token_latency = time.perf_counter() - started
+                    record_stage("chat", "llm_first_token", first_token_latency)
                 answer_parts.append(token)
-                yield f"data: {token}\n\n"
-        except Exception:
+                buffer.publish(token)
+        except SchedulerRejected:
+            busy = "当前咨询人数较多，请稍后重试。"
+            answer_parts.append(busy)
+            buffer.publish(busy)
+        except Exception as exc:
+            error = exc
             fallback = "对话服务暂时不可用，请稍后重试。"
             if not answer_parts:
                 answer_parts.append(fallback)
-                yield f"data: {fallback}\n\n"
+                buffer.publish(fallback)
         finally:
+            # 先归还名额（含排队中被取消的情况），429与首token延迟用于调整并发上限
+            ticket.release(first_token_latency, error)
+            record_stage("chat", "llm_generation", time.perf_counter() - started)
             if not answer_parts:
                 default_text = "暂无可用回答。"
                 answer_parts.append(default_text)
-                yield f"data: {default_text}\n\n"
+                buffer.publish(default_text)
             full_answer = "".join(answer_parts)
-            await save_chat_messages(db, session, payload.question, full_answer)
-            yield "data: [DONE]\n\n"
-
+            # 生成任务可能在请求结束后继续运行，使用独立的数据库会话落库；
+            # 落库失败只记录日志，回答已完整推送，仍以[DONE]结束
+            try:
+                with stage("chat", "persist"):
+                    async with AsyncSessionLocal() as persist_db:
+                        await save_chat_messages(persist_db, session, payload.question, full_answer)
+            except Exception:
+                logger.exception("保存对话记录失败: session %s", session.id)
+            buffer.publish("[DONE]")
+
+    buffer = stream_registry.start(current_user.id, produce)
     return StreamingResponse(
-        event_generator(),
+        buffer.read(0, stream_registry.grace),
         media_type="text/event-stream",
     )
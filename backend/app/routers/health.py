@@ -0,0 +1,25 @@
+from fastapi import APIRouter, HTTPException
+
+from ..schemas import ResponseModel
+from ..services.warmup import warmup
+
+
+router = APIRouter(prefix="/health", tags=["健康检查"])
+
+
+@router.get("/live", response_model=ResponseModel)
+async def live() -> ResponseModel:
+    """存活检查：进程能处理请求即返回成功"""
+    return ResponseModel(code=0, message="成功", data=None)
+
+
+@router.get("/ready", response_model=ResponseModel)
+async def ready() -> ResponseModel:
+    """就绪检查：启动预热完成前返回503，负载均衡据此暂不分发流量"""
+    if not warmup.ready:
+        raise HTTPException(status_code=503, detail="服务预热中")
+    return ResponseModel(
+        code=0,
+        message="成功",
+        data={"warmup_seconds": warmup.duration, "steps": warmup.steps},
+    )
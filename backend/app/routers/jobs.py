@@ -0,0 +1,23 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException
+
+from ..dependencies import get_current_user
+from ..models import User
+from ..schemas import DeleteJobOut, ResponseModel
+from ..services.bulk_delete import delete_jobs
+
+
+router = APIRouter(prefix="/jobs", tags=["后台任务"])
+
+
+@router.get("/{job_id}", response_model=ResponseModel)
+async def get_job(
+    job_id: str,
+    current_user: Annotated[User, Depends(get_current_user)],
+) -> ResponseModel:
+    """查询后台删除任务的状态与进度"""
+    job = delete_jobs.get(job_id)
+    if job is None or job.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return ResponseModel(code=0, message="成功", data=DeleteJobOut.from_orm(job))
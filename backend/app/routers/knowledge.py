@@ -1,23 +1,40 @@
+import asyncio
 from typing import Annotated, Optional
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
-from sqlalchemy import delete, select
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.mysql import match
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..dependencies import get_current_user
 from ..db import get_db
+from ..metrics import stage
 from ..models import Document, DocumentChunk, KnowledgeBase, User
 from ..schemas import (
     ChunkOut,
     ChunkUpdate,
+    DeleteJobOut,
     DocumentOut,
     KnowledgeBaseCreate,
     KnowledgeBaseOut,
+    RechunkOut,
     ResponseModel,
+    SnapshotImportOut,
 )
+from ..services.bulk_delete import start_delete
 from ..services.embedding import default_embedder
-from ..services.file_parser import SUPPORTED_EXTENSIONS, iter_file_chunks
-from ..services.milvus_client import insert_embeddings
+from ..services.chunking import CHUNK_STRATEGIES
+from ..services.file_parser import (
+    SUPPORTED_EXTENSIONS,
+    extract_sections,
+    iter_section_chunks,
+)
+from ..services.keyword_index import keyword_index
+from ..services.milvus_client import delete_embeddings, insert_embeddings
+from ..services.rechunk import RechunkError, rechunk_document
+from ..services.snapshot import SnapshotError, export_snapshot, import_snapshot
+from ..services.text_store import text_store
 
 
 router = APIRouter(prefix="/knowledge", tags=["知识库"])
@@ -55,7 +72,7 @@ async def list_knowledge_bases(
     current_user: Annotated[User, Depends(get_current_user)],
 ) -> ResponseModel:
     """列出知识库"""
-    stmt = select(KnowledgeBase)
+    stmt = select(KnowledgeBase).where(KnowledgeBase.deleting.is_(False))
     result = await db.execute(stmt)
     bases = result.scalars().all()
     return ResponseModel(
@@ -71,15 +88,52 @@ async def delete_knowledge_base(
     db: Annotated[AsyncSession, Depends(get_db)],
     current_user: Annotated[User, Depends(get_current_user)],
 ) -> ResponseModel:
-    """删除知识库（同时删除文档及向量）"""
-    stmt = select(KnowledgeBase).where(KnowledgeBase.id == kb_id)
-    result = await db.execute(stmt)
-    kb = result.scalar_one_or_none()
-    if kb is None:
+    """删除知识库（同时删除文档、文档块及向量）
+
+    知识库在本请求中标记为删除中（列表与查询接口随即隐藏），再在后台任务中按批删除，
+    不加载子对象；返回的任务可通过 /api/jobs/{job_id} 查询进度。
+    """
+    stmt = select(KnowledgeBase.id).where(KnowledgeBase.id == kb_id)
+    if (await db.execute(stmt)).scalar_one_or_none() is None:
         raise HTTPException(status_code=404, detail="知识库不存在")
-    await db.delete(kb)
-    await db.commit()
-    return ResponseModel(code=0, message="删除成功", data=None)
+    job = await start_delete(db, "knowledge_base", kb_id, current_user.id)
+    return ResponseModel(code=0, message="删除任务已提交", data=DeleteJobOut.from_orm(job))
+
+
+@router.get("/bases/{kb_id}/snapshot")
+async def export_knowledge_base(
+    kb_id: int,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    current_user: Annotated[User, Depends(get_current_user)],
+) -> StreamingResponse:
+    """导出知识库快照（文档块、元数据与向量），按批流式输出，不在内存中拼出整个文件"""
+    kb = await db.get(KnowledgeBase, kb_id)
+    if kb is None or kb.deleting:
+        raise HTTPException(status_code=404, detail="知识库不存在")
+    return StreamingResponse(
+        export_snapshot(kb_id),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="kb-{kb_id}.wlkb"'},
+    )
+
+
+@router.post("/bases/import", response_model=ResponseModel)
+async def import_knowledge_base(
+    db: Annotated[AsyncSession, Depends(get_db)],
+    current_user: Annotated[User, Depends(get_current_user)],
+    file: UploadFile = File(...),
+    name: Optional[str] = Form(None),
+) -> ResponseModel:
+    """从快照导入为新的知识库（name为空时沿用快照中的名称）
+
+    块与向量直接批量写入，跳过文件解析与向量化；返回导入耗时与每秒导入块数。
+    """
+    try:
+        stats = await import_snapshot(db, file.file, current_user.id, name=name)
+    except SnapshotError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    stats["kb"] = KnowledgeBaseOut.from_orm(stats["kb"])
+    return ResponseModel(code=0, message="导入成功", data=SnapshotImportOut(**stats))
 
 
 @router.post("/bases/{kb_id}/documents", response_model=ResponseModel)
@@ -91,64 +145,97 @@ async def upload_document(
     chunk_size: int = 500,
     chunk_overlap: int = 100,
     use_hybrid: bool = False,
+    chunk_strategy: str = "fixed",
 ) -> ResponseModel:
-    """上传文档并解析向量化"""
+    """上传文档并解析向量化
+
+    chunk_strategy为fixed时chunk_size/chunk_overlap按字符计；
+    为sentence时按token计，重叠以整句回溯。
+    use_hybrid为真时同时写入关键词倒排索引，检索时与向量结果融合。
+    """
+    import shutil
     import tempfile
     from pathlib import Path
 
     suffix = Path(file.filename or "").suffix.lower()
     if suffix not in SUPPORTED_EXTENSIONS:
         raise HTTPException(status_code=400, detail="不支持的文件类型")
+    if chunk_strategy not in CHUNK_STRATEGIES:
+        raise HTTPException(status_code=400, detail="不支持的切块策略")
+    if chunk_size <= 0 or chunk_overlap < 0 or chunk_overlap >= chunk_size:
+        raise HTTPException(status_code=400, detail="切块大小或重叠大小不合法")
 
     stmt = select(KnowledgeBase).where(KnowledgeBase.id == kb_id)
     result = await db.execute(stmt)
     kb = result.scalar_one_or_none()
-    if kb is None:
+    if kb is None or kb.deleting:
         raise HTTPException(status_code=404, detail="知识库不存在")
 
-    tmp_dir = tempfile.mkdtemp()
-    tmp_path = Path(tmp_dir) / (file.filename or "upload")
-    content = await file.read()
-    tmp_path.write_bytes(content)
-
     doc = Document(
         kb_id=kb_id,
         filename=file.filename or "upload",
-        original_path=str(tmp_path),
         status="processing",
     )
     db.add(doc)
     await db.commit()
     await db.refresh(doc)
 
+    # 解析后只保留提取出的文本（按内容寻址压缩保存），临时文件随即删除
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        tmp_path = Path(tmp_dir) / Path(file.filename or "upload").name
+        tmp_path.write_bytes(await file.read())
+        with stage("upload", "parse"):
+            sections = extract_sections(tmp_path)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    doc.text_hash = await asyncio.to_thread(text_store.put, sections)
+
     chunks_text: list[str] = []
     indices: list[int] = []
-    for idx, chunk in iter_file_chunks(tmp_path, chunk_size, chunk_overlap):
-        indices.append(idx)
-        chunks_text.append(chunk)
-        db.add(
-            DocumentChunk(
-                doc_id=doc.id,
-                kb_id=kb_id,
-                chunk_index=idx,
-                content=chunk,
+    rows: list[DocumentChunk] = []
+    with stage("upload", "chunk"):
+        for idx, chunk, heading in iter_section_chunks(
+            sections, chunk_size, chunk_overlap, chunk_strategy
+        ):
+            indices.append(idx)
+            chunks_text.append(chunk)
+            rows.append(
+                DocumentChunk(
+                    doc_id=doc.id,
+                    kb_id=kb_id,
+                    chunk_index=idx,
+                    content=chunk,
+                    heading=heading[:255] or None,
+                )
             )
-        )
-    await db.flush()
+    with stage("upload", "insert_chunks"):
+        db.add_all(rows)
+        await db.flush()
 
     if chunks_text:
-        embeddings = default_embedder.embed_batch(chunks_text)
-        insert_embeddings(
-            kb_id=kb_id,
-            doc_id=doc.id,
-            chunk_indices=indices,
-            embeddings=embeddings,
-        )
+        with stage("upload", "embedding"):
+            embeddings = default_embedder.embed_batch(chunks_text)
+        with stage("upload", "insert_vectors"):
+            insert_embeddings(
+                kb_id=kb_id,
+                doc_id=doc.id,
+                chunk_indices=indices,
+                embeddings=embeddings,
+            )
 
     doc.status = "done"
     await db.commit()
     await db.refresh(doc)
 
+    if use_hybrid and rows:
+        with stage("upload", "keyword_index"):
+            await asyncio.to_thread(
+                keyword_index.add_chunks,
+                [(r.id, kb_id, doc.id, r.chunk_index, r.content) for r in rows],
+            )
+            await asyncio.to_thread(keyword_index.maybe_compact)
+
     return ResponseModel(
         code=0,
         message="上传并解析成功",
@@ -156,6 +243,38 @@ async def upload_document(
     )
 
 
+@router.post("/documents/{doc_id}/rechunk", response_model=ResponseModel)
+async def rechunk(
+    doc_id: int,
+    db: Annotated[AsyncSession, Depends(get_db)],
+    current_user: Annotated[User, Depends(get_current_user)],
+    chunk_size: int = 500,
+    chunk_overlap: int = 100,
+    chunk_strategy: str = "fixed",
+) -> ResponseModel:
+    """按缓存的提取文本重新切块，参数含义同上传接口
+
+    不重新解析文件，只对新增或内容变化的块向量化；文档id不变，旧块与旧向量整体替换为新的，
+    不留下旧向量。原关键词索引中的文档在重新切块后仍写入关键词索引。
+    """
+    if chunk_strategy not in CHUNK_STRATEGIES:
+        raise HTTPException(status_code=400, detail="不支持的切块策略")
+    if chunk_size <= 0 or chunk_overlap < 0 or chunk_overlap >= chunk_size:
+        raise HTTPException(status_code=400, detail="切块大小或重叠大小不合法")
+    doc = await db.get(Document, doc_id)
+    kb = await db.get(KnowledgeBase, doc.kb_id) if doc is not None else None
+    if kb is None or kb.deleting:
+        raise HTTPException(status_code=404, detail="文档不存在")
+    if doc.status != "done":
+        raise HTTPException(status_code=409, detail="文档正在处理中")
+    try:
+        stats = await rechunk_document(db, doc, chunk_size, chunk_overlap, chunk_strategy)
+    except RechunkError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    stats["document"] = DocumentOut.from_orm(stats["document"])
+    return ResponseModel(code=0, message="重新切块成功", data=RechunkOut(**stats))
+
+
 @router.get("/bases/{kb_id}/documents", response_model=ResponseModel)
 async def list_documents(
     kb_id: int,
@@ -173,6 +292,19 @@ async def list_documents(
     )
 
 
+def _chunk_keyword_filter(db: AsyncSession, keyword: str):
+    """构造文档块关键词过滤条件
+
+    MySQL下使用ngram全文索引做短语匹配；关键词短于ngram长度（默认2）
+    或其他数据库（如测试用的SQLite）时退回LIKE子串匹配。
+    """
+    if db.bind.dialect.name == "mysql" and len(keyword) >= 2:
+        phrase = '"' + keyword.replace('"', " ") + '"'
+        return match(DocumentChunk.content, against=phrase).in_boolean_mode()
+    escaped = keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return DocumentChunk.content.like(f"%{escaped}%", escape="\\")
+
+
 @router.get("/documents/{doc_id}/chunks", response_model=ResponseModel)
 async def list_document_chunks(
     doc_id: int,
@@ -181,31 +313,40 @@ async def list_document_chunks(
     page: int = 1,
     page_size: int = 20,
     keyword: Optional[str] = None,
+    after: Optional[int] = None,
 ) -> ResponseModel:
-    """分页预览文档块"""
-    from sqlalchemy import func
+    """分页预览文档块
 
-    stmt = select(DocumentChunk).where(DocumentChunk.doc_id == doc_id)
+    传入after（上一页最后一个块的chunk_index）时按键集分页，
+    深翻页不再扫描被跳过的行；否则按page做偏移分页。
+    total与列表使用相同的过滤条件。
+    """
+    conditions = [DocumentChunk.doc_id == doc_id]
+    keyword = (keyword or "").strip()
     if keyword:
-        stmt = stmt.where(DocumentChunk.content.like(f"%{keyword}%"))
-    total_stmt = (
-        select(func.count(DocumentChunk.id)).where(DocumentChunk.doc_id == doc_id)
-    )
+        conditions.append(_chunk_keyword_filter(db, keyword))
+
+    total_stmt = select(func.count(DocumentChunk.id)).where(*conditions)
     result_total = await db.execute(total_stmt)
     total = int(result_total.scalar_one())
 
-    stmt = stmt.order_by(DocumentChunk.chunk_index).offset(
-        (page - 1) * page_size
-    ).limit(page_size)
+    stmt = select(DocumentChunk).where(*conditions)
+    if after is not None:
+        stmt = stmt.where(DocumentChunk.chunk_index > after)
+    else:
+        stmt = stmt.offset((max(page, 1) - 1) * page_size)
+    stmt = stmt.order_by(DocumentChunk.chunk_index).limit(page_size)
     result = await db.execute(stmt)
     chunks = result.scalars().all()
 
+    next_cursor = chunks[-1].chunk_index if len(chunks) == page_size else None
     return ResponseModel(
         code=0,
         message="成功",
         data={
             "total": total,
             "items": [ChunkOut.from_orm(c) for c in chunks],
+            "next_cursor": next_cursor,
         },
     )
 
@@ -226,6 +367,7 @@ async def update_chunk(
     chunk.content = payload.content
     await db.commit()
     await db.refresh(chunk)
+    await asyncio.to_thread(keyword_index.update_chunk, chunk.id, chunk.content)
     return ResponseModel(
         code=0,
         message="更新成功",
@@ -239,7 +381,7 @@ async def delete_chunk(
     db: Annotated[AsyncSession, Depends(get_db)],
     current_user: Annotated[User, Depends(get_current_user)],
 ) -> ResponseModel:
-    """删除文档块"""
+    """删除文档块（同时删除其向量与关键词索引）"""
     stmt = select(DocumentChunk).where(DocumentChunk.id == chunk_id)
     result = await db.execute(stmt)
     chunk = result.scalar_one_or_none()
@@ -247,4 +389,6 @@ async def delete_chunk(
         raise HTTPException(status_code=404, detail="文档块不存在")
     await db.delete(chunk)
     await db.commit()
+    await asyncio.to_thread(keyword_index.remove_chunks, [chunk_id])
+    await asyncio.to_thread(delete_embeddings, chunk.kb_id, chunk.doc_id, [chunk.chunk_index])
     return ResponseModel(code=0, message="删除成功", data=None)
@@ -0,0 +1,21 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from ..config import get_settings
+from ..metrics import render_metrics
+
+
+router = APIRouter(tags=["监控指标"])
+
+settings = get_settings()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """以Prometheus文本格式导出请求与RAG各阶段耗时直方图"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="指标采集未开启")
+    return PlainTextResponse(
+        render_metrics(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
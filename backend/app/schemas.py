@@ -68,12 +68,29 @@ class DocumentOut(BaseModel):
         from_attributes = True
 
 
+class SnapshotImportOut(BaseModel):
+    kb: KnowledgeBaseOut
+    documents: int
+    chunks: int
+    seconds: float
+    chunks_per_sec: float
+
+
+class RechunkOut(BaseModel):
+    document: DocumentOut
+    chunks: int
+    reused: int
+    embedded: int
+    seconds: float
+
+
 class ChunkOut(BaseModel):
     id: int
     doc_id: int
     kb_id: int
     chunk_index: int
     content: str
+    heading: Optional[str] = None
     created_at: datetime
 
     class Config:
@@ -119,3 +136,22 @@ class ChatRequest(BaseModel):
     top_p: float = 0.8
     max_tokens: int = 1024
     history_rounds: int | None = None
+    # 向量检索参数覆盖：IVF类索引的nprobe、HNSW索引的ef，越大召回越高、延迟越高
+    nprobe: int | None = Field(default=None, ge=1, le=65536)
+    ef: int | None = Field(default=None, ge=1, le=32768)
+
+
+class DeleteJobOut(BaseModel):
+    id: str
+    kind: str
+    target_id: int
+    status: str
+    total: dict[str, int]
+    deleted: dict[str, int]
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+        from_attributes = True
@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import get_settings
+from ..db import AsyncSessionLocal
+from ..models import ChatMessage, ChatSession, Document, DocumentChunk, KnowledgeBase
+from .history import history_cache
+from .keyword_index import keyword_index
+from .milvus_client import drop_kb_embeddings
+from .text_store import text_store
+
+settings = get_settings()
+
+logger = logging.getLogger(__name__)
+
+
+class DeleteJob:
+    """一次批量删除任务的进度：各表的总行数与已删除行数"""
+
+    def __init__(self, kind: str, target_id: int, user_id: int):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.target_id = target_id
+        self.user_id = user_id
+        self.status = "pending"
+        self.total: dict[str, int] = {}
+        self.deleted: dict[str, int] = {}
+        self.error: str | None = None
+        self.created_at = datetime.utcnow()
+        self.finished_at: datetime | None = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("pending", "running")
+
+
+class DeleteJobRegistry:
+    """进程内的删除任务表，只用于查询进度：同一对象同时只有一个进行中的任务，只保留最近max_jobs个已结束任务
+
+    对象是否正在删除以数据库中的deleting列为准，见start_delete。
+    """
+
+    def __init__(self, max_jobs: int = 256):
+        self.max_jobs = max_jobs
+        self._jobs: OrderedDict[str, DeleteJob] = OrderedDict()
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def get(self, job_id: str) -> DeleteJob | None:
+        return self._jobs.get(job_id)
+
+    def find_active(self, kind: str, target_id: int) -> DeleteJob | None:
+        for job in self._jobs.values():
+            if job.kind == kind and job.target_id == target_id and job.active:
+                return job
+        return None
+
+    def submit(self, kind: str, target_id: int, user_id: int) -> DeleteJob:
+        """提交删除任务；该对象已有进行中的任务时直接返回该任务"""
+        job = self.find_active(kind, target_id)
+        if job is not None:
+            return job
+        job = DeleteJob(kind, target_id, user_id)
+        self._jobs[job.id] = job
+        self._prune()
+        runner = _RUNNERS[kind]
+        task = asyncio.get_running_loop().create_task(_run(job, runner))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+        return job
+
+    async def wait(self, job_id: str) -> None:
+        task = self._tasks.get(job_id)
+        if task is not None:
+            await asyncio.shield(task)
+
+    def _prune(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if not job.active]
+        for job_id in finished[: max(len(self._jobs) - self.max_jobs, 0)]:
+            del self._jobs[job_id]
+
+
+async def _run(job: DeleteJob, runner) -> None:
+    job.status = "running"
+    try:
+        await runner(job)
+        job.status = "done"
+    except Exception as exc:
+        logger.exception("批量删除失败: %s %s", job.kind, job.target_id)
+        job.status = "failed"
+        job.error = str(exc)
+    finally:
+        job.finished_at = datetime.utcnow()
+
+
+async def _count(model, condition) -> int:
+    async with AsyncSessionLocal() as db:
+        return int(await db.scalar(select(func.count()).select_from(model).where(condition)) or 0)
+
+
+async def _delete_in_batches(job: DeleteJob, key: str, model, condition) -> None:
+    """按主键分批删除满足条件的行，每批一个短事务，不把行加载为ORM对象"""
+    job.total[key] = await _count(model, condition)
+    job.deleted[key] = 0
+    batch_size = settings.BULK_DELETE_BATCH_SIZE
+    while True:
+        async with AsyncSessionLocal() as db:
+            ids = (await db.execute(select(model.id).where(condition).limit(batch_size))).scalars().all()
+            if not ids:
+                return
+            await db.execute(delete(model).where(model.id.in_(ids)))
+            await db.commit()
+        job.deleted[key] += len(ids)
+        # 批次之间让出事件循环，避免长时间占用
+        await asyncio.sleep(0)
+
+
+async def _delete_knowledge_base(job: DeleteJob) -> None:
+    kb_id = job.target_id
+    # 先清除检索索引，删除期间该知识库不再出现在检索结果中
+    await asyncio.to_thread(keyword_index.remove_kb, kb_id)
+    await asyncio.to_thread(drop_kb_embeddings, kb_id)
+    async with AsyncSessionLocal() as db:
+        hashes = set(
+            (
+                await db.execute(
+                    select(Document.text_hash).where(
+                        Document.kb_id == kb_id, Document.text_hash.is_not(None)
+                    )
+                )
+            ).scalars()
+        )
+    await _delete_in_batches(job, "chunks", DocumentChunk, DocumentChunk.kb_id == kb_id)
+    await _delete_in_batches(job, "documents", Document, Document.kb_id == kb_id)
+    await _delete_in_batches(job, "knowledge_bases", KnowledgeBase, KnowledgeBase.id == kb_id)
+    if hashes:
+        # 提取文本按内容寻址，可能被其他知识库中的相同文档共用
+        async with AsyncSessionLocal() as db:
+            shared = set(
+                (
+                    await db.execute(
+                        select(Document.text_hash).where(Document.text_hash.in_(hashes))
+                    )
+                ).scalars()
+            )
+        await asyncio.to_thread(text_store.discard, hashes - shared)
+
+
+async def _delete_chat_session(job: DeleteJob) -> None:
+    session_id = job.target_id
+    history_cache.invalidate(session_id)
+    await _delete_in_batches(job, "messages", ChatMessage, ChatMessage.session_id == session_id)
+    await _delete_in_batches(job, "sessions", ChatSession, ChatSession.id == session_id)
+    history_cache.invalidate(session_id)
+
+
+_RUNNERS = {
+    "knowledge_base": _delete_knowledge_base,
+    "chat_session": _delete_chat_session,
+}
+
+_TARGETS = {
+    "knowledge_base": KnowledgeBase,
+    "chat_session": ChatSession,
+}
+
+delete_jobs = DeleteJobRegistry()
+
+
+async def start_delete(db: AsyncSession, kind: str, target_id: int, user_id: int) -> DeleteJob:
+    """在调用方的事务中把对象标记为删除中并提交，再提交后台删除任务
+
+    标记保存在数据库中，进程重启或多进程部署时列表与查询接口同样隐藏该对象。
+    """
+    model = _TARGETS[kind]
+    await db.execute(update(model).where(model.id == target_id).values(deleting=True))
+    await db.commit()
+    return delete_jobs.submit(kind, target_id, user_id)
+
+
+async def resume_deletes(kinds: tuple[str, ...] = tuple(_RUNNERS)) -> int:
+    """为标记为删除中、但没有进行中任务的对象重新提交删除任务（如进程重启中断的删除），返回提交数"""
+    owners = {
+        "knowledge_base": KnowledgeBase.created_by,
+        "chat_session": ChatSession.user_id,
+    }
+    submitted = 0
+    try:
+        async with AsyncSessionLocal() as db:
+            for kind in kinds:
+                model = _TARGETS[kind]
+                rows = await db.execute(
+                    select(model.id, owners[kind]).where(model.deleting.is_(True))
+                )
+                for target_id, user_id in rows.all():
+                    delete_jobs.submit(kind, target_id, user_id or 0)
+                    submitted += 1
+    except Exception:
+        logger.exception("恢复未完成的删除任务失败")
+    return submitted
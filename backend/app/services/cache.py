@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """带过期时间与容量上限的LRU缓存，线程安全
+
+    每个条目可单独指定过期时间点；超出容量时淘汰最久未使用的条目。
+    ttl为0时缓存不生效，所有写入都被忽略。
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, expires_at: float | None = None) -> None:
+        """写入条目，expires_at为时钟上的绝对过期时间，不传则按ttl计算"""
+        if self.ttl <= 0 or self.maxsize <= 0:
+            return
+        now = self._clock()
+        deadline = now + self.ttl
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        if deadline <= now:
+            return
+        with self._lock:
+            self._data[key] = (deadline, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """取出并删除条目（过期条目视为不存在）"""
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        if entry is _MISSING or entry[0] <= self._clock():
+            return default
+        return entry[1]
+
+    def discard_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """删除键满足条件的全部条目，返回删除数量"""
+        with self._lock:
+            keys = [k for k in self._data if predicate(k)]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+    def purge_expired(self) -> int:
+        """清理已过期的条目，返回清理数量"""
+        now = self._clock()
+        with self._lock:
+            keys = [k for k, (expires_at, _) in self._data.items() if expires_at <= now]
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,101 @@
+import asyncio
+import base64
+import secrets
+import string
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from ..config import get_settings
+from .cache import TTLCache
+
+settings = get_settings()
+
+_local = threading.local()
+
+
+def _render(code: str) -> str:
+    """渲染验证码图片，返回base64编码的PNG；每个工作线程复用一个ImageCaptcha实例"""
+    image = getattr(_local, "image", None)
+    if image is None:
+        # captcha与PIL在首次渲染时才导入
+        from captcha.image import ImageCaptcha
+
+        image = _local.image = ImageCaptcha(width=120, height=40)
+    data = image.generate(code)
+    return base64.b64encode(data.getvalue()).decode("ascii")
+
+
+def _render_random() -> tuple[str, str]:
+    code = "".join(secrets.choice(string.digits) for _ in range(4))
+    return code, _render(code)
+
+
+class CaptchaService:
+    """图形验证码：有界且会过期的存储、一次性校验、线程池渲染与预渲染池
+
+    验证码在发放时才生成ID并写入存储，有效期从发放时开始计算；
+    校验时无论成功与否都会删除该验证码。预渲染池在后台由线程池补充，
+    请求到来时直接从池中取出，池空时才在线程池中现场渲染。
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        max_entries: int,
+        pool_size: int,
+        workers: int = 2,
+    ):
+        self._store = TTLCache(maxsize=max_entries, ttl=ttl)
+        self._pool: deque[tuple[str, str]] = deque()
+        self._pool_size = pool_size
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix="captcha",
+        )
+        self._refill_task: asyncio.Task | None = None
+
+    async def issue(self) -> tuple[str, str]:
+        """发放一个验证码，返回(验证码ID, base64图片)"""
+        try:
+            code, image = self._pool.popleft()
+        except IndexError:
+            loop = asyncio.get_running_loop()
+            code, image = await loop.run_in_executor(self._executor, _render_random)
+        self._ensure_refill()
+        captcha_id = secrets.token_hex(16)
+        self._store.set(captcha_id, code)
+        return captcha_id, image
+
+    def verify(self, captcha_id: str, code: str) -> bool:
+        """校验并作废验证码"""
+        real_code = self._store.pop(captcha_id)
+        return real_code is not None and real_code.lower() == code.lower()
+
+    def _ensure_refill(self) -> None:
+        if self._pool_size <= 0 or len(self._pool) >= self._pool_size:
+            return
+        loop = asyncio.get_running_loop()
+        task = self._refill_task
+        if task is not None and not task.done() and task.get_loop() is loop:
+            return
+        self._refill_task = loop.create_task(self._refill())
+
+    async def _refill(self) -> None:
+        loop = asyncio.get_running_loop()
+        while len(self._pool) < self._pool_size:
+            self._pool.append(await loop.run_in_executor(self._executor, _render_random))
+
+    async def warm_up(self) -> None:
+        """预先填满渲染池"""
+        await self._refill()
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+
+captcha_service = CaptchaService(
+    ttl=settings.CAPTCHA_TTL,
+    max_entries=settings.CAPTCHA_STORE_SIZE,
+    pool_size=settings.CAPTCHA_POOL_SIZE,
+)
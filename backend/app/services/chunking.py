@@ -0,0 +1,174 @@
+import re
+from typing import List, Tuple
+
+from .tokenizer import estimate_tokens
+
+
+CHUNK_STRATEGIES = {"fixed", "sentence"}
+
+# 单元类型：标题行、段落首句、段落内句子
+_HEADING = 1
+_PARAGRAPH_START = 2
+_SENTENCE = 0
+
+_HEADING_PATTERN = re.compile(r"[ \t]{0,3}#{1,6}[ \t]+\S")
+_BLANK_PATTERN = re.compile(r"\s*")
+# 句子以中文句读（。！？；）或英文句末标点结尾，可带后引号/括号；文末无标点的残句同样成句
+_SENTENCE_PATTERN = re.compile(
+    r".+?(?:[。！？；!?;]+[”’」』）)\"']*|\.(?=\s)|\Z)",
+    re.S,
+)
+_TOKEN_BOUNDARY_PATTERN = re.compile(r"[A-Za-z]+|\d+|\S")
+
+# (起始偏移, 结束偏移, token数, 类型)
+Unit = Tuple[int, int, int, int]
+
+
+def _iter_blocks(text: str):
+    """按行扫描，返回(起始, 结束, 是否标题)的块：空行分段，标题行单独成块"""
+    length = len(text)
+    block_start = -1
+    pos = 0
+    while pos < length:
+        line_end = text.find("\n", pos)
+        if line_end == -1:
+            line_end = length
+        if _HEADING_PATTERN.match(text, pos, line_end):
+            if block_start != -1:
+                yield block_start, pos, False
+                block_start = -1
+            yield pos, line_end, True
+        elif _BLANK_PATTERN.fullmatch(text, pos, line_end):
+            if block_start != -1:
+                yield block_start, pos, False
+                block_start = -1
+        elif block_start == -1:
+            block_start = pos
+        pos = line_end + 1
+    if block_start != -1:
+        yield block_start, length, False
+
+
+def _split_long_sentence(
+    text: str,
+    start: int,
+    end: int,
+    budget: int,
+    kind: int,
+) -> List[Unit]:
+    """超出预算的长句按token边界硬切，保证单个单元不超过预算"""
+    pieces: List[Unit] = []
+    piece_start = start
+    tokens = 0
+    for match in _TOKEN_BOUNDARY_PATTERN.finditer(text, start, end):
+        length = match.end() - match.start()
+        cost = 1 if length <= 4 else (length + 3) // 4
+        if tokens and tokens + cost > budget:
+            pieces.append((piece_start, match.start(), tokens, kind))
+            kind = _SENTENCE
+            piece_start = match.start()
+            tokens = 0
+        tokens += cost
+    if tokens:
+        pieces.append((piece_start, end, tokens, kind))
+    return pieces
+
+
+def _segment(text: str, budget: int) -> List[Unit]:
+    """将文本切分为标题/句子单元，整体线性扫描，仅记录偏移不复制文本"""
+    units: List[Unit] = []
+    for block_start, block_end, is_heading in _iter_blocks(text):
+        if is_heading:
+            tokens = estimate_tokens(text, block_start, block_end)
+            units.append((block_start, block_end, tokens, _HEADING))
+            continue
+        kind = _PARAGRAPH_START
+        for match in _SENTENCE_PATTERN.finditer(text, block_start, block_end):
+            tokens = estimate_tokens(text, match.start(), match.end())
+            if tokens == 0:
+                continue
+            if tokens > budget:
+                units.extend(
+                    _split_long_sentence(
+                        text, match.start(), match.end(), budget, kind
+                    )
+                )
+            else:
+                units.append((match.start(), match.end(), tokens, kind))
+            kind = _SENTENCE
+    return units
+
+
+def split_text_by_sentences(
+    text: str,
+    chunk_size: int = 500,
+    chunk_overlap: int = 100,
+) -> List[str]:
+    """按句子与文档结构切块
+
+    chunk_size为每块的token预算，chunk_overlap为块间重叠的token上限，
+    重叠以整句为单位回溯。标题总是开启新块；超出预算时若当前块已过半，
+    优先在段落边界处截断（段落边界与标题处不做重叠）。
+    """
+    if not text or not text.strip():
+        return []
+    if estimate_tokens(text) <= chunk_size:
+        return [text.strip()]
+
+    units = _segment(text, chunk_size)
+    chunks: List[str] = []
+
+    def flush(first: int, last: int) -> None:
+        chunk = text[units[first][0] : units[last - 1][1]].strip()
+        if chunk:
+            chunks.append(chunk)
+
+    # acc[i]为前i个单元的token累计，用于O(1)求任意区间token数
+    acc = [0]
+    for unit in units:
+        acc.append(acc[-1] + unit[2])
+
+    begin = 0
+    has_body = False
+    last_paragraph = 0
+    i = 0
+    while i < len(units):
+        kind = units[i][3]
+        if kind == _HEADING:
+            if has_body:
+                flush(begin, i)
+                begin = i
+                has_body = False
+            i += 1
+            continue
+
+        if acc[i + 1] - acc[begin] > chunk_size and i > begin:
+            boundary = i if kind == _PARAGRAPH_START else last_paragraph
+            if boundary > begin and (
+                boundary == i or acc[boundary] - acc[begin] >= chunk_size // 2
+            ):
+                flush(begin, boundary)
+                begin = boundary
+            else:
+                flush(begin, i)
+                overlap_start = i
+                while (
+                    overlap_start - 1 > begin
+                    and units[overlap_start - 1][3] != _HEADING
+                    and acc[i] - acc[overlap_start - 1] <= chunk_overlap
+                ):
+                    overlap_start -= 1
+                if acc[i + 1] - acc[overlap_start] > chunk_size:
+                    overlap_start = i
+                begin = overlap_start
+            has_body = begin < i
+            continue
+
+        if kind == _PARAGRAPH_START:
+            last_paragraph = i
+        has_body = True
+        i += 1
+
+    if begin < len(units):
+        flush(begin, len(units))
+    return chunks
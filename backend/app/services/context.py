@@ -0,0 +1,146 @@
+from collections.abc import Mapping, Sequence
+
+from ..models import DocumentChunk
+from .tokenizer import estimate_tokens
+
+
+def measure(text: str, unit: str = "token") -> int:
+    """按预算单位计量文本长度，unit为token或char"""
+    if unit == "char":
+        return len(text)
+    return estimate_tokens(text)
+
+
+def overlap_length(prev: str, nxt: str, max_overlap: int) -> int:
+    """求prev的后缀与nxt的前缀的最长重合长度（不超过max_overlap）
+
+    对“nxt前缀 + 分隔符 + prev后缀”求KMP前缀函数，线性时间完成。
+    """
+    limit = min(max_overlap, len(prev), len(nxt))
+    if limit <= 0:
+        return 0
+    probe = nxt[:limit] + "\0" + prev[-limit:]
+    fail = [0] * len(probe)
+    for i in range(1, len(probe)):
+        k = fail[i - 1]
+        while k and probe[i] != probe[k]:
+            k = fail[k - 1]
+        if probe[i] == probe[k]:
+            k += 1
+        fail[i] = k
+    return fail[-1]
+
+
+def _format(heading: str | None, text: str) -> str:
+    return f"【{heading}】\n{text}" if heading else text
+
+
+# 短于该长度的首尾重合视为巧合（如相同的标点或单字），不做去重
+_MIN_OVERLAP = 4
+
+
+def _merge_run(run: Sequence[DocumentChunk], max_overlap: int) -> str:
+    """合并同一文档中连续的块，去除相邻块之间的重叠文本"""
+    parts = [run[0].content]
+    for prev, chunk in zip(run, run[1:]):
+        cut = overlap_length(prev.content, chunk.content, max_overlap)
+        parts.append(chunk.content[cut if cut >= _MIN_OVERLAP else 0 :])
+    return "".join(parts)
+
+
+def assemble_context(
+    chunks: Sequence[DocumentChunk],
+    scores: Mapping[tuple[int, int], float],
+    budget: int | None = None,
+    unit: str = "token",
+    max_overlap: int = 400,
+) -> str:
+    """将检索命中的块组装为提示词上下文
+
+    同一文档中chunk_index连续的块合并为一段并去除重叠部分；
+    各段按命中分数从高到低装入预算，整段放不下时退回逐块装入，
+    最高分的块超出全部预算时截断保留。输出按文档与块顺序排列。
+    """
+    by_doc: dict[int, list[DocumentChunk]] = {}
+    for chunk in chunks:
+        by_doc.setdefault(chunk.doc_id, []).append(chunk)
+
+    runs: list[list[DocumentChunk]] = []
+    for doc_chunks in by_doc.values():
+        doc_chunks.sort(key=lambda c: c.chunk_index)
+        run = [doc_chunks[0]]
+        for chunk in doc_chunks[1:]:
+            if chunk.chunk_index == run[-1].chunk_index:
+                continue
+            if chunk.chunk_index == run[-1].chunk_index + 1 and (
+                chunk.heading == run[-1].heading
+            ):
+                run.append(chunk)
+            else:
+                runs.append(run)
+                run = [chunk]
+        runs.append(run)
+
+    def score_of(items: Sequence[DocumentChunk]) -> float:
+        return max(scores.get((c.doc_id, c.chunk_index), 0.0) for c in items)
+
+    # (排序键, 文本)
+    pieces: list[tuple[tuple[int, int], str]] = []
+    remaining = budget
+    for run in sorted(runs, key=score_of, reverse=True):
+        candidates = [(run, _format(run[0].heading, _merge_run(run, max_overlap)))]
+        if remaining is not None and len(run) > 1:
+            if measure(candidates[0][1], unit) > remaining:
+                candidates = [
+                    ([c], _format(c.heading, c.content))
+                    for c in sorted(run, key=lambda c: score_of([c]), reverse=True)
+                ]
+        for items, text in candidates:
+            size = measure(text, unit)
+            if remaining is not None and size > remaining:
+                continue
+            pieces.append(((items[0].doc_id, items[0].chunk_index), text))
+            if remaining is not None:
+                remaining -= size
+
+    if not pieces and chunks and budget:
+        best = max(chunks, key=lambda c: score_of([c]))
+        text = _format(best.heading, best.content)
+        text = text[:budget] if unit == "char" else _truncate_tokens(text, budget)
+        pieces.append(((best.doc_id, best.chunk_index), text))
+
+    pieces.sort(key=lambda p: p[0])
+    return "\n\n".join(text for _, text in pieces)
+
+
+def _truncate_tokens(text: str, budget: int) -> str:
+    """按估算token数截断文本，二分查找截断位置"""
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text, 0, mid) <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low]
+
+
+def trim_history(
+    history: list[dict[str, str]],
+    budget: int,
+    unit: str = "token",
+) -> tuple[list[dict[str, str]], int]:
+    """从最近的轮次开始保留历史消息，直到用尽预算；返回(保留的历史, 占用量)
+
+    按完整的“用户提问+助手回答”轮次取舍，避免提示词中出现孤立的半轮对话。
+    """
+    used = 0
+    end = len(history)
+    while end > 0:
+        start = end - 2 if end >= 2 and history[end - 2]["role"] == "user" else end - 1
+        size = sum(measure(m["content"], unit) for m in history[start:end])
+        if used + size > budget:
+            break
+        used += size
+        end = start
+    return history[end:], used
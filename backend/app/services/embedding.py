@@ -2,15 +2,39 @@ import hashlib
 from typing import Iterable, List
 
 
+# 预热时写入查找表的字符：ASCII可见字符、中文标点与常用汉字（CJK统一汉字基本区）
+WARMUP_CHARS = (
+    "".join(chr(c) for c in range(0x20, 0x7F))
+    + "，。、；：？！“”‘’（）《》【】—…·"
+    + "".join(chr(c) for c in range(0x4E00, 0x9FA6))
+)
+
+
 class SimpleChineseEmbedder:
-    """简单的中文文本向量化工具，用于示例和测试环境"""
+    """简单的中文文本向量化工具，用于示例和测试环境
+
+    每个字符的哈希桶记入查找表（最多max_table个字符），同一字符不重复计算sha256。
+    """
 
-    def __init__(self, dim: int = 256):
+    def __init__(self, dim: int = 256, max_table: int = 65536):
         self.dim = dim
+        self.max_table = max_table
+        self._buckets: dict[str, int] = {}
 
     def _hash_token(self, token: str) -> int:
-        digest = hashlib.sha256(token.encode("utf-8")).digest()
-        return int.from_bytes(digest[:4], "big") % self.dim
+        bucket = self._buckets.get(token)
+        if bucket is None:
+            digest = hashlib.sha256(token.encode("utf-8")).digest()
+            bucket = int.from_bytes(digest[:4], "big") % self.dim
+            if len(self._buckets) < self.max_table:
+                self._buckets[token] = bucket
+        return bucket
+
+    def prime(self, chars: Iterable[str] = WARMUP_CHARS) -> int:
+        """预先计算字符的哈希桶写入查找表，返回查找表大小"""
+        for ch in chars:
+            self._hash_token(ch)
+        return len(self._buckets)
 
     def embed(self, text: str) -> List[float]:
         if not text:
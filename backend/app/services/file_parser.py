@@ -1,16 +1,20 @@
 from pathlib import Path
 from typing import Iterable, List, Tuple
 
-import docx
-import markdown
-from pptx import Presentation
-from PyPDF2 import PdfReader
+from .chunking import split_text_by_sentences
+from .markdown_text import markdown_to_sections, markdown_to_text
 
 
 SUPPORTED_EXTENSIONS = {".pdf", ".ppt", ".pptx", ".md", ".markdown", ".doc", ".docx", ".png"}
 
 
+# PyPDF2、python-docx、python-pptx导入较慢，只在解析对应格式时导入，
+# 只处理对话的进程不会加载它们
+
+
 def extract_text_from_pdf(path: Path) -> str:
+    from PyPDF2 import PdfReader
+
     reader = PdfReader(str(path))
     texts: List[str] = []
     for page in reader.pages:
@@ -19,6 +23,8 @@ def extract_text_from_pdf(path: Path) -> str:
 
 
 def extract_text_from_ppt(path: Path) -> str:
+    from pptx import Presentation
+
     pres = Presentation(str(path))
     texts: List[str] = []
     for slide in pres.slides:
@@ -30,11 +36,12 @@ def extract_text_from_ppt(path: Path) -> str:
 
 def extract_text_from_md(path: Path) -> str:
     content = path.read_text(encoding="utf-8", errors="ignore")
-    html = markdown.markdown(content)
-    return html
+    return markdown_to_text(content)
 
 
 def extract_text_from_docx(path: Path) -> str:
+    import docx
+
     document = docx.Document(str(path))
     return "\n".join(p.text for p in document.paragraphs)
 
@@ -58,6 +65,19 @@ def extract_text(path: Path) -> str:
     raise ValueError(f"不支持的文件类型: {suffix}")
 
 
+def extract_sections(path: Path) -> List[Tuple[str, str]]:
+    """提取文件文本并按标题划分，返回[(标题路径, 正文)]
+
+    Markdown按标题层级划分，其余格式整体作为一个无标题的段落。
+    """
+    suffix = path.suffix.lower()
+    if suffix in {".md", ".markdown"}:
+        content = path.read_text(encoding="utf-8", errors="ignore")
+        return markdown_to_sections(content)
+    text = extract_text(path)
+    return [("", text)] if text else []
+
+
 def split_text_to_chunks(
     text: str,
     chunk_size: int = 500,
@@ -80,14 +100,43 @@ def split_text_to_chunks(
     return chunks
 
 
+def split_text(
+    text: str,
+    chunk_size: int = 500,
+    chunk_overlap: int = 100,
+    strategy: str = "fixed",
+) -> List[str]:
+    """按指定策略切块：fixed按字符定长切分，sentence按句子与结构切分"""
+    if strategy == "sentence":
+        return split_text_by_sentences(text, chunk_size, chunk_overlap)
+    if strategy == "fixed":
+        return split_text_to_chunks(text, chunk_size, chunk_overlap)
+    raise ValueError(f"不支持的切块策略: {strategy}")
+
+
 def iter_file_chunks(
     path: Path,
     chunk_size: int,
     chunk_overlap: int,
-) -> Iterable[Tuple[int, str]]:
-    """生成文件切块序列，返回(索引, 文本)"""
-    text = extract_text(path)
-    chunks = split_text_to_chunks(text, chunk_size, chunk_overlap)
-    for idx, chunk in enumerate(chunks):
-        yield idx, chunk
+    strategy: str = "fixed",
+) -> Iterable[Tuple[int, str, str]]:
+    """生成文件切块序列，返回(索引, 文本, 标题路径)
+
+    切块不跨越标题，每个块携带所属段落的标题路径作为元数据。
+    """
+    return iter_section_chunks(extract_sections(path), chunk_size, chunk_overlap, strategy)
+
+
+def iter_section_chunks(
+    sections: Iterable[Tuple[str, str]],
+    chunk_size: int,
+    chunk_overlap: int,
+    strategy: str = "fixed",
+) -> Iterable[Tuple[int, str, str]]:
+    """对已提取的段落逐段切块，返回(索引, 文本, 标题路径)"""
+    idx = 0
+    for heading, text in sections:
+        for chunk in split_text(text, chunk_size, chunk_overlap, strategy):
+            yield idx, chunk, heading
+            idx += 1
 
@@ -0,0 +1,156 @@
+import re
+from collections import OrderedDict, deque
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import get_settings
+from ..models import ChatMessage, ChatSession
+from .context import measure
+
+settings = get_settings()
+
+_SENTENCE_END = re.compile(r"(?<=[。！？!?；;\n])")
+# 摘要中每轮问题与回答要点各自保留的最大字符数
+_QUESTION_CHARS = 60
+_ANSWER_CHARS = 80
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def summarize_round(question: str, answer: str) -> str:
+    """抽取式压缩一轮问答：保留问题与回答的首句"""
+    first = next((s for s in _SENTENCE_END.split(answer) if s.strip()), "")
+    return f"用户问：{_clip(question, _QUESTION_CHARS)} 答：{_clip(first, _ANSWER_CHARS)}"
+
+
+def fold_summary(summary: str, rounds: list[tuple[str, str]], budget: int, unit: str) -> str:
+    """把移出窗口的轮次追加到滚动摘要，超出预算时丢弃最早的条目"""
+    lines = [line for line in summary.split("\n") if line] if summary else []
+    lines.extend(summarize_round(q, a) for q, a in rounds)
+    while lines and measure("\n".join(lines), unit) > budget:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class SessionHistory:
+    """一个会话最近的消息（环形缓冲）与更早轮次的滚动摘要
+
+    message_count为缓冲对应的会话消息总数，与chat_sessions.message_count一致时缓冲有效。
+    """
+
+    def __init__(self, messages: list[dict[str, str]], summary: str, message_count: int):
+        self.messages: deque[dict[str, str]] = deque(messages)
+        self.summary = summary
+        self.message_count = message_count
+
+    def as_prompt(self, rounds: int) -> list[dict[str, str]]:
+        history = list(self.messages)[-rounds * 2 :] if rounds > 0 else []
+        if self.summary:
+            history.insert(0, {"role": "system", "content": f"此前对话的摘要：\n{self.summary}"})
+        return history
+
+
+class HistoryCache:
+    """进程内按会话缓存最近对话，LRU淘汰不活跃的会话
+
+    写入时追加到缓冲，超出window_rounds轮的最早轮次压缩进滚动摘要（同时写回chat_sessions.summary），
+    因此无论会话多长，提示词中历史部分的开销都不超过窗口加摘要预算。
+    多进程部署时以chat_sessions.message_count校验缓冲，其他进程写入后本进程重新从数据库加载。
+    """
+
+    def __init__(self, max_sessions: int = 1024, window_rounds: int = 5, summary_budget: int = 300):
+        self.max_sessions = max_sessions
+        self.window_rounds = window_rounds
+        self.summary_budget = summary_budget
+        self._sessions: OrderedDict[int, SessionHistory] = OrderedDict()
+
+    def _put(self, session_id: int, entry: SessionHistory) -> None:
+        self._sessions[session_id] = entry
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def invalidate(self, session_id: int) -> None:
+        self._sessions.pop(session_id, None)
+
+    def clear(self) -> None:
+        self._sessions.clear()
+
+    async def _load(self, db: AsyncSession, session: ChatSession) -> SessionHistory:
+        # 走(session_id, created_at)索引，只取窗口内的消息
+        stmt = (
+            select(ChatMessage.role, ChatMessage.content)
+            .where(ChatMessage.session_id == session.id)
+            .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+            .limit(self.window_rounds * 2)
+        )
+        rows = (await db.execute(stmt)).all()
+        messages = [{"role": role, "content": content} for role, content in reversed(rows)]
+        return SessionHistory(messages, session.summary or "", session.message_count or 0)
+
+    async def get(self, db: AsyncSession, session: ChatSession, rounds: int) -> list[dict[str, str]]:
+        """返回提示词用的历史：滚动摘要（如有）加最近rounds轮消息"""
+        entry = self._sessions.get(session.id)
+        if entry is None or entry.message_count != (session.message_count or 0):
+            entry = await self._load(db, session)
+            self._put(session.id, entry)
+        else:
+            self._sessions.move_to_end(session.id)
+        return entry.as_prompt(min(rounds, self.window_rounds))
+
+    async def append(
+        self,
+        db: AsyncSession,
+        session: ChatSession,
+        question: str,
+        answer: str,
+    ) -> None:
+        """保存一轮问答并更新缓冲与滚动摘要"""
+        entry = self._sessions.get(session.id)
+        if entry is None or entry.message_count != (session.message_count or 0):
+            entry = await self._load(db, session)
+        expected = entry.message_count + 2
+
+        db.add(ChatMessage(session_id=session.id, role="user", content=question))
+        db.add(ChatMessage(session_id=session.id, role="assistant", content=answer))
+        entry.messages.append({"role": "user", "content": question})
+        entry.messages.append({"role": "assistant", "content": answer})
+
+        evicted: list[tuple[str, str]] = []
+        while len(entry.messages) > self.window_rounds * 2:
+            first = entry.messages.popleft()
+            if first["role"] == "user" and entry.messages and entry.messages[0]["role"] == "assistant":
+                evicted.append((first["content"], entry.messages.popleft()["content"]))
+        values: dict = {"message_count": ChatSession.message_count + 2}
+        if evicted:
+            entry.summary = fold_summary(
+                entry.summary, evicted, self.summary_budget, settings.PROMPT_BUDGET_UNIT
+            )
+            values["summary"] = entry.summary
+        try:
+            # 消息计数原子自增，供其他进程校验各自的缓冲
+            await db.execute(update(ChatSession).where(ChatSession.id == session.id).values(**values))
+            count = await db.scalar(
+                select(ChatSession.message_count).where(ChatSession.id == session.id)
+            )
+            await db.commit()
+        except Exception:
+            self.invalidate(session.id)
+            raise
+        if count != expected:
+            # 期间有其他进程写入同一会话，下次重新加载
+            self.invalidate(session.id)
+            return
+        entry.message_count = expected
+        self._put(session.id, entry)
+
+
+history_cache = HistoryCache(
+    max_sessions=settings.HISTORY_CACHE_SESSIONS,
+    window_rounds=settings.MAX_HISTORY_ROUNDS,
+    summary_budget=settings.HISTORY_SUMMARY_BUDGET,
+)
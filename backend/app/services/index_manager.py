@@ -0,0 +1,302 @@
+import json
+import logging
+import math
+import threading
+from typing import Any, Callable, Iterator
+
+from ..config import get_settings
+
+settings = get_settings()
+
+logger = logging.getLogger(__name__)
+
+_METRIC_TYPE = "IP"
+# 向量数少于该值时使用FLAT（精确检索），建索引的收益不抵训练开销
+_FLAT_MAX_ROWS = 10_000
+# 向量数达到该值后使用IVF_SQ8：HNSW图与原始向量的内存占用过大，SQ8每维只占1字节
+_QUANTIZED_MIN_ROWS = 2_000_000
+# IVF类索引的nlist与期望值相差超过该倍数时重建
+_NLIST_DRIFT = 2.0
+
+INDEX_TYPES = ("auto", "FLAT", "HNSW", "IVF_FLAT", "IVF_SQ8")
+
+
+def _ivf_nlist(rows: int) -> int:
+    return int(min(max(4 * math.sqrt(rows), 1024), 65536))
+
+
+def choose_index_params(rows: int, dim: int) -> dict:
+    """按向量数与维度选择Milvus索引类型与建索引参数
+
+    少量向量用FLAT；中等规模用HNSW（维度高时加大M保证召回）；
+    超大规模用IVF_SQ8，nlist约为4*sqrt(rows)。
+    """
+    if rows < _FLAT_MAX_ROWS:
+        return {"index_type": "FLAT", "metric_type": _METRIC_TYPE, "params": {}}
+    if rows < _QUANTIZED_MIN_ROWS:
+        return {
+            "index_type": "HNSW",
+            "metric_type": _METRIC_TYPE,
+            "params": {"M": 16 if dim <= 256 else 32, "efConstruction": 200},
+        }
+    return {
+        "index_type": "IVF_SQ8",
+        "metric_type": _METRIC_TYPE,
+        "params": {"nlist": _ivf_nlist(rows)},
+    }
+
+
+def search_params_for(
+    index_params: dict,
+    top_k: int,
+    nprobe: int | None = None,
+    ef: int | None = None,
+) -> dict:
+    """按索引类型给出检索参数，nprobe/ef为单次请求的覆盖值
+
+    IVF类默认探查nlist的2%（8至256之间），HNSW默认ef=max(64, 2*top_k)；
+    覆盖值会被限制在有效范围内（nprobe不超过nlist，ef不小于top_k）。
+    """
+    index_type = index_params.get("index_type", "FLAT")
+    build = index_params.get("params", {})
+    params: dict = {}
+    if index_type.startswith("IVF"):
+        nlist = int(build.get("nlist", 1024))
+        default = min(max(nlist // 50, 8), 256)
+        params["nprobe"] = min(max(nprobe or default, 1), nlist)
+    elif index_type == "HNSW":
+        params["ef"] = min(max(ef or max(64, 2 * top_k), top_k), 32768)
+    return {"metric_type": index_params.get("metric_type", _METRIC_TYPE), "params": params}
+
+
+def _needs_rebuild(current: dict | None, desired: dict) -> bool:
+    if current is None or current.get("index_type") != desired["index_type"]:
+        return True
+    if desired["index_type"].startswith("IVF"):
+        have = int(current.get("params", {}).get("nlist", 0)) or 1
+        want = desired["params"]["nlist"]
+        return max(have, want) / min(have, want) >= _NLIST_DRIFT
+    return False
+
+
+VECTOR_FIELDS = ["kb_id", "doc_id", "chunk_index", "embedding"]
+
+
+def query_pages(
+    collection,
+    expr: str,
+    output_fields: list[str],
+    partition_names: list[str] | None = None,
+    batch_size: int = 1000,
+) -> Iterator[list[dict]]:
+    """以query_iterator分页读取满足表达式的全部行，不受单次query结果条数上限的限制"""
+    iterator = collection.query_iterator(
+        batch_size=batch_size,
+        expr=expr,
+        output_fields=output_fields,
+        partition_names=partition_names,
+    )
+    try:
+        while True:
+            page = iterator.next()
+            if not page:
+                return
+            yield page
+    finally:
+        iterator.close()
+
+
+class IndexManager:
+    """维护Milvus向量集合的索引：按向量数选择索引，跨过阈值后在后台线程重建
+
+    写入后调用note_inserted累计新增行数，每累计check_rows行查询一次集合行数并判断是否重建。
+    重建不触碰正在服务的集合：先由create_shadow建立同结构的影子集合，分页复制全部分区的向量，
+    建好新索引并加载后，再由activate把集合别名切换到影子集合；旧索引一直服务到切换为止，检索不等待重建。
+    重建期间经write执行的写操作同时记入日志，切换前在影子集合上按序重放（重放须可重复执行）；
+    其他进程在重建期间的写入不会记入日志，部署多个写入进程时应只在一个进程中触发重建。
+    index_type不为auto时固定使用该索引类型（参数仍按规模确定）。
+    """
+
+    def __init__(
+        self,
+        field_name: str = "embedding",
+        index_type: str = "auto",
+        check_rows: int = 10_000,
+        copy_batch_size: int = 2000,
+        background: bool = True,
+        create_shadow: Callable[[Any], Any] | None = None,
+        activate: Callable[[Any, Any], None] | None = None,
+    ):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"不支持的索引类型: {index_type}")
+        self.field_name = field_name
+        self.index_type = index_type
+        self.check_rows = check_rows
+        self.copy_batch_size = copy_batch_size
+        self.background = background
+        self.create_shadow = create_shadow
+        self.activate = activate
+        self._lock = threading.Lock()
+        # 写操作与重建的切换互斥，保证切换前记录的写入都已在影子集合上重放
+        self._write_lock = threading.Lock()
+        self._journal: list[Callable[[Any], Any]] | None = None
+        self._thread: threading.Thread | None = None
+        self._current: dict | None = None
+        self._pending_rows = 0
+
+    def bind(self, create_shadow: Callable[[Any], Any], activate: Callable[[Any, Any], None]) -> None:
+        """设置建立影子集合与切换别名的函数（由milvus_client提供）"""
+        self.create_shadow = create_shadow
+        self.activate = activate
+
+    def desired_params(self, rows: int, dim: int) -> dict:
+        params = choose_index_params(rows, dim)
+        if self.index_type in ("auto", params["index_type"]):
+            return params
+        # 固定索引类型时参数仍按规模确定
+        if self.index_type == "HNSW":
+            return choose_index_params(_FLAT_MAX_ROWS, dim)
+        params = {"index_type": self.index_type, "metric_type": _METRIC_TYPE, "params": {}}
+        if self.index_type.startswith("IVF"):
+            params["params"]["nlist"] = _ivf_nlist(rows)
+        return params
+
+    @property
+    def current_params(self) -> dict | None:
+        return self._current
+
+    def _index_of(self, collection) -> dict | None:
+        indexes = [i for i in collection.indexes if i.field_name == self.field_name]
+        if not indexes:
+            return None
+        params = dict(indexes[0].params)
+        if isinstance(params.get("params"), str):
+            # 部分pymilvus版本以JSON字符串返回params
+            params["params"] = json.loads(params["params"])
+        return params
+
+    def attach(self, collection) -> None:
+        """读取集合上已有的索引；集合没有索引时按当前规模创建"""
+        current = self._index_of(collection)
+        if current is not None:
+            self._current = current
+            return
+        params = self.desired_params(collection.num_entities, _dim_of(collection, self.field_name))
+        collection.create_index(field_name=self.field_name, index_params=params)
+        self._current = params
+
+    def note_inserted(self, collection, rows: int) -> None:
+        """记录新增行数，累计到check_rows后检查是否需要重建索引"""
+        with self._lock:
+            self._pending_rows += rows
+            if self._pending_rows < self.check_rows:
+                return
+            self._pending_rows = 0
+        self.maybe_rebuild(collection)
+
+    def write(self, collection, op: Callable[[Any], Any], replay: Callable[[Any], Any] | None = None):
+        """在集合上执行写操作并返回其结果；重建进行中时把replay（默认同op）记入日志"""
+        with self._write_lock:
+            result = op(collection)
+            if self._journal is not None:
+                self._journal.append(replay or op)
+            return result
+
+    def maybe_rebuild(self, collection) -> bool:
+        """规模跨过阈值时（后台）重建索引，返回是否触发了重建"""
+        if self.create_shadow is None or self.activate is None:
+            return False
+        desired = self.desired_params(collection.num_entities, _dim_of(collection, self.field_name))
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return False
+            # 别名可能已被其他进程切换到新集合，以集合上的索引为准
+            self._current = self._index_of(collection) or self._current
+            if not _needs_rebuild(self._current, desired):
+                return False
+            if self.background:
+                self._thread = threading.Thread(
+                    target=self._rebuild,
+                    args=(collection, desired),
+                    name="milvus-index-rebuild",
+                    daemon=True,
+                )
+                self._thread.start()
+                return True
+        self._rebuild(collection, desired)
+        return True
+
+    def _rebuild(self, collection, params: dict) -> None:
+        shadow = None
+        try:
+            logger.info("重建向量索引: %s -> %s", self._current, params)
+            shadow = self.create_shadow(collection)
+            # 先开始记录写入再复制：复制期间的写入可能已被复制，重放须可重复执行
+            with self._write_lock:
+                self._journal = []
+            for partition in collection.partitions:
+                if not shadow.has_partition(partition.name):
+                    shadow.create_partition(partition.name)
+                for page in query_pages(
+                    collection,
+                    "id >= 0",
+                    VECTOR_FIELDS,
+                    partition_names=[partition.name],
+                    batch_size=self.copy_batch_size,
+                ):
+                    shadow.insert(
+                        [[row[f] for row in page] for f in VECTOR_FIELDS],
+                        partition_name=partition.name,
+                    )
+            shadow.create_index(field_name=self.field_name, index_params=params)
+            shadow.load()
+            # 先在锁外重放大部分日志，最后一段在锁内重放并切换
+            self._replay(shadow, hold=False)
+            with self._write_lock:
+                self._replay(shadow, hold=True)
+                self.activate(collection, shadow)
+                self._journal = None
+                self._current = params
+        except Exception:
+            logger.exception("重建向量索引失败，旧索引继续服务")
+            with self._write_lock:
+                self._journal = None
+            if shadow is not None:
+                try:
+                    shadow.release()
+                    shadow.drop()
+                except Exception:
+                    logger.exception("删除影子集合失败")
+
+    def _replay(self, shadow, hold: bool) -> None:
+        while True:
+            if hold:
+                ops, self._journal = self._journal, []
+            else:
+                with self._write_lock:
+                    ops, self._journal = self._journal, []
+            if not ops:
+                return
+            for op in ops:
+                op(shadow)
+
+    def wait_for_rebuild(self, timeout: float | None = None) -> None:
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def search_params(self, top_k: int, nprobe: int | None = None, ef: int | None = None) -> dict:
+        return search_params_for(self._current or {}, top_k, nprobe=nprobe, ef=ef)
+
+
+def _dim_of(collection, field_name: str) -> int:
+    for field in collection.schema.fields:
+        if field.name == field_name:
+            return int(field.params.get("dim", 0))
+    return 0
+
+
+index_manager = IndexManager(
+    index_type=settings.MILVUS_INDEX_TYPE,
+    check_rows=settings.MILVUS_INDEX_CHECK_ROWS,
+)
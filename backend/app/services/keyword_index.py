@@ -0,0 +1,409 @@
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import threading
+from array import array
+from collections import Counter
+from collections.abc import Iterable, Sequence
+from pathlib import Path
+
+from ..config import get_settings
+
+settings = get_settings()
+
+_CJK_RUN_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[A-Za-z0-9]+")
+
+# 基础段每个文档记录的字段：chunk_id, kb_id, doc_id, chunk_index, 长度
+_DOC_FIELDS = 5
+_FORMAT_VERSION = 1
+
+
+def tokenize(text: str) -> list[str]:
+    """切分检索词：汉字串取字符二元组（单字串取单字），字母数字串整体小写"""
+    terms: list[str] = []
+    for match in _CJK_RUN_PATTERN.finditer(text):
+        run = match.group(0)
+        if run.isascii():
+            terms.append(run.lower())
+        elif len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i : i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def _load_uint32(path: Path) -> tuple[mmap.mmap | None, Sequence[int]]:
+    """以只读mmap方式加载uint32数组文件，空文件返回空序列"""
+    if not path.exists() or path.stat().st_size == 0:
+        return None, array("I")
+    with path.open("rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return mm, memoryview(mm).cast("I")
+
+
+class KeywordIndex:
+    """基于字符n-gram倒排索引的BM25关键词检索
+
+    索引由两部分组成：落盘的基础段（倒排表与文档表为uint32数组，以mmap只读加载，
+    词典为JSON）和内存中的增量段。新增、修改、删除只作用于增量段与基础段的删除标记，
+    同时追加写入日志文件；compact()将两者合并重写为新的基础段并清空日志。
+    path为None时仅在内存中维护，不落盘。
+    """
+
+    def __init__(
+        self,
+        path: str | Path | None = None,
+        k1: float = 1.2,
+        b: float = 0.75,
+        compact_threshold: int = 5000,
+    ):
+        self.path = Path(path) if path else None
+        self.k1 = k1
+        self.b = b
+        self.compact_threshold = compact_threshold
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._reset()
+
+    def _reset(self) -> None:
+        self._mmaps: list[mmap.mmap] = []
+        self._terms: dict[str, tuple[int, int]] = {}
+        self._postings: Sequence[int] = array("I")
+        self._docs: Sequence[int] = array("I")
+        self._base_slots: dict[int, int] = {}
+        self._base_length = 0
+        self._dead: set[int] = set()
+        self._delta_docs: dict[int, tuple[int, int, int, int, Counter]] = {}
+        self._delta_postings: dict[str, dict[int, int]] = {}
+        self._delta_length = 0
+        self._journal_ops = 0
+
+    # ---- 加载与落盘 ----
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            if self.path is not None:
+                self._load_base()
+                self._replay_journal()
+            self._loaded = True
+
+    def warm_up(self) -> int:
+        """加载索引文件并回放日志，返回已索引的块数"""
+        self._ensure_loaded()
+        return len(self)
+
+    def _load_base(self) -> None:
+        meta_path = self.path / "meta.json"
+        if not meta_path.exists():
+            return
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        if meta.get("version") != _FORMAT_VERSION:
+            return
+        self._terms = {
+            term: (start, count)
+            for term, (start, count) in json.loads(
+                (self.path / "terms.json").read_text(encoding="utf-8")
+            ).items()
+        }
+        for name, attr in (("postings.bin", "_postings"), ("docs.bin", "_docs")):
+            mm, view = _load_uint32(self.path / name)
+            if mm is not None:
+                self._mmaps.append(mm)
+            setattr(self, attr, view)
+        docs = self._docs
+        for slot in range(len(docs) // _DOC_FIELDS):
+            base = slot * _DOC_FIELDS
+            self._base_slots[docs[base]] = slot
+            self._base_length += docs[base + 4]
+
+    def _replay_journal(self) -> None:
+        journal = self.path / "journal.jsonl"
+        if not journal.exists():
+            return
+        with journal.open(encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                op = json.loads(line)
+                if op["op"] == "add":
+                    self._add(op["id"], op["kb"], op["doc"], op["idx"], op["text"])
+                else:
+                    self._remove(op["id"])
+                self._journal_ops += 1
+
+    def _append_journal(self, ops: list[dict]) -> None:
+        if self.path is None or not ops:
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+        with (self.path / "journal.jsonl").open("a", encoding="utf-8") as f:
+            for op in ops:
+                f.write(json.dumps(op, ensure_ascii=False) + "\n")
+        self._journal_ops += len(ops)
+
+    def compact(self) -> None:
+        """合并基础段与增量段，重写为新的基础段并清空日志"""
+        self._ensure_loaded()
+        if self.path is None:
+            return
+        with self._lock:
+            postings: dict[str, list[tuple[int, int]]] = {}
+            docs = array("I")
+            slot = 0
+            for chunk_id, (kb_id, doc_id, idx, length, tfs) in self._iter_live_docs():
+                docs.extend((chunk_id, kb_id, doc_id, idx, length))
+                for term, tf in tfs.items():
+                    postings.setdefault(term, []).append((slot, tf))
+                slot += 1
+
+            terms: dict[str, tuple[int, int]] = {}
+            flat = array("I")
+            for term, items in postings.items():
+                terms[term] = (len(flat) // 2, len(items))
+                for pair in items:
+                    flat.extend(pair)
+
+            self.path.mkdir(parents=True, exist_ok=True)
+            self._write(self.path / "postings.bin", flat.tobytes())
+            self._write(self.path / "docs.bin", docs.tobytes())
+            self._write(
+                self.path / "terms.json",
+                json.dumps(terms, ensure_ascii=False).encode("utf-8"),
+            )
+            self._write(
+                self.path / "meta.json",
+                json.dumps({"version": _FORMAT_VERSION, "docs": slot}).encode("utf-8"),
+            )
+            journal = self.path / "journal.jsonl"
+            if journal.exists():
+                journal.unlink()
+
+            self._close()
+            self._reset()
+            self._load_base()
+
+    def _close(self) -> None:
+        for view in (self._postings, self._docs):
+            if isinstance(view, memoryview):
+                view.release()
+        for mm in self._mmaps:
+            mm.close()
+
+    def maybe_compact(self) -> None:
+        """增量日志超过阈值时执行合并"""
+        if self.path is not None and self._journal_ops >= self.compact_threshold:
+            self.compact()
+
+    @staticmethod
+    def _write(path: Path, data: bytes) -> None:
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def _iter_live_docs(self):
+        docs = self._docs
+        base_tfs: dict[int, Counter] = {}
+        for term, (start, count) in self._terms.items():
+            for i in range(start, start + count):
+                slot = self._postings[2 * i]
+                if slot not in self._dead:
+                    base_tfs.setdefault(slot, Counter())[term] = self._postings[2 * i + 1]
+        for slot in range(len(docs) // _DOC_FIELDS):
+            if slot in self._dead:
+                continue
+            base = slot * _DOC_FIELDS
+            yield docs[base], (
+                docs[base + 1],
+                docs[base + 2],
+                docs[base + 3],
+                docs[base + 4],
+                base_tfs.get(slot, Counter()),
+            )
+        yield from self._delta_docs.items()
+
+    # ---- 增量更新 ----
+
+    def _add(self, chunk_id: int, kb_id: int, doc_id: int, idx: int, text: str) -> None:
+        self._remove(chunk_id)
+        tfs = Counter(tokenize(text))
+        length = sum(tfs.values())
+        self._delta_docs[chunk_id] = (kb_id, doc_id, idx, length, tfs)
+        self._delta_length += length
+        for term, tf in tfs.items():
+            self._delta_postings.setdefault(term, {})[chunk_id] = tf
+
+    def _remove(self, chunk_id: int) -> None:
+        slot = self._base_slots.get(chunk_id)
+        if slot is not None and slot not in self._dead:
+            self._dead.add(slot)
+            self._base_length -= self._docs[slot * _DOC_FIELDS + 4]
+        entry = self._delta_docs.pop(chunk_id, None)
+        if entry is not None:
+            self._delta_length -= entry[3]
+            for term in entry[4]:
+                bucket = self._delta_postings.get(term)
+                if bucket is not None:
+                    bucket.pop(chunk_id, None)
+                    if not bucket:
+                        del self._delta_postings[term]
+
+    def add_chunks(self, items: Iterable[tuple[int, int, int, int, str]]) -> None:
+        """新增或覆盖块，items为(chunk_id, kb_id, doc_id, chunk_index, 文本)"""
+        self._ensure_loaded()
+        with self._lock:
+            ops = []
+            for chunk_id, kb_id, doc_id, idx, text in items:
+                self._add(chunk_id, kb_id, doc_id, idx, text)
+                ops.append(
+                    {
+                        "op": "add",
+                        "id": chunk_id,
+                        "kb": kb_id,
+                        "doc": doc_id,
+                        "idx": idx,
+                        "text": text,
+                    }
+                )
+            self._append_journal(ops)
+
+    def update_chunk(self, chunk_id: int, text: str) -> bool:
+        """更新已索引块的文本，块未被索引时返回False"""
+        meta = self.get_meta(chunk_id)
+        if meta is None:
+            return False
+        self.add_chunks([(chunk_id, *meta, text)])
+        return True
+
+    def remove_chunks(self, chunk_ids: Iterable[int]) -> None:
+        self._ensure_loaded()
+        with self._lock:
+            ops = []
+            for chunk_id in chunk_ids:
+                if self._contains(chunk_id):
+                    self._remove(chunk_id)
+                    ops.append({"op": "remove", "id": chunk_id})
+            self._append_journal(ops)
+
+    def remove_kb(self, kb_id: int) -> None:
+        self._ensure_loaded()
+        with self._lock:
+            ids = [cid for cid, entry in self._delta_docs.items() if entry[0] == kb_id]
+            docs = self._docs
+            for chunk_id, slot in self._base_slots.items():
+                if slot not in self._dead and docs[slot * _DOC_FIELDS + 1] == kb_id:
+                    ids.append(chunk_id)
+        self.remove_chunks(ids)
+
+    def _contains(self, chunk_id: int) -> bool:
+        slot = self._base_slots.get(chunk_id)
+        return chunk_id in self._delta_docs or (slot is not None and slot not in self._dead)
+
+    def get_meta(self, chunk_id: int) -> tuple[int, int, int] | None:
+        """返回已索引块的(kb_id, doc_id, chunk_index)"""
+        self._ensure_loaded()
+        entry = self._delta_docs.get(chunk_id)
+        if entry is not None:
+            return entry[0], entry[1], entry[2]
+        slot = self._base_slots.get(chunk_id)
+        if slot is None or slot in self._dead:
+            return None
+        base = slot * _DOC_FIELDS
+        return self._docs[base + 1], self._docs[base + 2], self._docs[base + 3]
+
+    # ---- 检索 ----
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self._base_slots) - len(self._dead) + len(self._delta_docs)
+
+    def search(
+        self,
+        query: str,
+        kb_ids: Sequence[int],
+        top_k: int = 5,
+    ) -> list[dict]:
+        """BM25检索，返回与向量检索相同结构的命中列表"""
+        self._ensure_loaded()
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            total = len(self)
+            if total == 0:
+                return []
+            avgdl = (self._base_length + self._delta_length) / total or 1.0
+            kb_filter = set(kb_ids)
+            docs = self._docs
+            postings = self._postings
+            k1, b = self.k1, self.b
+            # 分数以(段, 位置)为键：基础段为槽位，增量段为chunk_id
+            scores: dict[tuple[int, int], float] = {}
+
+            for term in terms:
+                base_range = self._terms.get(term)
+                delta = self._delta_postings.get(term, {})
+                df = len(delta) + (base_range[1] if base_range else 0)
+                if df == 0:
+                    continue
+                idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+                if base_range is not None:
+                    start, count = base_range
+                    for i in range(start, start + count):
+                        slot = postings[2 * i]
+                        if slot in self._dead:
+                            continue
+                        base = slot * _DOC_FIELDS
+                        if kb_filter and docs[base + 1] not in kb_filter:
+                            continue
+                        tf = postings[2 * i + 1]
+                        norm = k1 * (1 - b + b * docs[base + 4] / avgdl)
+                        key = (0, slot)
+                        scores[key] = scores.get(key, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+                for chunk_id, tf in delta.items():
+                    entry = self._delta_docs[chunk_id]
+                    if kb_filter and entry[0] not in kb_filter:
+                        continue
+                    norm = k1 * (1 - b + b * entry[3] / avgdl)
+                    key = (1, chunk_id)
+                    scores[key] = scores.get(key, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+
+            hits: list[dict] = []
+            for (segment, pos), score in heapq.nlargest(
+                top_k, scores.items(), key=lambda item: item[1]
+            ):
+                if segment == 0:
+                    base = pos * _DOC_FIELDS
+                    kb_id, doc_id, idx = docs[base + 1], docs[base + 2], docs[base + 3]
+                else:
+                    kb_id, doc_id, idx = self._delta_docs[pos][:3]
+                hits.append(
+                    {"score": score, "kb_id": kb_id, "doc_id": doc_id, "chunk_index": idx}
+                )
+            return hits
+
+
+def reciprocal_rank_fusion(
+    *ranked_lists: Sequence[dict],
+    k: int = 60,
+    top_k: int | None = None,
+) -> list[dict]:
+    """倒数排名融合：各列表按名次累加1/(k+rank)，以(doc_id, chunk_index)识别同一块"""
+    fused: dict[tuple[int, int], dict] = {}
+    for hits in ranked_lists:
+        for rank, hit in enumerate(hits, start=1):
+            key = (hit["doc_id"], hit["chunk_index"])
+            entry = fused.setdefault(key, {**hit, "score": 0.0})
+            entry["score"] += 1.0 / (k + rank)
+    ranked = sorted(fused.values(), key=lambda h: h["score"], reverse=True)
+    return ranked[:top_k] if top_k is not None else ranked
+
+
+keyword_index = KeywordIndex(
+    None if settings.TESTING else Path(settings.DATA_DIR) / "keyword_index"
+)
@@ -0,0 +1,266 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+
+import httpx
+
+from ..config import get_settings
+from ..metrics import counter, gauge
+
+settings = get_settings()
+
+LLM_LIMIT = gauge("llm_concurrency_limit", "大模型调用的自适应并发上限")
+LLM_INFLIGHT = gauge("llm_inflight_requests", "进行中的大模型调用数")
+LLM_QUEUED = gauge("llm_queued_requests", "排队等待的大模型调用数")
+LLM_REJECTED = counter("llm_rejected_total", "被拒绝的大模型调用数", ("reason",))
+LLM_OUTCOMES = counter("llm_calls_total", "大模型调用结果", ("outcome",))
+
+# 平滑观测延迟的指数加权系数
+_EWMA_ALPHA = 0.2
+# 基准延迟取最近窗口内首token延迟的该分位数，窗口样本少于_MIN_SAMPLES时不按延迟调整
+_BASELINE_QUANTILE = 0.1
+_MIN_SAMPLES = 10
+
+
+class SchedulerRejected(Exception):
+    """排队已满、预计等待过长或排队超时，调用方应尽快返回繁忙提示"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def is_rate_limited(exc: BaseException | None) -> bool:
+    """大模型接口返回429（限流）"""
+    return isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code == 429
+
+
+class Ticket:
+    """一次大模型调用的排队凭证：wait()等待获得执行名额，release()归还并上报结果"""
+
+    def __init__(self, scheduler: "LLMScheduler", user_id: int):
+        self.scheduler = scheduler
+        self.user_id = user_id
+        self.enqueued_at = time.monotonic()
+        self.granted_at: float | None = None
+        self.released = False
+        self._granted = asyncio.get_running_loop().create_future()
+
+    @property
+    def granted(self) -> bool:
+        return self.granted_at is not None
+
+    async def wait(self, interval: float = 1.0):
+        """等待执行名额，排队期间每interval秒（位置变化时）产出当前排队位置
+
+        超过排队时限时抛出SchedulerRejected。
+        """
+        deadline = self.enqueued_at + self.scheduler.queue_timeout
+        last = None
+        while not self._granted.done():
+            position = self.scheduler.position(self)
+            if position != last:
+                last = position
+                yield position
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.scheduler._reject_waiting(self, "timeout")
+                raise SchedulerRejected("timeout")
+            try:
+                await asyncio.wait_for(asyncio.shield(self._granted), min(interval, remaining))
+            except asyncio.TimeoutError:
+                pass
+
+    def release(
+        self,
+        first_token_latency: float | None = None,
+        error: BaseException | None = None,
+    ) -> None:
+        """归还名额并上报结果：首token延迟用于延迟信号，429错误触发乘性减小并发上限"""
+        if self.released:
+            return
+        self.released = True
+        self.scheduler._release(self, first_token_latency, error)
+
+
+class LLMScheduler:
+    """大模型调用的准入控制与按用户公平调度
+
+    全局并发上限为limit，超出的调用按用户分队列、各用户之间轮转出队，单个用户的大量请求
+    不会饿死其他用户。排队数达到max_queue，或按平均占用时长估算的等待超过queue_timeout时立即拒绝；
+    已排队的调用超过queue_timeout也会被拒绝。
+
+    并发上限按AIMD自适应：收到429时乘以backoff（每个平均占用时长内最多一次），
+    首token延迟超过基准延迟的latency_tolerance倍时乘以0.9，
+    其余成功调用每次增加1/limit（约每轮增加1），范围在[min_concurrency, max_concurrency]之间。
+    基准延迟取最近latency_window次首token延迟的低分位数（10%）而非历史最小值：
+    个别异常快的调用不会把基准压低，基准也会随窗口滑动跟上服务端延迟的持续变化。
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        min_concurrency: int = 1,
+        max_queue: int = 100,
+        queue_timeout: float = 30.0,
+        backoff: float = 0.5,
+        latency_tolerance: float = 2.0,
+        latency_window: int = 100,
+    ):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.limit = float(max_concurrency)
+        self.inflight = 0
+        self._queues: OrderedDict[int, deque[Ticket]] = OrderedDict()
+        self._queued = 0
+        self._hold_time: float | None = None
+        self._latencies: deque[float] = deque(maxlen=latency_window)
+        self._last_decrease = 0.0
+        self._update_gauges()
+
+    @property
+    def capacity(self) -> int:
+        return max(self.min_concurrency, int(self.limit))
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    @property
+    def baseline_latency(self) -> float | None:
+        """最近窗口内首token延迟的低分位数，样本不足时为None"""
+        if len(self._latencies) < _MIN_SAMPLES:
+            return None
+        return sorted(self._latencies)[int(len(self._latencies) * _BASELINE_QUANTILE)]
+
+    def _update_gauges(self) -> None:
+        LLM_LIMIT.set(self.limit)
+        LLM_INFLIGHT.set(self.inflight)
+        LLM_QUEUED.set(self._queued)
+
+    def position(self, ticket: Ticket) -> int:
+        """按轮转出队顺序估算排在该调用之前的调用数，已获得名额时为0"""
+        if ticket.granted:
+            return 0
+        queue = self._queues.get(ticket.user_id)
+        if not queue or ticket not in queue:
+            return 0
+        index = queue.index(ticket)
+        ahead = index
+        before = True
+        for user_id, other in self._queues.items():
+            if user_id == ticket.user_id:
+                before = False
+                continue
+            ahead += min(len(other), index + (1 if before else 0))
+        return ahead
+
+    def estimated_wait(self, position: int) -> float:
+        if self._hold_time is None:
+            return 0.0
+        return (position + 1) * self._hold_time / self.capacity
+
+    def submit(self, user_id: int) -> Ticket:
+        """申请一次调用名额：有空闲名额时立即获得，否则进入该用户的队列；需要拒绝时抛出SchedulerRejected"""
+        ticket = Ticket(self, user_id)
+        if self.inflight < self.capacity and not self._queued:
+            self._grant(ticket)
+            return ticket
+        if self._queued >= self.max_queue:
+            LLM_REJECTED.inc("queue_full")
+            raise SchedulerRejected("queue_full")
+        if self.estimated_wait(self._queued) > self.queue_timeout:
+            LLM_REJECTED.inc("wait_too_long")
+            raise SchedulerRejected("wait_too_long")
+        self._queues.setdefault(user_id, deque()).append(ticket)
+        self._queued += 1
+        self._update_gauges()
+        return ticket
+
+    def _grant(self, ticket: Ticket) -> None:
+        self.inflight += 1
+        ticket.granted_at = time.monotonic()
+        if not ticket._granted.done():
+            ticket._granted.set_result(None)
+        self._update_gauges()
+
+    def _dispatch(self) -> None:
+        while self._queued and self.inflight < self.capacity:
+            user_id, queue = next(iter(self._queues.items()))
+            ticket = queue.popleft()
+            self._queued -= 1
+            if queue:
+                # 该用户还有排队的调用，轮转到队尾
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+            self._grant(ticket)
+        self._update_gauges()
+
+    def _remove_waiting(self, ticket: Ticket) -> None:
+        queue = self._queues.get(ticket.user_id)
+        if queue is None or ticket not in queue:
+            return
+        queue.remove(ticket)
+        self._queued -= 1
+        if not queue:
+            del self._queues[ticket.user_id]
+        self._update_gauges()
+
+    def _reject_waiting(self, ticket: Ticket, reason: str) -> None:
+        self._remove_waiting(ticket)
+        ticket.released = True
+        LLM_REJECTED.inc(reason)
+
+    def _release(
+        self,
+        ticket: Ticket,
+        first_token_latency: float | None,
+        error: BaseException | None,
+    ) -> None:
+        if not ticket.granted:
+            # 排队期间客户端断开
+            self._remove_waiting(ticket)
+            return
+        self.inflight -= 1
+        hold = time.monotonic() - ticket.granted_at
+        self._hold_time = hold if self._hold_time is None else (
+            (1 - _EWMA_ALPHA) * self._hold_time + _EWMA_ALPHA * hold
+        )
+
+        if is_rate_limited(error):
+            LLM_OUTCOMES.inc("rate_limited")
+            self._decrease(self.backoff)
+        elif error is not None:
+            LLM_OUTCOMES.inc("error")
+        else:
+            LLM_OUTCOMES.inc("ok")
+            latency = first_token_latency
+            if latency is not None:
+                self._latencies.append(latency)
+            baseline = self.baseline_latency
+            if latency is not None and baseline is not None and latency > baseline * self.latency_tolerance:
+                self._decrease(0.9)
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+        self._dispatch()
+
+    def _decrease(self, factor: float) -> None:
+        now = time.monotonic()
+        # 同一拥塞事件中先后返回的多个信号只减小一次
+        if self._hold_time is not None and now - self._last_decrease < self._hold_time:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.min_concurrency), self.limit * factor)
+
+
+llm_scheduler = LLMScheduler(
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    min_concurrency=settings.LLM_MIN_CONCURRENCY,
+    max_queue=settings.LLM_MAX_QUEUE,
+    queue_timeout=settings.LLM_QUEUE_TIMEOUT,
+)
@@ -0,0 +1,144 @@
+import re
+from typing import List, Tuple
+
+
+HEADING_SEPARATOR = " > "
+
+_FENCE_PATTERN = re.compile(r"\s{0,3}(`{3,}|~{3,})")
+_ATX_HEADING_PATTERN = re.compile(r"\s{0,3}(#{1,6})(?:\s+(.*?))?(?:\s+#+)?\s*$")
+_SETEXT_PATTERN = re.compile(r"\s{0,3}(=+|-+)\s*$")
+_HR_PATTERN = re.compile(r"\s{0,3}([-*_])(?:\s*\1){2,}\s*$")
+_TABLE_SEP_PATTERN = re.compile(r"\s*\|?\s*:?-+:?\s*(?:\|\s*:?-+:?\s*)*\|?\s*$")
+_LINK_DEF_PATTERN = re.compile(r"\s{0,3}\[[^\]]+\]:\s*\S+")
+_BLOCK_PREFIX_PATTERN = re.compile(
+    r"\s*(?:>\s?)*\s*(?:[-*+]\s+(?:\[[ xX]\]\s+)?|\d{1,9}[.)]\s+)?"
+)
+_CODE_SPAN_PATTERN = re.compile(r"(`+)(.+?)\1")
+_IMAGE_PATTERN = re.compile(r"!\[([^\]]*)\]\([^)]*\)")
+_LINK_PATTERN = re.compile(r"\[([^\]]+)\](?:\([^)]*\)|\[[^\]]*\])")
+_AUTOLINK_PATTERN = re.compile(r"<((?:https?|mailto):[^>\s]+)>")
+_HTML_PATTERN = re.compile(r"<!--.*?-->|</?[A-Za-z][^>]*>", re.S)
+_EMPHASIS_PATTERN = re.compile(
+    r"(\*\*|\*|~~|(?<!\w)__|(?<!\w)_)(?=\S)(.+?)(?<=\S)\1"
+)
+_ESCAPE_PATTERN = re.compile(r"\\([\\`*_{}\[\]()#+\-.!|>~])")
+
+# (标题路径, 正文)
+Section = Tuple[str, str]
+
+
+def _strip_inline_plain(text: str) -> str:
+    text = _IMAGE_PATTERN.sub(r"\1", text)
+    text = _LINK_PATTERN.sub(r"\1", text)
+    text = _AUTOLINK_PATTERN.sub(r"\1", text)
+    text = _HTML_PATTERN.sub("", text)
+    # 嵌套的强调（如***粗斜体***）需要多轮剥离，通常一到两轮即可稳定
+    for _ in range(3):
+        stripped = _EMPHASIS_PATTERN.sub(r"\2", text)
+        if stripped == text:
+            break
+        text = stripped
+    return _ESCAPE_PATTERN.sub(r"\1", text)
+
+
+def strip_inline_markup(text: str) -> str:
+    """去除行内Markdown标记，行内代码原样保留内容"""
+    if "`" not in text:
+        return _strip_inline_plain(text)
+    parts: List[str] = []
+    pos = 0
+    for match in _CODE_SPAN_PATTERN.finditer(text):
+        parts.append(_strip_inline_plain(text[pos : match.start()]))
+        parts.append(match.group(2).strip())
+        pos = match.end()
+    parts.append(_strip_inline_plain(text[pos:]))
+    return "".join(parts)
+
+
+def markdown_to_sections(content: str) -> List[Section]:
+    """将Markdown转换为按标题划分的纯文本段落
+
+    返回[(标题路径, 正文)]，标题路径形如“苏州 > 交通”，文档开头无标题的部分路径为空。
+    标题本身不写入正文，作为块的元数据保存；代码块保留内容、去掉围栏，
+    表格按单元格以空格连接，其余标记（强调、链接、图片、HTML标签等）全部剥离。
+    """
+    sections: List[Section] = []
+    stack: List[Tuple[int, str]] = []
+    body: List[str] = []
+    fence: str | None = None
+    # 上一行是否为普通段落行，只有普通段落行下方的=/-才构成Setext标题
+    prev_plain = False
+
+    def close_section() -> None:
+        text = "\n".join(body).strip()
+        body.clear()
+        if text:
+            path = HEADING_SEPARATOR.join(title for _, title in stack)
+            sections.append((path, re.sub(r"\n{3,}", "\n\n", text)))
+
+    def open_section(level: int, title: str) -> None:
+        close_section()
+        while stack and stack[-1][0] >= level:
+            stack.pop()
+        title = strip_inline_markup(title).strip()
+        if title:
+            stack.append((level, title))
+
+    for line in content.splitlines():
+        if fence is not None:
+            if line.strip().startswith(fence):
+                fence = None
+            else:
+                body.append(line)
+            continue
+
+        was_plain, prev_plain = prev_plain, False
+
+        fence_match = _FENCE_PATTERN.match(line)
+        if fence_match:
+            fence = fence_match.group(1)[0] * 3
+            continue
+
+        heading_match = _ATX_HEADING_PATTERN.match(line)
+        if heading_match:
+            open_section(len(heading_match.group(1)), heading_match.group(2) or "")
+            continue
+
+        setext_match = _SETEXT_PATTERN.match(line)
+        if setext_match and was_plain:
+            title = body.pop()
+            open_section(1 if setext_match.group(1)[0] == "=" else 2, title)
+            continue
+
+        if (
+            _HR_PATTERN.match(line)
+            or _TABLE_SEP_PATTERN.match(line)
+            or _LINK_DEF_PATTERN.match(line)
+        ):
+            continue
+
+        stripped = line.strip()
+        if stripped.startswith("|"):
+            cells = [strip_inline_markup(c.strip()) for c in stripped.strip("|").split("|")]
+            body.append(" ".join(c for c in cells if c))
+            continue
+
+        prefix = _BLOCK_PREFIX_PATTERN.match(line)
+        text = line[prefix.end() :].rstrip()
+        prev_plain = bool(text) and not prefix.group(0).strip()
+        body.append(strip_inline_markup(text))
+
+    close_section()
+    return sections
+
+
+def markdown_to_text(content: str) -> str:
+    """将Markdown转换为纯文本，标题以独立的一行纯文本保留"""
+    parts: List[str] = []
+    last_path = ""
+    for path, text in markdown_to_sections(content):
+        if path and path != last_path:
+            parts.append(path.rsplit(HEADING_SEPARATOR, 1)[-1])
+        parts.append(text)
+        last_path = path
+    return "\n\n".join(parts)
@@ -1,34 +1,46 @@
+import re
+import threading
 from typing import Iterable, List, Sequence
 
+import numpy as np
+
 from ..config import get_settings
+from .index_manager import index_manager
+from .vector_store import local_store, partition_name
 
 settings = get_settings()
 
-_pymilvus_available = False
+# pymilvus（连带grpc）导入较慢，首次访问Milvus时才导入；None表示尚未尝试
+_pymilvus = None
+_pymilvus_available: bool | None = None
 
-try:
-    from pymilvus import (  # type: ignore[import]
-        Collection,
-        CollectionSchema,
-        DataType,
-        FieldSchema,
-        connections,
-        utility,
-    )
+# 按(doc_id, chunk_index)查询向量时每次查询的最多行数，远低于Milvus单次查询的结果上限
+_FETCH_BATCH = 1000
+
+# 已确认存在的分区名缓存，避免每次写入与检索都查询Milvus
+_known_partitions: set[str] = set()
+_partition_lock = threading.Lock()
 
-    _pymilvus_available = True
-except Exception:
-    Collection = object  # type: ignore[assignment]
 
+def _load_pymilvus() -> bool:
+    """导入pymilvus，返回是否可用；结果缓存，只尝试一次"""
+    global _pymilvus, _pymilvus_available
+    if _pymilvus_available is None:
+        try:
+            import pymilvus  # type: ignore[import]
 
-_memory_store: list[dict] = []
+            _pymilvus = pymilvus
+            _pymilvus_available = True
+        except Exception:
+            _pymilvus_available = False
+    return _pymilvus_available
 
 
 def _ensure_connection() -> None:
-    if not _pymilvus_available:
+    if not _load_pymilvus():
         return
-    if not connections.has_connection("default"):
-        connections.connect(
+    if not _pymilvus.connections.has_connection("default"):
+        _pymilvus.connections.connect(
             alias="default",
             host=settings.MILVUS_HOST,
             port=settings.MILVUS_PORT,
@@ -36,11 +48,13 @@ def _ensure_connection() -> None:
 
 
 def _ensure_collection(dim: int = 256):
-    if not _pymilvus_available:
+    if not _load_pymilvus():
         return None
     _ensure_connection()
+    FieldSchema, DataType = _pymilvus.FieldSchema, _pymilvus.DataType
     collection_name = settings.MILVUS_COLLECTION
-    if not utility.has_collection(collection_name):
+    if not _pymilvus.utility.has_collection(collection_name):
+        # 数据放在带序号的集合中，以MILVUS_COLLECTION为别名访问，重建索引时切换别名
         fields = [
             FieldSchema(
                 name="id",
@@ -53,39 +67,118 @@ def _ensure_collection(dim: int = 256):
             FieldSchema(name="chunk_index", dtype=DataType.INT64),
             FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=dim),
         ]
-        schema = CollectionSchema(fields, description="文档向量集合")
-        collection = Collection(
-            name=collection_name,
+        schema = _pymilvus.CollectionSchema(fields, description="文档向量集合")
+        _pymilvus.Collection(
+            name=f"{collection_name}_v1",
             schema=schema,
             using="default",
         )
-        index_params = {
-            "index_type": "IVF_FLAT",
-            "metric_type": "IP",
-            "params": {"nlist": 1024},
-        }
-        collection.create_index(field_name="embedding", index_params=index_params)
-    else:
-        collection = Collection(collection_name, using="default")
+        _pymilvus.utility.create_alias(f"{collection_name}_v1", collection_name)
+    collection = _pymilvus.Collection(collection_name, using="default")
+    if index_manager.current_params is None:
+        index_manager.attach(collection)
     return collection
 
 
+def _create_shadow(collection):
+    """建立与当前集合结构相同的影子集合，名称为<MILVUS_COLLECTION>_v<序号>"""
+    base = settings.MILVUS_COLLECTION
+    pattern = re.compile(rf"{re.escape(base)}_v(\d+)")
+    generations = [
+        int(m.group(1))
+        for m in map(pattern.fullmatch, _pymilvus.utility.list_collections())
+        if m is not None
+    ]
+    return _pymilvus.Collection(
+        name=f"{base}_v{max(generations, default=0) + 1}",
+        schema=collection.schema,
+        using="default",
+    )
+
+
+def _activate_shadow(collection, shadow) -> None:
+    """把MILVUS_COLLECTION别名切换到影子集合，再释放并删除旧集合"""
+    utility = _pymilvus.utility
+    base = settings.MILVUS_COLLECTION
+    names = utility.list_collections()
+    if base in names:
+        # 旧版部署直接以该名称建集合：改名后建立同名别名，只在首次重建时发生一次，
+        # 改名与建别名之间的极短时间内访问会失败
+        old = f"{base}_v0"
+        utility.rename_collection(base, old)
+        utility.create_alias(shadow.name, base)
+    else:
+        old = next(
+            (n for n in names if n != shadow.name and base in utility.list_aliases(n)),
+            None,
+        )
+        utility.alter_alias(shadow.name, base)
+    if old is not None:
+        stale = _pymilvus.Collection(old, using="default")
+        stale.release()
+        stale.drop()
+
+
+index_manager.bind(_create_shadow, _activate_shadow)
+
+
+def _has_partition(collection, name: str) -> bool:
+    if name in _known_partitions:
+        return True
+    if collection.has_partition(name):
+        _known_partitions.add(name)
+        return True
+    return False
+
+
+def _is_partition_not_found(exc: Exception) -> bool:
+    return "partition not found" in str(exc).lower()
+
+
+def _ensure_partition(collection, kb_id: int) -> str:
+    """知识库对应的分区，不存在时创建"""
+    name = partition_name(kb_id)
+    if _has_partition(collection, name):
+        return name
+    with _partition_lock:
+        description = f"知识库{kb_id}的向量"
+        index_manager.write(collection, lambda c: _create_partition(c, name, description))
+        _known_partitions.add(name)
+    return name
+
+
+def _create_partition(collection, name: str, description: str = "") -> None:
+    if not collection.has_partition(name):
+        collection.create_partition(name, description=description)
+
+
+def _rows_expr(doc_id: int, chunk_indices: Sequence[int] | None) -> str:
+    expr = f"doc_id == {int(doc_id)}"
+    if chunk_indices is not None:
+        expr += f" and chunk_index in {sorted(set(int(i) for i in chunk_indices))}"
+    return expr
+
+
+def _reinsert(partition: str, doc_id: int, chunk_indices: Sequence[int] | None, data: list):
+    """重建期间写入的重放：先删除影子集合中同一文档（或同一批块）的行再写入，可重复执行"""
+
+    def replay(collection) -> None:
+        _create_partition(collection, partition)
+        collection.delete(_rows_expr(doc_id, chunk_indices), partition_name=partition)
+        if data and data[0]:
+            collection.insert(data, partition_name=partition, timeout=60)
+
+    return replay
+
+
 def insert_embeddings(
     kb_id: int,
     doc_id: int,
     chunk_indices: Sequence[int],
     embeddings: Sequence[Sequence[float]],
 ) -> None:
-    if settings.TESTING or not _pymilvus_available:
-        for idx, emb in zip(chunk_indices, embeddings):
-            _memory_store.append(
-                {
-                    "kb_id": int(kb_id),
-                    "doc_id": int(doc_id),
-                    "chunk_index": int(idx),
-                    "embedding": list(emb),
-                }
-            )
+    if settings.TESTING or not _load_pymilvus():
+        local_store.add(kb_id, doc_id, chunk_indices, embeddings)
         return
 
     collection = _ensure_collection(dim=len(embeddings[0]) if embeddings else 256)
@@ -95,48 +188,53 @@ def insert_embeddings(
         list(chunk_indices),
         list(embeddings),
     ]
-    collection.insert(data, timeout=60)
+    partition = _ensure_partition(collection, kb_id)
+    index_manager.write(
+        collection,
+        lambda c: c.insert(data, partition_name=partition, timeout=60),
+        replay=_reinsert(partition, doc_id, chunk_indices, data),
+    )
+    index_manager.note_inserted(collection, len(chunk_indices))
     collection.load()
 
 
-def _cosine(a: Sequence[float], b: Sequence[float]) -> float:
-    s = sum(x * y for x, y in zip(a, b))
-    return float(s)
-
-
 def search_embeddings(
     kb_ids: Sequence[int],
     query_embedding: Sequence[float],
     top_k: int = 5,
+    nprobe: int | None = None,
+    ef: int | None = None,
 ) -> list[dict]:
-    if settings.TESTING or not _pymilvus_available:
-        results: list[dict] = []
-        for item in _memory_store:
-            if kb_ids and item["kb_id"] not in kb_ids:
-                continue
-            score = _cosine(query_embedding, item["embedding"])
-            results.append(
-                {
-                    "score": score,
-                    "kb_id": item["kb_id"],
-                    "doc_id": item["doc_id"],
-                    "chunk_index": item["chunk_index"],
-                }
-            )
-        results.sort(key=lambda x: x["score"], reverse=True)
-        return results[:top_k]
+    """向量检索；nprobe/ef覆盖索引的默认检索参数，用于按请求权衡延迟与召回"""
+    if settings.TESTING or not _load_pymilvus():
+        return local_store.search(query_embedding, kb_ids, top_k=top_k, nprobe=nprobe)
 
     collection = _ensure_collection(dim=len(query_embedding))
     collection.load()
-    expr = f"kb_id in {list(kb_ids)}" if kb_ids else ""
-    search_result = collection.search(
-        data=[list(query_embedding)],
-        anns_field="embedding",
-        param={"metric_type": "IP", "params": {"nprobe": 16}},
-        limit=top_k,
-        expr=expr or None,
-        output_fields=["kb_id", "doc_id", "chunk_index"],
-    )
+    names = list(dict.fromkeys(partition_name(kb_id) for kb_id in kb_ids))
+    for attempt in range(2):
+        # 只检索请求的知识库分区，不再在全集合的近似检索结果上按kb_id过滤
+        partitions = None
+        if names:
+            partitions = [name for name in names if _has_partition(collection, name)]
+            if not partitions:
+                return []
+        try:
+            search_result = collection.search(
+                data=[list(query_embedding)],
+                anns_field="embedding",
+                param=index_manager.search_params(top_k, nprobe=nprobe, ef=ef),
+                limit=top_k,
+                partition_names=partitions,
+                output_fields=["kb_id", "doc_id", "chunk_index"],
+            )
+            break
+        except Exception as exc:
+            # 分区缓存是进程内的，分区可能已被其他进程删除：清除缓存后重新确认再检索一次
+            if attempt or not _is_partition_not_found(exc):
+                raise
+            with _partition_lock:
+                _known_partitions.difference_update(names)
     hits: list[dict] = []
     for hit in search_result[0]:
         hits.append(
@@ -148,3 +246,155 @@ def search_embeddings(
             }
         )
     return hits
+
+
+def warm_up() -> int:
+    """建立Milvus连接并加载集合（含全部分区），未使用Milvus时加载本地向量库；返回向量数"""
+    if settings.TESTING or not _load_pymilvus():
+        return local_store.warm_up()
+    collection = _ensure_collection()
+    collection.load()
+    with _partition_lock:
+        _known_partitions.update(p.name for p in collection.partitions)
+    return collection.num_entities
+
+
+def fetch_embeddings(
+    kb_id: int,
+    doc_ids: Sequence[int],
+    chunk_indices: Sequence[int],
+) -> np.ndarray | None:
+    """按(doc_id, chunk_index)取知识库中已写入的向量，没有的行为NaN；知识库没有向量时返回None"""
+    if settings.TESTING or not _load_pymilvus():
+        return local_store.fetch(kb_id, doc_ids, chunk_indices)
+
+    collection = _ensure_collection()
+    name = partition_name(kb_id)
+    if not _has_partition(collection, name):
+        return None
+    collection.load()
+    # 只查询请求的行：按文档分组为doc_id == d and chunk_index in [...]，每次查询不超过_FETCH_BATCH行
+    wanted: dict[int, list[int]] = {}
+    for key in sorted(set(zip((int(d) for d in doc_ids), (int(i) for i in chunk_indices)))):
+        wanted.setdefault(key[0], []).append(key[1])
+    found: dict[tuple[int, int], list[float]] = {}
+    terms: list[str] = []
+    size = 0
+    for doc_id, indices in wanted.items():
+        for lo in range(0, len(indices), _FETCH_BATCH):
+            part = indices[lo : lo + _FETCH_BATCH]
+            if size + len(part) > _FETCH_BATCH:
+                _fetch_into(found, collection, name, terms)
+                terms, size = [], 0
+            terms.append(f"(doc_id == {doc_id} and chunk_index in {part})")
+            size += len(part)
+    if terms:
+        _fetch_into(found, collection, name, terms)
+    if not found:
+        return None
+    dim = len(next(iter(found.values())))
+    vectors = np.full((len(doc_ids), dim), np.nan, dtype=np.float32)
+    for i, key in enumerate(zip(doc_ids, chunk_indices)):
+        vector = found.get((int(key[0]), int(key[1])))
+        if vector is not None:
+            vectors[i] = vector
+    return vectors
+
+
+def _fetch_into(found: dict, collection, partition: str, terms: list[str]) -> None:
+    rows = collection.query(
+        expr=" or ".join(terms),
+        output_fields=["doc_id", "chunk_index", "embedding"],
+        partition_names=[partition],
+    )
+    for r in rows:
+        found[(int(r["doc_id"]), int(r["chunk_index"]))] = r["embedding"]
+
+
+def delete_embeddings(
+    kb_id: int,
+    doc_id: int,
+    chunk_indices: Sequence[int] | None = None,
+) -> None:
+    """删除文档的向量，chunk_indices为None时删除该文档全部向量"""
+    if settings.TESTING or not _load_pymilvus():
+        local_store.delete(kb_id, doc_id, chunk_indices)
+        return
+
+    collection = _ensure_collection()
+    name = partition_name(kb_id)
+    if not _has_partition(collection, name):
+        return
+    expr = _rows_expr(doc_id, chunk_indices)
+
+    def replay(c) -> None:
+        if c.has_partition(name):
+            c.delete(expr, partition_name=name)
+
+    index_manager.write(collection, lambda c: c.delete(expr, partition_name=name), replay=replay)
+
+
+def replace_embeddings(
+    kb_id: int,
+    doc_id: int,
+    chunk_indices: Sequence[int],
+    embeddings: Sequence[Sequence[float]],
+) -> None:
+    """以新的一组向量替换文档的全部向量
+
+    本地向量库中替换是原子的；Milvus先写入新向量，再按表达式删除该文档除新主键以外的全部向量
+    （不先查询旧主键，不受单次查询结果条数上限的影响），删除失败时删除刚写入的向量。
+    """
+    if settings.TESTING or not _load_pymilvus():
+        local_store.replace(kb_id, doc_id, chunk_indices, embeddings)
+        return
+
+    collection = _ensure_collection(dim=len(embeddings[0]) if embeddings else 256)
+    partition = _ensure_partition(collection, kb_id)
+    data: List[Iterable] = [
+        [kb_id] * len(chunk_indices),
+        [doc_id] * len(chunk_indices),
+        list(chunk_indices),
+        list(embeddings),
+    ]
+
+    def op(c) -> None:
+        new_ids: list[int] = []
+        if embeddings:
+            result = c.insert(data, partition_name=partition, timeout=60)
+            new_ids = [int(i) for i in result.primary_keys]
+        expr = f"doc_id == {int(doc_id)}"
+        if new_ids:
+            expr += f" and id not in {new_ids}"
+        try:
+            c.delete(expr, partition_name=partition)
+        except Exception:
+            if new_ids:
+                c.delete(f"id in {new_ids}", partition_name=partition)
+            raise
+
+    index_manager.write(collection, op, replay=_reinsert(partition, doc_id, None, data))
+    if embeddings:
+        index_manager.note_inserted(collection, len(chunk_indices))
+    collection.load()
+
+
+def drop_kb_embeddings(kb_id: int) -> None:
+    """删除知识库的全部向量：直接删除其分区"""
+    if settings.TESTING or not _load_pymilvus():
+        local_store.drop_partition(kb_id)
+        return
+
+    collection = _ensure_collection()
+    name = partition_name(kb_id)
+    with _partition_lock:
+        _known_partitions.discard(name)
+        index_manager.write(collection, lambda c: _drop_partition(c, name))
+
+
+def _drop_partition(collection, name: str) -> None:
+    if not collection.has_partition(name):
+        return
+    # 已加载的分区需先释放才能删除
+    collection.partition(name).release()
+    collection.drop_partition(name)
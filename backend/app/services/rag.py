@@ -1,59 +1,150 @@
-from collections.abc import Sequence
+import asyncio
+import json
+import time
+from collections.abc import AsyncIterator, Sequence
 from typing import Any
 
 import httpx
-from sqlalchemy import select
+from sqlalchemy import select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..config import get_settings
-from ..models import ChatMessage, ChatSession, DocumentChunk
+from ..config import DEFAULT_QWEN_API_BASE, get_settings
+from ..db import AsyncSessionLocal
+from ..metrics import counter, histogram, stage
+from ..models import ChatSession, DocumentChunk, KnowledgeBase
+from .context import assemble_context, measure, trim_history
 from .embedding import default_embedder
+from .history import history_cache
+from .keyword_index import keyword_index, reciprocal_rank_fusion
 from .milvus_client import search_embeddings
 
 settings = get_settings()
 
+LLM_STREAM_WINS = counter(
+    "llm_stream_wins_total", "流式调用中先返回首个片段的路径（primary/hedge）", ("path", "model")
+)
+LLM_FIRST_TOKEN = histogram(
+    "llm_first_token_seconds", "从发起调用到首个片段的耗时（含对冲），按胜出路径", ("path",)
+)
 
-async def build_context_from_milvus(
-    db: AsyncSession,
+
+def search_hits(
     kb_ids: Sequence[int],
     question: str,
     top_k: int = 5,
-) -> str:
-    """根据问题在Milvus中检索相似文档块并拼接上下文"""
-    embedding = default_embedder.embed(question)
-    hits = search_embeddings(kb_ids, embedding, top_k=top_k)
+    nprobe: int | None = None,
+    ef: int | None = None,
+) -> list[dict]:
+    """问题向量化后做向量检索，与关键词(BM25)检索结果按倒数排名融合
+
+    关键词索引中没有相关块时只使用向量结果。同步执行，调用方可放入线程。
+    """
+    with stage("chat", "embedding"):
+        embedding = default_embedder.embed(question)
+    with stage("chat", "vector_search"):
+        hits = search_embeddings(kb_ids, embedding, top_k=top_k, nprobe=nprobe, ef=ef)
+    with stage("chat", "keyword_search"):
+        keyword_hits = keyword_index.search(question, kb_ids, top_k=top_k)
+    if keyword_hits:
+        hits = reciprocal_rank_fusion(hits, keyword_hits, top_k=top_k)
+    return hits
+
+
+async def fetch_hit_chunks(
+    db: AsyncSession,
+    hits: Sequence[dict],
+) -> tuple[list[DocumentChunk], dict[tuple[int, int], float]]:
+    """按命中的(doc_id, chunk_index)回填文档块，返回(文档块, 各块分数)"""
     if not hits:
-        return ""
-    doc_ids = {h["doc_id"] for h in hits}
-    chunk_indices = {h["chunk_index"] for h in hits}
+        return [], {}
+    scores: dict[tuple[int, int], float] = {}
+    for h in hits:
+        key = (h["doc_id"], h["chunk_index"])
+        scores[key] = max(scores.get(key, h["score"]), h["score"])
     stmt = select(DocumentChunk).where(
-        DocumentChunk.doc_id.in_(doc_ids),
-        DocumentChunk.chunk_index.in_(chunk_indices),
+        tuple_(DocumentChunk.doc_id, DocumentChunk.chunk_index).in_(list(scores))
     )
-    result = await db.execute(stmt)
-    chunks = result.scalars().all()
-    sorted_chunks = sorted(chunks, key=lambda c: (c.doc_id, c.chunk_index))
-    return "\n\n".join(c.content for c in sorted_chunks)
+    with stage("chat", "hydrate"):
+        result = await db.execute(stmt)
+        chunks = list(result.scalars().all())
+    return chunks, scores
+
+
+async def live_kb_ids(kb_ids: Sequence[int]) -> list[int]:
+    """去掉不存在或正在删除的知识库，保持请求中的顺序"""
+    async with AsyncSessionLocal() as db:
+        rows = await db.execute(
+            select(KnowledgeBase.id).where(
+                KnowledgeBase.id.in_(set(kb_ids)), KnowledgeBase.deleting.is_(False)
+            )
+        )
+        live = set(rows.scalars())
+    return [kb_id for kb_id in dict.fromkeys(kb_ids) if kb_id in live]
+
+
+async def prefetch_chunks(
+    kb_ids: Sequence[int],
+    question: str,
+    top_k: int = 5,
+    nprobe: int | None = None,
+    ef: int | None = None,
+) -> tuple[list[DocumentChunk], dict[tuple[int, int], float]]:
+    """检索并回填文档块，不依赖请求的数据库会话，可与会话、历史查询并发执行
+
+    向量化与检索在线程中执行，回填使用独立的数据库会话（同一AsyncSession不能并发使用）。
+    请求的知识库先去掉不存在或正在删除的，全部被去掉时直接返回空结果。
+    """
+    if kb_ids:
+        kb_ids = await live_kb_ids(kb_ids)
+        if not kb_ids:
+            return [], {}
+    hits = await asyncio.to_thread(search_hits, kb_ids, question, top_k, nprobe, ef)
+    if not hits:
+        return [], {}
+    async with AsyncSessionLocal() as db:
+        return await fetch_hit_chunks(db, hits)
+
+
+def build_context(
+    chunks: Sequence[DocumentChunk],
+    scores: dict[tuple[int, int], float],
+    budget: int | None = None,
+) -> str:
+    """按预算拼接检索到的文档块"""
+    if not chunks:
+        return ""
+    with stage("chat", "assemble"):
+        return assemble_context(
+            chunks,
+            scores,
+            budget=budget,
+            unit=settings.PROMPT_BUDGET_UNIT,
+        )
+
+
+def split_prompt_budget(
+    question: str,
+    history: list[dict[str, str]],
+) -> tuple[list[dict[str, str]], int]:
+    """在历史对话与知识库上下文之间分配提示词预算
+
+    问题本身先占用预算，历史对话从最近的轮次起最多占用HISTORY_BUDGET_RATIO，
+    返回(裁剪后的历史, 留给上下文的预算)。
+    """
+    unit = settings.PROMPT_BUDGET_UNIT
+    available = max(settings.PROMPT_BUDGET - measure(question, unit), 0)
+    history_budget = int(available * settings.HISTORY_BUDGET_RATIO)
+    kept, used = trim_history(history, history_budget, unit)
+    return kept, available - used
 
 
 async def get_chat_history(
     db: AsyncSession,
-    session_id: int,
+    session: ChatSession,
     limit_rounds: int,
 ) -> list[dict[str, str]]:
-    """查询指定会话的历史轮次对话"""
-    stmt = (
-        select(ChatMessage)
-        .where(ChatMessage.session_id == session_id)
-        .order_by(ChatMessage.created_at.desc())
-        .limit(limit_rounds * 2)
-    )
-    result = await db.execute(stmt)
-    messages = list(reversed(result.scalars().all()))
-    history: list[dict[str, str]] = []
-    for msg in messages:
-        history.append({"role": msg.role, "content": msg.content})
-    return history
+    """查询指定会话的历史：更早轮次的滚动摘要加最近limit_rounds轮对话"""
+    return await history_cache.get(db, session, limit_rounds)
 
 
 async def call_qwen_stream(
@@ -65,7 +156,10 @@ async def call_qwen_stream(
     max_tokens: int,
 ) -> Any:
     """调用通义千问流式接口，返回异步流结果"""
-    if settings.TESTING or not settings.QWEN_API_KEY:
+    use_fake = not settings.QWEN_API_KEY or (
+        settings.TESTING and settings.QWEN_API_BASE == DEFAULT_QWEN_API_BASE
+    )
+    if use_fake:
         async def fake_stream():
             text = "测试环境未配置通义千问API，将返回模拟回答。"
             for ch in text:
@@ -89,57 +183,136 @@ async def call_qwen_stream(
     messages.extend(history)
     messages.append({"role": "user", "content": question})
 
-    url = "https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions"
+    url = f"{settings.QWEN_API_BASE.rstrip('/')}/chat/completions"
     headers = {
         "Authorization": f"Bearer {settings.QWEN_API_KEY}",
         "Content-Type": "application/json",
     }
     payload = {
         "model": settings.QWEN_MODEL,
-        "stream": False,
+        "stream": True,
         "messages": messages,
         "temperature": temperature,
         "top_p": top_p,
         "max_tokens": max_tokens,
     }
 
+    hedge_payload = None
+    if settings.LLM_HEDGE_AFTER > 0:
+        hedge_payload = {**payload, "model": settings.LLM_HEDGE_MODEL or settings.QWEN_MODEL}
+
     async def stream_generator():
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            r = await client.post(url, headers=headers, json=payload)
-            r.raise_for_status()
-            data = r.json()
-            choices = data.get("choices") or []
-            if not choices:
-                return
-            message = choices[0].get("message") or {}
-            content = message.get("content") or ""
-            if not isinstance(content, str):
-                return
-            for ch in content:
-                yield ch
+        timeout = httpx.Timeout(settings.QWEN_TIMEOUT, connect=settings.QWEN_CONNECT_TIMEOUT)
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            async for token in hedged_stream(
+                lambda body: _open_stream(client, url, headers, body),
+                payload,
+                hedge_payload,
+                settings.LLM_HEDGE_AFTER,
+            ):
+                yield token
 
     return stream_generator()
 
 
+async def _open_stream(
+    client: httpx.AsyncClient,
+    url: str,
+    headers: dict[str, str],
+    body: dict,
+) -> AsyncIterator[str]:
+    """发起一次流式（SSE）调用，逐个产出增量文本；非2xx响应抛出httpx.HTTPStatusError"""
+    async with client.stream("POST", url, headers=headers, json=body) as r:
+        r.raise_for_status()
+        async for line in r.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                return
+            choices = json.loads(data).get("choices") or []
+            if not choices:
+                continue
+            content = (choices[0].get("delta") or {}).get("content")
+            if isinstance(content, str) and content:
+                yield content
+
+
+async def _first(stream: AsyncIterator[str]) -> str | None:
+    """取流的第一个片段，流为空时返回None"""
+    try:
+        return await stream.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+async def hedged_stream(
+    open_stream,
+    payload: dict,
+    hedge_payload: dict | None,
+    hedge_after: float,
+) -> AsyncIterator[str]:
+    """带对冲的流式调用
+
+    先以payload发起主请求；hedge_after秒内未收到首个片段时再以hedge_payload（可换为更快的模型）
+    发起对冲请求，采用先返回首个片段的一路并取消另一路。对冲发起后其中一路失败时继续等待另一路；
+    对冲发起前的失败（如429）直接抛出，由调度器据此调整并发。
+    """
+    started = time.perf_counter()
+    paths: dict[asyncio.Task, tuple[str, str, AsyncIterator[str]]] = {}
+
+    def start(path: str, body: dict) -> None:
+        stream = open_stream(body)
+        paths[asyncio.create_task(_first(stream))] = (path, body.get("model", ""), stream)
+
+    start("primary", payload)
+    pending = set(paths)
+    winner: asyncio.Task | None = None
+    try:
+        hedged = hedge_payload is None
+        while winner is None:
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=None if hedged else hedge_after,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not done:
+                hedged = True
+                start("hedge", hedge_payload)
+                pending = {task for task in paths if not task.done()}
+                continue
+            errors = [task for task in done if task.exception() is not None]
+            winner = next((task for task in done if task.exception() is None), None)
+            if winner is None and (not pending or not hedged):
+                raise errors[0].exception()
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        for task, (_, _, stream) in paths.items():
+            if task is not winner:
+                await stream.aclose()
+
+    path, model, stream = paths[winner]
+    LLM_STREAM_WINS.inc(path, model)
+    LLM_FIRST_TOKEN.observe(time.perf_counter() - started, path)
+    try:
+        first = winner.result()
+        if first is None:
+            return
+        yield first
+        async for token in stream:
+            yield token
+    finally:
+        await stream.aclose()
+
+
 async def save_chat_messages(
     db: AsyncSession,
     session: ChatSession,
     question: str,
     answer: str,
 ) -> None:
-    """保存一轮问答到数据库"""
-    db.add(
-        ChatMessage(
-            session_id=session.id,
-            role="user",
-            content=question,
-        )
-    )
-    db.add(
-        ChatMessage(
-            session_id=session.id,
-            role="assistant",
-            content=answer,
-        )
-    )
-    await db.commit()
+    """保存一轮问答到数据库，并更新会话的历史缓冲与滚动摘要"""
+    await history_cache.append(db, session, question, answer)
@@ -0,0 +1,157 @@
+"""按缓存的提取文本重新切块
+
+文档id不变：先以新的一组向量替换文档的全部向量（旧向量同时删除），再在一个事务中删除旧块、
+插入新块，提交即完成切换；事务失败时以旧向量替换回去，不留下新写入的向量。
+两次写入之间的极短时间内，检索命中的新向量回填到的仍是旧块。
+内容不变的块复用旧向量，只对新增或变化的块向量化。
+"""
+
+import asyncio
+import time
+
+import numpy as np
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..metrics import stage
+from ..models import Document, DocumentChunk
+from .embedding import default_embedder
+from .file_parser import iter_section_chunks
+from .keyword_index import keyword_index
+from .milvus_client import fetch_embeddings, replace_embeddings
+from .text_store import text_store
+
+
+class RechunkError(ValueError):
+    """文档无法重新切块：没有缓存的提取文本，或已被删除、正在处理中"""
+
+
+async def rechunk_document(
+    db: AsyncSession,
+    doc: Document,
+    chunk_size: int,
+    chunk_overlap: int,
+    chunk_strategy: str = "fixed",
+) -> dict:
+    """重新切分文档，返回文档与块数、复用向量数、新向量化块数和耗时"""
+    started = time.perf_counter()
+    # 失败回滚会使ORM对象过期，之后只使用这两个值
+    doc_id, kb_id = doc.id, doc.kb_id
+    sections = await asyncio.to_thread(text_store.get, doc.text_hash) if doc.text_hash else None
+    if sections is None:
+        raise RechunkError("文档没有缓存的提取文本，请重新上传")
+
+    with stage("rechunk", "chunk"):
+        chunks = list(iter_section_chunks(sections, chunk_size, chunk_overlap, chunk_strategy))
+
+    # 标记为处理中，同一文档同时只有一次重新切块
+    claimed = await db.execute(
+        update(Document)
+        .where(Document.id == doc_id, Document.status == "done")
+        .values(status="processing")
+    )
+    if claimed.rowcount == 0:
+        raise RechunkError("文档已被删除或正在处理中")
+    await db.commit()
+
+    try:
+        old = (
+            await db.execute(
+                select(DocumentChunk.id, DocumentChunk.chunk_index, DocumentChunk.content).where(
+                    DocumentChunk.doc_id == doc_id
+                )
+            )
+        ).all()
+        hybrid = any(keyword_index.get_meta(r.id) is not None for r in old)
+
+        old_vectors = None
+        if old:
+            with stage("rechunk", "fetch_vectors"):
+                old_vectors = await asyncio.to_thread(
+                    fetch_embeddings, kb_id, [doc_id] * len(old), [r.chunk_index for r in old]
+                )
+        # 向量只取决于块内容，按内容复用旧向量
+        reuse: dict[str, np.ndarray] = {}
+        if old_vectors is not None:
+            for row, vector in zip(old, old_vectors):
+                if not np.isnan(vector).any():
+                    reuse[row.content] = vector
+        embeddings = np.empty((len(chunks), default_embedder.dim), dtype=np.float32)
+        changed = [i for i, (_, text, _) in enumerate(chunks) if text not in reuse]
+        for i, (_, text, _) in enumerate(chunks):
+            if text in reuse:
+                embeddings[i] = reuse[text]
+        if changed:
+            with stage("rechunk", "embedding"):
+                embeddings[changed] = await asyncio.to_thread(
+                    default_embedder.embed_batch, [chunks[i][1] for i in changed]
+                )
+
+        with stage("rechunk", "replace_vectors"):
+            await asyncio.to_thread(
+                replace_embeddings,
+                kb_id,
+                doc_id,
+                [idx for idx, _, _ in chunks],
+                embeddings.tolist(),
+            )
+        try:
+            with stage("rechunk", "swap"):
+                await db.execute(delete(DocumentChunk).where(DocumentChunk.doc_id == doc_id))
+                if chunks:
+                    await db.execute(
+                        insert(DocumentChunk),
+                        [
+                            {
+                                "doc_id": doc_id,
+                                "kb_id": kb_id,
+                                "chunk_index": idx,
+                                "content": text,
+                                "heading": heading[:255] or None,
+                            }
+                            for idx, text, heading in chunks
+                        ],
+                    )
+                await db.execute(
+                    update(Document).where(Document.id == doc_id).values(status="done")
+                )
+                await db.commit()
+        except BaseException:
+            # 块未替换，恢复旧向量（同时删除刚写入的新向量）
+            await db.rollback()
+            indices, vectors = [], []
+            if old_vectors is not None:
+                keep = ~np.isnan(old_vectors).any(axis=1)
+                indices = [r.chunk_index for r, k in zip(old, keep) if k]
+                vectors = old_vectors[keep].tolist()
+            await asyncio.to_thread(replace_embeddings, kb_id, doc_id, indices, vectors)
+            raise
+    except BaseException:
+        await db.rollback()
+        await db.execute(update(Document).where(Document.id == doc_id).values(status="done"))
+        await db.commit()
+        raise
+    await db.refresh(doc)
+
+    if hybrid:
+        await asyncio.to_thread(keyword_index.remove_chunks, [r.id for r in old])
+    if hybrid and chunks:
+        with stage("rechunk", "keyword_index"):
+            rows = await db.execute(
+                select(DocumentChunk.id, DocumentChunk.chunk_index, DocumentChunk.content).where(
+                    DocumentChunk.doc_id == doc_id
+                )
+            )
+            await asyncio.to_thread(
+                keyword_index.add_chunks,
+                [(r.id, kb_id, doc_id, r.chunk_index, r.content) for r in rows],
+            )
+            await asyncio.to_thread(keyword_index.maybe_compact)
+
+    return {
+        "document": doc,
+        "chunks": len(chunks),
+        "reused": len(chunks) - len(changed),
+        "embedded": len(changed),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
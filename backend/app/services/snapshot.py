@@ -0,0 +1,376 @@
+"""知识库快照：文档块、元数据与向量的二进制列式格式
+
+格式（整数均为小端）：
+    头部    magic(8字节 b"WLKBSNAP") | version(u16) | 清单长度(u32) | 清单(UTF-8 JSON)
+    数据块  行数(u32) | 各列依次为 压缩后长度(u32) + zlib压缩的列数据
+    结尾    行数为0的数据块 | 之前全部字节的sha256(32字节)
+
+清单记录知识库名称与描述、文档列表（含提取文本的内容哈希）、向量维度与向量化模型；
+每个数据块按_COLUMNS的顺序包含doc（文档在清单中的序号，u32）、chunk_index（u32）、
+keyword（是否写入关键词索引，u8）、heading与content（u32偏移量数组加UTF-8字节）以及embedding（float32，行数×维度）。
+"""
+
+import asyncio
+import hashlib
+import json
+import struct
+import time
+import zlib
+from collections.abc import AsyncIterator
+from datetime import datetime
+from typing import BinaryIO
+
+import numpy as np
+from sqlalchemy import and_, func, insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import get_settings
+from ..db import AsyncSessionLocal
+from ..models import Document, DocumentChunk, KnowledgeBase
+from .bulk_delete import start_delete
+from .embedding import default_embedder
+from .keyword_index import keyword_index
+from .milvus_client import fetch_embeddings, insert_embeddings
+from .text_store import text_store
+
+settings = get_settings()
+
+MAGIC = b"WLKBSNAP"
+VERSION = 1
+_HEADER = struct.Struct("<8sHI")
+_U32 = struct.Struct("<I")
+_COLUMNS = ("doc", "chunk_index", "keyword", "heading", "content", "embedding")
+_COMPRESS_LEVEL = 6
+_READ_SIZE = 1 << 20
+
+
+class SnapshotError(ValueError):
+    """快照格式错误、校验和不匹配或与当前环境不兼容"""
+
+
+def embedder_name() -> str:
+    """向量化模型标识，导入时要求与快照一致，否则检索时的问题向量与快照中的向量不可比"""
+    return f"{type(default_embedder).__name__}:{default_embedder.dim}"
+
+
+def _encode_strings(values: list[str]) -> bytes:
+    data = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(data) + 1, dtype=np.uint32)
+    np.cumsum([len(d) for d in data], out=offsets[1:])
+    return offsets.tobytes() + b"".join(data)
+
+
+def _decode_strings(raw: bytes, rows: int) -> list[str]:
+    width = (rows + 1) * 4
+    offsets = np.frombuffer(raw[:width], dtype=np.uint32)
+    blob = raw[width:]
+    return [blob[offsets[i] : offsets[i + 1]].decode("utf-8") for i in range(rows)]
+
+
+class SnapshotEncoder:
+    """逐段编码快照并累计sha256，各方法返回应依次写出的字节"""
+
+    def __init__(self, level: int = _COMPRESS_LEVEL):
+        self.level = level
+        self._hash = hashlib.sha256()
+
+    def _emit(self, data: bytes) -> bytes:
+        self._hash.update(data)
+        return data
+
+    def header(self, manifest: dict) -> bytes:
+        payload = json.dumps(manifest, ensure_ascii=False).encode("utf-8")
+        return self._emit(_HEADER.pack(MAGIC, VERSION, len(payload)) + payload)
+
+    def block(
+        self,
+        doc: np.ndarray,
+        chunk_index: np.ndarray,
+        keyword: np.ndarray,
+        heading: list[str],
+        content: list[str],
+        embedding: np.ndarray,
+    ) -> bytes:
+        columns = (
+            np.asarray(doc, dtype="<u4").tobytes(),
+            np.asarray(chunk_index, dtype="<u4").tobytes(),
+            np.asarray(keyword, dtype=np.uint8).tobytes(),
+            _encode_strings(heading),
+            _encode_strings(content),
+            np.ascontiguousarray(embedding, dtype="<f4").tobytes(),
+        )
+        parts = [_U32.pack(len(content))]
+        for raw in columns:
+            packed = zlib.compress(raw, self.level)
+            parts.append(_U32.pack(len(packed)))
+            parts.append(packed)
+        return self._emit(b"".join(parts))
+
+    def finish(self) -> bytes:
+        end = self._emit(_U32.pack(0))
+        return end + self._hash.digest()
+
+
+def verify_snapshot(f: BinaryIO) -> None:
+    """校验结尾的sha256，读取完毕后回到文件开头"""
+    f.seek(0, 2)
+    size = f.tell()
+    if size < _HEADER.size + 4 + 32:
+        raise SnapshotError("快照文件不完整")
+    f.seek(0)
+    digest = hashlib.sha256()
+    remaining = size - 32
+    while remaining:
+        data = f.read(min(_READ_SIZE, remaining))
+        if not data:
+            raise SnapshotError("快照文件不完整")
+        digest.update(data)
+        remaining -= len(data)
+    if f.read(32) != digest.digest():
+        raise SnapshotError("快照校验和不匹配")
+    f.seek(0)
+
+
+class SnapshotReader:
+    """顺序读取快照：manifest为清单，blocks()逐块产出解码后的列"""
+
+    def __init__(self, f: BinaryIO):
+        self._f = f
+        head = self._read(_HEADER.size)
+        magic, version, length = _HEADER.unpack(head)
+        if magic != MAGIC:
+            raise SnapshotError("不是知识库快照文件")
+        if version != VERSION:
+            raise SnapshotError(f"不支持的快照版本: {version}")
+        self.manifest = json.loads(self._read(length).decode("utf-8"))
+
+    def _read(self, size: int) -> bytes:
+        data = self._f.read(size)
+        if len(data) != size:
+            raise SnapshotError("快照文件不完整")
+        return data
+
+    def blocks(self):
+        dim = int(self.manifest["dim"])
+        while True:
+            (rows,) = _U32.unpack(self._read(4))
+            if rows == 0:
+                return
+            raw = []
+            for _ in _COLUMNS:
+                (length,) = _U32.unpack(self._read(4))
+                try:
+                    raw.append(zlib.decompress(self._read(length)))
+                except zlib.error as exc:
+                    raise SnapshotError("快照数据块损坏") from exc
+            yield {
+                "doc": np.frombuffer(raw[0], dtype="<u4"),
+                "chunk_index": np.frombuffer(raw[1], dtype="<u4"),
+                "keyword": np.frombuffer(raw[2], dtype=np.uint8),
+                "heading": _decode_strings(raw[3], rows),
+                "content": _decode_strings(raw[4], rows),
+                "embedding": np.frombuffer(raw[5], dtype="<f4").reshape(rows, dim),
+            }
+
+
+async def export_snapshot(kb_id: int, batch_size: int | None = None) -> AsyncIterator[bytes]:
+    """按主键分批从document_chunks与向量库流式导出快照
+
+    向量库中缺失的向量（如历史数据未写入）按块内容重新计算。
+    """
+    batch_size = batch_size or settings.SNAPSHOT_BATCH_SIZE
+    encoder = SnapshotEncoder()
+    async with AsyncSessionLocal() as db:
+        kb = await db.get(KnowledgeBase, kb_id)
+        docs = (
+            await db.execute(select(Document).where(Document.kb_id == kb_id).order_by(Document.id))
+        ).scalars().all()
+        total = await db.scalar(
+            select(func.count()).select_from(DocumentChunk).where(DocumentChunk.kb_id == kb_id)
+        )
+    doc_slot = {doc.id: i for i, doc in enumerate(docs)}
+    yield encoder.header(
+        {
+            "kb": {"name": kb.name, "description": kb.description},
+            "documents": [
+                {"filename": d.filename, "status": d.status, "text_hash": d.text_hash}
+                for d in docs
+            ],
+            "chunks": int(total or 0),
+            "dim": default_embedder.dim,
+            "embedder": embedder_name(),
+            "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        }
+    )
+
+    last_id = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            rows = (
+                await db.execute(
+                    select(
+                        DocumentChunk.id,
+                        DocumentChunk.doc_id,
+                        DocumentChunk.chunk_index,
+                        DocumentChunk.heading,
+                        DocumentChunk.content,
+                    )
+                    .where(DocumentChunk.kb_id == kb_id, DocumentChunk.id > last_id)
+                    .order_by(DocumentChunk.id)
+                    .limit(batch_size)
+                )
+            ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        yield await asyncio.to_thread(_encode_rows, encoder, kb_id, rows, doc_slot)
+    yield encoder.finish()
+
+
+def _encode_rows(encoder: SnapshotEncoder, kb_id: int, rows, doc_slot: dict[int, int]) -> bytes:
+    doc_ids = [r.doc_id for r in rows]
+    indices = [r.chunk_index for r in rows]
+    vectors = fetch_embeddings(kb_id, doc_ids, indices)
+    if vectors is None or vectors.shape[1] != default_embedder.dim:
+        vectors = np.full((len(rows), default_embedder.dim), np.nan, dtype=np.float32)
+    missing = np.flatnonzero(np.isnan(vectors).any(axis=1))
+    if len(missing):
+        vectors[missing] = default_embedder.embed_batch(rows[i].content for i in missing)
+    keyword = np.fromiter(
+        (keyword_index.get_meta(r.id) is not None for r in rows), dtype=np.uint8, count=len(rows)
+    )
+    return encoder.block(
+        np.fromiter((doc_slot[d] for d in doc_ids), dtype=np.uint32, count=len(rows)),
+        np.asarray(indices, dtype=np.uint32),
+        keyword,
+        [r.heading or "" for r in rows],
+        [r.content for r in rows],
+        vectors,
+    )
+
+
+async def import_snapshot(
+    db: AsyncSession,
+    f: BinaryIO,
+    user_id: int,
+    name: str | None = None,
+) -> dict:
+    """校验并导入快照为新的知识库：块直接批量写入，向量直接写入向量库，不解析文件、不重新向量化
+
+    名称已存在时抛出SnapshotError；导入中途失败时在后台删除已写入的部分。
+    返回知识库、文档数、块数、耗时与每秒导入块数。
+    """
+    started = time.perf_counter()
+    await asyncio.to_thread(verify_snapshot, f)
+    reader = await asyncio.to_thread(SnapshotReader, f)
+    manifest = reader.manifest
+    if manifest.get("embedder") != embedder_name():
+        raise SnapshotError("快照的向量化模型与当前环境不一致")
+
+    kb_name = name or manifest["kb"]["name"]
+    exists = await db.scalar(select(KnowledgeBase.id).where(KnowledgeBase.name == kb_name))
+    if exists is not None:
+        raise SnapshotError("知识库名称已存在")
+    kb = KnowledgeBase(
+        name=kb_name,
+        description=manifest["kb"].get("description"),
+        created_by=user_id,
+    )
+    db.add(kb)
+    await db.flush()
+    # 提取文本不随快照导出，同一部署中文本缓存里仍有该文本时保留其键，可继续重新切块
+    docs = []
+    for d in manifest["documents"]:
+        text_hash = d.get("text_hash")
+        docs.append(
+            Document(
+                kb_id=kb.id,
+                filename=d["filename"],
+                status=d.get("status") or "done",
+                text_hash=text_hash if text_hash and text_store.exists(text_hash) else None,
+            )
+        )
+    db.add_all(docs)
+    await db.commit()
+    # 失败回滚会使ORM对象过期，之后只使用kb_id
+    kb_id = kb.id
+    doc_ids = np.asarray([d.id for d in docs], dtype=np.int64)
+
+    chunks = 0
+    try:
+        blocks = reader.blocks()
+        while True:
+            block = await asyncio.to_thread(next, blocks, None)
+            if block is None:
+                break
+            chunks += await _import_block(db, kb_id, doc_ids, block)
+    except BaseException:
+        await db.rollback()
+        await start_delete(db, "knowledge_base", kb_id, user_id)
+        raise
+    seconds = time.perf_counter() - started
+    return {
+        "kb": kb,
+        "documents": len(docs),
+        "chunks": chunks,
+        "seconds": round(seconds, 3),
+        "chunks_per_sec": round(chunks / seconds, 1) if seconds > 0 else 0.0,
+    }
+
+
+async def _import_block(db: AsyncSession, kb_id: int, doc_ids: np.ndarray, block: dict) -> int:
+    rows = len(block["content"])
+    block_docs = doc_ids[block["doc"]]
+    indices = block["chunk_index"].astype(np.int64)
+    await db.execute(
+        insert(DocumentChunk),
+        [
+            {
+                "doc_id": int(block_docs[i]),
+                "kb_id": kb_id,
+                "chunk_index": int(indices[i]),
+                "content": block["content"][i],
+                "heading": block["heading"][i] or None,
+            }
+            for i in range(rows)
+        ],
+    )
+    await db.commit()
+
+    # 同一文档的连续行合并为一次向量写入
+    embeddings = block["embedding"]
+    bounds = np.flatnonzero(np.diff(block_docs)) + 1
+    for lo, hi in zip(np.r_[0, bounds], np.r_[bounds, rows]):
+        await asyncio.to_thread(
+            insert_embeddings,
+            kb_id,
+            int(block_docs[lo]),
+            indices[lo:hi].tolist(),
+            embeddings[lo:hi].tolist(),
+        )
+
+    flagged = np.flatnonzero(block["keyword"])
+    if len(flagged):
+        wanted = {(int(block_docs[i]), int(indices[i])): i for i in flagged}
+        by_doc: dict[int, list[int]] = {}
+        for doc, idx in wanted:
+            by_doc.setdefault(doc, []).append(idx)
+        # 只查询本批中需要写入关键词索引的块，走(doc_id, chunk_index)索引
+        found = await db.execute(
+            select(DocumentChunk.id, DocumentChunk.doc_id, DocumentChunk.chunk_index).where(
+                or_(
+                    *(
+                        and_(DocumentChunk.doc_id == doc, DocumentChunk.chunk_index.in_(idxs))
+                        for doc, idxs in by_doc.items()
+                    )
+                )
+            )
+        )
+        items = [
+            (chunk_id, kb_id, doc_id, idx, block["content"][wanted[(doc_id, idx)]])
+            for chunk_id, doc_id, idx in found
+            if (doc_id, idx) in wanted
+        ]
+        await asyncio.to_thread(keyword_index.add_chunks, items)
+        await asyncio.to_thread(keyword_index.maybe_compact)
+    return rows
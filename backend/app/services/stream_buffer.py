@@ -0,0 +1,165 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Awaitable, Callable
+
+from ..config import get_settings
+
+settings = get_settings()
+
+
+def format_event(data: str, event: str | None = None, event_id: str | None = None) -> str:
+    """编码一条SSE事件；多行数据拆为多个data行，客户端按换行拼回"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event is not None:
+        lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+
+def parse_event_id(value: str | None) -> tuple[str, int] | None:
+    """解析形如"<stream_id>-<seq>"的事件id"""
+    if not value:
+        return None
+    stream_id, _, seq = value.strip().rpartition("-")
+    if not stream_id or not seq.isdigit():
+        return None
+    return stream_id, int(seq)
+
+
+class StreamBuffer:
+    """一次回答的全部SSE事件：生成任务在后台写入，任意个客户端连接从指定序号开始读取
+
+    事件序号从1开始，事件id为"<stream_id>-<seq>"，断线重连时凭Last-Event-ID从下一条继续。
+    """
+
+    def __init__(self, user_id: int):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.frames: list[str] = []
+        self.done = False
+        self.finished_at: float | None = None
+        self.task: asyncio.Task | None = None
+        self.readers = 0
+        self._changed = asyncio.Event()
+        self._grace_handle: asyncio.TimerHandle | None = None
+
+    def publish(self, data: str, event: str | None = None) -> None:
+        seq = len(self.frames) + 1
+        self.frames.append(format_event(data, event=event, event_id=f"{self.id}-{seq}"))
+        self._notify()
+
+    def finish(self) -> None:
+        self.done = True
+        self.finished_at = time.monotonic()
+        if self._grace_handle is not None:
+            self._grace_handle.cancel()
+            self._grace_handle = None
+        self._notify()
+
+    def _notify(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def read(self, after: int, grace: float) -> AsyncIterator[str]:
+        """从序号after之后开始产出事件直到回答结束
+
+        连接断开后若没有其他读者，生成任务继续运行grace秒等待重连，期间无人重连则取消。
+        """
+        self.readers += 1
+        if self._grace_handle is not None:
+            self._grace_handle.cancel()
+            self._grace_handle = None
+        try:
+            seq = after
+            while True:
+                changed = self._changed
+                while seq < len(self.frames):
+                    yield self.frames[seq]
+                    seq += 1
+                if self.done:
+                    return
+                await changed.wait()
+        finally:
+            self.readers -= 1
+            if not self.readers and not self.done and self.task is not None:
+                self._grace_handle = asyncio.get_running_loop().call_later(grace, self._abandon)
+
+    def _abandon(self) -> None:
+        self._grace_handle = None
+        if not self.readers and self.task is not None and not self.task.done():
+            self.task.cancel()
+
+
+class StreamRegistry:
+    """进程内的回答缓冲表：回答结束ttl秒后过期，最多保留max_streams个（优先淘汰最早结束的）"""
+
+    def __init__(self, max_streams: int = 1000, ttl: float = 300.0, grace: float = 30.0):
+        self.max_streams = max_streams
+        self.ttl = ttl
+        self.grace = grace
+        self._streams: OrderedDict[str, StreamBuffer] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+    def start(
+        self,
+        user_id: int,
+        producer: Callable[[StreamBuffer], Awaitable[None]],
+    ) -> StreamBuffer:
+        """创建缓冲并在后台运行producer写入事件，producer结束（含取消、异常）时缓冲标记为结束"""
+        self._prune(reserve=1)
+        buffer = StreamBuffer(user_id)
+        self._streams[buffer.id] = buffer
+
+        async def run() -> None:
+            try:
+                await producer(buffer)
+            finally:
+                buffer.finish()
+
+        buffer.task = asyncio.get_running_loop().create_task(run())
+        buffer.task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return buffer
+
+    def get(self, stream_id: str, user_id: int) -> StreamBuffer | None:
+        self._prune()
+        buffer = self._streams.get(stream_id)
+        if buffer is None or buffer.user_id != user_id:
+            return None
+        return buffer
+
+    def clear(self) -> None:
+        for buffer in self._streams.values():
+            if buffer.task is not None and not buffer.task.done():
+                buffer.task.cancel()
+        self._streams.clear()
+
+    def _prune(self, reserve: int = 0) -> None:
+        now = time.monotonic()
+        expired = [
+            stream_id
+            for stream_id, buffer in self._streams.items()
+            if buffer.done and now - buffer.finished_at > self.ttl
+        ]
+        for stream_id in expired:
+            del self._streams[stream_id]
+        excess = len(self._streams) + reserve - self.max_streams
+        if excess <= 0:
+            return
+        finished = sorted(
+            (b for b in self._streams.values() if b.done), key=lambda b: b.finished_at
+        )
+        for buffer in finished[:excess]:
+            del self._streams[buffer.id]
+
+
+stream_registry = StreamRegistry(
+    max_streams=settings.STREAM_BUFFER_MAX,
+    ttl=settings.STREAM_BUFFER_TTL,
+    grace=settings.STREAM_RESUME_GRACE,
+)
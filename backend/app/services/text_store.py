@@ -0,0 +1,77 @@
+import hashlib
+import json
+import os
+import threading
+import zlib
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+from ..config import get_settings
+
+settings = get_settings()
+
+
+class TextStore:
+    """按内容寻址保存文档提取出的段落文本，供重新切块时跳过文件解析
+
+    段落[(标题路径, 正文)]序列化为JSON后以其sha256为键，zlib压缩后保存为
+    <path>/<键前2位>/<键>.json.z；内容相同的文档共用同一文件。
+    path为None时仅在内存中维护，不落盘。
+    """
+
+    def __init__(self, path: str | Path | None = None, level: int = 6):
+        self.path = Path(path) if path else None
+        self.level = level
+        self._memory: dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def _file(self, key: str) -> Path:
+        return self.path / key[:2] / f"{key}.json.z"
+
+    def put(self, sections: Iterable[Tuple[str, str]]) -> str:
+        """保存段落并返回其键，已存在时不重复写入"""
+        raw = json.dumps([list(s) for s in sections], ensure_ascii=False).encode("utf-8")
+        key = hashlib.sha256(raw).hexdigest()
+        if self.exists(key):
+            return key
+        data = zlib.compress(raw, self.level)
+        if self.path is None:
+            with self._lock:
+                self._memory[key] = data
+            return key
+        target = self._file(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f"{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, target)
+        return key
+
+    def get(self, key: str) -> List[Tuple[str, str]] | None:
+        """读取段落，键不存在时返回None"""
+        if self.path is None:
+            data = self._memory.get(key)
+        else:
+            try:
+                data = self._file(key).read_bytes()
+            except FileNotFoundError:
+                data = None
+        if data is None:
+            return None
+        return [(heading, text) for heading, text in json.loads(zlib.decompress(data))]
+
+    def exists(self, key: str) -> bool:
+        if self.path is None:
+            return key in self._memory
+        return self._file(key).exists()
+
+    def discard(self, keys: Iterable[str]) -> None:
+        """删除不再被任何文档引用的文本，调用方负责确认引用关系"""
+        for key in keys:
+            if self.path is None:
+                with self._lock:
+                    self._memory.pop(key, None)
+            else:
+                self._file(key).unlink(missing_ok=True)
+
+
+text_store = TextStore(None if settings.TESTING else Path(settings.DATA_DIR) / "texts")
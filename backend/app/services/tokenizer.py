@@ -0,0 +1,20 @@
+import re
+
+
+# 英文单词、数字串整体匹配，其余非空白字符（汉字、标点）逐个匹配
+_TOKEN_PATTERN = re.compile(r"[A-Za-z]+|\d+|\S")
+
+
+def estimate_tokens(text: str, start: int = 0, end: int | None = None) -> int:
+    """估算文本（或其中[start, end)区间）的token数量
+
+    通义千问的分词器对汉字大致是一字一token，英文单词约每4个字母一个token。
+    这里按该规则线性扫描估算，无需加载真实分词器；传入区间时不会复制子串。
+    """
+    if end is None:
+        end = len(text)
+    total = 0
+    for match in _TOKEN_PATTERN.finditer(text, start, end):
+        length = match.end() - match.start()
+        total += 1 if length <= 4 else (length + 3) // 4
+    return total
@@ -0,0 +1,187 @@
+from collections.abc import Callable
+
+import numpy as np
+
+# 编码与打分时每批处理的行数，限制中间矩阵的内存占用
+_BATCH = 65536
+
+
+def _kmeans_l2(data: np.ndarray, k: int, rng: np.random.Generator, iterations: int = 15) -> np.ndarray:
+    """欧氏距离k-means，用于训练乘积量化的子空间码本"""
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _nearest_l2(data, centroids)
+        counts = np.bincount(assign, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, data)
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = data[rng.choice(len(data), int(empty.sum()))]
+            counts[empty] = 1
+        centroids = (sums / counts[:, None]).astype(np.float32)
+    return centroids
+
+
+def _nearest_l2(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    c_norms = (centroids**2).sum(axis=1)
+    return np.argmin(c_norms[None, :] - 2.0 * (data @ centroids.T), axis=1)
+
+
+class Float32Codec:
+    """不压缩：原样保存float32向量"""
+
+    name = "float32"
+    lossy = False
+
+    def code_shape(self, dim: int) -> tuple[tuple[int, ...], type]:
+        return (dim,), np.float32
+
+    def train(self, sample: np.ndarray) -> None:
+        return None
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return np.asarray(vectors, dtype=np.float32)
+
+    def scorer(self, query: np.ndarray) -> Callable[[np.ndarray], np.ndarray]:
+        return lambda codes: codes @ query
+
+    def bytes_per_vector(self, dim: int) -> int:
+        return dim * 4
+
+    def state(self) -> dict[str, np.ndarray]:
+        return {}
+
+    def load_state(self, state: dict[str, np.ndarray]) -> None:
+        return None
+
+
+class Int8Codec:
+    """int8标量量化：每个维度一个缩放系数（训练样本绝对值的99.9分位数/127）
+
+    打分时把缩放系数并入查询向量（非对称距离计算），无需解码。
+    """
+
+    name = "int8"
+    lossy = True
+
+    def __init__(self):
+        self.scale: np.ndarray | None = None
+
+    def code_shape(self, dim: int) -> tuple[tuple[int, ...], type]:
+        return (dim,), np.int8
+
+    def train(self, sample: np.ndarray) -> None:
+        bound = np.quantile(np.abs(sample), 0.999, axis=0)
+        self.scale = (np.maximum(bound, 1e-6) / 127.0).astype(np.float32)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        return np.clip(np.rint(vectors / self.scale), -127, 127).astype(np.int8)
+
+    def scorer(self, query: np.ndarray) -> Callable[[np.ndarray], np.ndarray]:
+        scaled = (query * self.scale).astype(np.float32)
+        return lambda codes: codes.astype(np.float32) @ scaled
+
+    def bytes_per_vector(self, dim: int) -> int:
+        return dim
+
+    def state(self) -> dict[str, np.ndarray]:
+        return {"scale": self.scale}
+
+    def load_state(self, state: dict[str, np.ndarray]) -> None:
+        self.scale = state["scale"]
+
+
+class PQCodec:
+    """乘积量化：向量切成m段，每段用256个质心的码本编码为1字节
+
+    打分时先算查询各段与码本的内积表，再按编码查表求和（非对称距离计算）。
+    维度不能被m整除时取不大于m的最大约数。
+    """
+
+    name = "pq"
+    lossy = True
+
+    def __init__(self, m: int = 32, ks: int = 256):
+        self.m = m
+        self.ks = ks
+        self.codebooks: np.ndarray | None = None
+
+    def _subspaces(self, dim: int) -> int:
+        m = min(self.m, dim)
+        while dim % m:
+            m -= 1
+        return m
+
+    def code_shape(self, dim: int) -> tuple[tuple[int, ...], type]:
+        return (self._subspaces(dim),), np.uint8
+
+    def train(self, sample: np.ndarray) -> None:
+        dim = sample.shape[1]
+        m = self._subspaces(dim)
+        dsub = dim // m
+        rng = np.random.default_rng(0)
+        books = np.zeros((m, self.ks, dsub), dtype=np.float32)
+        for j in range(m):
+            book = _kmeans_l2(sample[:, j * dsub : (j + 1) * dsub], self.ks, rng)
+            books[j, : len(book)] = book
+        self.m = m
+        self.codebooks = books
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        m, _, dsub = self.codebooks.shape
+        codes = np.empty((len(vectors), m), dtype=np.uint8)
+        for start in range(0, len(vectors), _BATCH):
+            block = vectors[start : start + _BATCH]
+            for j in range(m):
+                sub = block[:, j * dsub : (j + 1) * dsub]
+                codes[start : start + len(block), j] = _nearest_l2(sub, self.codebooks[j])
+        return codes
+
+    def scorer(self, query: np.ndarray) -> Callable[[np.ndarray], np.ndarray]:
+        m, _, dsub = self.codebooks.shape
+        table = np.einsum("mkd,md->mk", self.codebooks, query.reshape(m, dsub)).astype(np.float32)
+
+        def score(codes: np.ndarray) -> np.ndarray:
+            # 逐段查表累加，比一次性二维花式索引快约3倍
+            scores = np.zeros(len(codes), dtype=np.float32)
+            for j in range(m):
+                scores += table[j].take(codes[:, j])
+            return scores
+
+        return score
+
+    def bytes_per_vector(self, dim: int) -> int:
+        return self._subspaces(dim)
+
+    def state(self) -> dict[str, np.ndarray]:
+        return {"codebooks": self.codebooks}
+
+    def load_state(self, state: dict[str, np.ndarray]) -> None:
+        self.codebooks = state["codebooks"]
+        self.m = self.codebooks.shape[0]
+
+
+CODECS = ("float32", "int8", "pq")
+
+
+def create_codec(name: str, pq_subvectors: int = 32) -> Float32Codec | Int8Codec | PQCodec:
+    if name == "float32":
+        return Float32Codec()
+    if name == "int8":
+        return Int8Codec()
+    if name == "pq":
+        return PQCodec(m=pq_subvectors)
+    raise ValueError(f"不支持的向量编码: {name}")
+
+
+def score_in_batches(
+    scorer: Callable[[np.ndarray], np.ndarray],
+    codes: np.ndarray,
+) -> np.ndarray:
+    """分批打分，避免整体解码或查表时产生过大的中间矩阵"""
+    if len(codes) <= _BATCH:
+        return scorer(codes)
+    return np.concatenate(
+        [scorer(codes[start : start + _BATCH]) for start in range(0, len(codes), _BATCH)]
+    )
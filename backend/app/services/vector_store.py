@@ -0,0 +1,817 @@
+import heapq
+import json
+import math
+import os
+import shutil
+import threading
+from collections.abc import Sequence
+from pathlib import Path
+
+import numpy as np
+
+from ..config import get_settings
+from .vector_codec import (
+    CODECS,
+    Float32Codec,
+    Int8Codec,
+    PQCodec,
+    create_codec,
+    score_in_batches,
+)
+
+settings = get_settings()
+
+_FORMAT_VERSION = 1
+# 分配最近质心时每批处理的行数，限制中间打分矩阵的内存占用
+_ASSIGN_BATCH = 16384
+# 每个质心对应的k-means训练样本数
+_TRAIN_SAMPLES_PER_LIST = 64
+# 向量数增长到上次训练时的该倍数后重新训练质心
+_RETRAIN_GROWTH = 4
+# 训练向量编码（乘积量化码本）的最少样本数
+_CODEC_TRAIN_SAMPLES = 65536
+# 重新训练时每批读取并编码的行数
+_REBUILD_BATCH = 262144
+
+VectorCodec = Float32Codec | Int8Codec | PQCodec
+
+
+def _nearest_centroids(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """按内积为每行分配最近的质心"""
+    assign = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), _ASSIGN_BATCH):
+        block = data[start : start + _ASSIGN_BATCH]
+        assign[start : start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assign
+
+
+def _read_array(path: Path, dtype: type) -> np.ndarray:
+    if not path.exists():
+        return np.empty(0, dtype=dtype)
+    return np.fromfile(path, dtype=dtype)
+
+
+def _file_rows(path: Path, row_bytes: int) -> int:
+    return path.stat().st_size // row_bytes if path.exists() else 0
+
+
+def _truncate(path: Path, nbytes: int) -> None:
+    if path.exists():
+        os.truncate(path, nbytes)
+
+
+def _grow(array: np.ndarray, size: int, needed: int) -> np.ndarray:
+    """按倍增策略扩容，保留前size行"""
+    if needed <= len(array):
+        return array
+    grown = np.empty((max(needed, 2 * len(array), 1024), *array.shape[1:]), dtype=array.dtype)
+    grown[:size] = array[:size]
+    return grown
+
+
+def _top_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """分数最高的k个下标，按分数降序"""
+    if len(scores) > k:
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def train_kmeans(
+    data: np.ndarray,
+    k: int,
+    iterations: int = 10,
+    seed: int = 0,
+) -> np.ndarray:
+    """球面k-means：按内积分配，质心取均值后归一化，空簇用随机样本重新播种"""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        assign = _nearest_centroids(data, centroids)
+        counts = np.bincount(assign, minlength=k)
+        order = np.argsort(assign, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        nonempty = counts > 0
+        sums = np.zeros_like(centroids)
+        sums[nonempty] = np.add.reduceat(data[order], starts[nonempty], axis=0)
+        empty = ~nonempty
+        if empty.any():
+            sums[empty] = data[rng.choice(len(data), int(empty.sum()))]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+class IVFIndex:
+    """倒排文件索引：k-means粗量化，每个质心维护一个行号列表
+
+    新增向量直接分配到最近的质心（不重新训练），检索时只对最近的nprobe个列表打分。
+    """
+
+    def __init__(self, centroids: np.ndarray):
+        self.centroids = centroids
+        self.nlist = len(centroids)
+        self.assign = np.empty(0, dtype=np.int32)
+        self._lists = [np.empty(0, dtype=np.int64) for _ in range(self.nlist)]
+
+    @property
+    def n_indexed(self) -> int:
+        return len(self.assign)
+
+    @property
+    def nbytes(self) -> int:
+        return self.centroids.nbytes + self.assign.nbytes + sum(lst.nbytes for lst in self._lists)
+
+    def add(self, vectors: np.ndarray | None, assign: np.ndarray | None = None) -> None:
+        """追加行号从n_indexed开始的一批向量；assign为已知的质心分配（加载时使用）"""
+        if assign is None and (vectors is None or not len(vectors)):
+            return
+        if assign is None:
+            assign = _nearest_centroids(vectors, self.centroids)
+        start = self.n_indexed
+        self.assign = np.concatenate((self.assign, assign))
+        order = np.argsort(assign, kind="stable")
+        lists, bounds = np.unique(assign[order], return_index=True)
+        bounds = np.append(bounds, len(order))
+        ids = order.astype(np.int64) + start
+        for i, lst in enumerate(lists):
+            chunk = ids[bounds[i] : bounds[i + 1]]
+            self._lists[lst] = np.concatenate((self._lists[lst], chunk))
+
+    def probe(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """返回最近nprobe个列表中的全部行号"""
+        nprobe = min(nprobe, self.nlist)
+        scores = self.centroids @ query
+        nearest = np.argpartition(-scores, nprobe - 1)[:nprobe]
+        return np.concatenate([self._lists[i] for i in nearest])
+
+
+class LocalVectorStore:
+    """本地向量库：未连接Milvus时（离线、边缘部署与测试）的内积检索
+
+    原始向量以float32追加写入磁盘（vectors.f32与rows.i64）。行数少于index_min_rows时
+    向量以float32保存在内存中并精确打分；达到后训练IVF索引与向量编码（codec）：
+    float32不压缩，int8为标量量化，pq为乘积量化，有损编码下内存中只保留编码，
+    以非对称距离计算打分，rerank大于0时再从磁盘读取前rerank*top_k个候选的原始向量精确重排。
+    之后新增的向量增量编码并加入索引，行数增长到训练时的4倍后在后台线程重新训练并替换。
+    nprobe越大召回越高、延迟越高，等于nlist时退化为全量扫描。
+    删除只写墓碑（被删除的行号追加到deleted.i64），被删除的行不再参与检索与按键取向量。
+    编码方式在向量库创建时确定并记录在meta.json中，已有向量库沿用其记录的编码。
+    path为None时仅在内存中维护，不落盘；此时有损编码仍需在内存中保留原始向量用于重排与重新训练。
+    """
+
+    def __init__(
+        self,
+        path: str | Path | None = None,
+        index_min_rows: int = 20000,
+        nlist: int = 0,
+        nprobe: int = 16,
+        codec: str = "float32",
+        rerank: int = 4,
+        pq_subvectors: int = 32,
+        background_rebuild: bool = True,
+    ):
+        if codec not in CODECS:
+            raise ValueError(f"不支持的向量编码: {codec}")
+        self.path = Path(path) if path else None
+        self.index_min_rows = index_min_rows
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.codec_name = codec
+        self.rerank = rerank
+        self.pq_subvectors = pq_subvectors
+        self.background_rebuild = background_rebuild
+        self._lock = threading.RLock()
+        self._rebuild_thread: threading.Thread | None = None
+        self._loaded = False
+        self._reset()
+
+    def _reset(self) -> None:
+        self.dim: int | None = None
+        # 训练前使用float32编码，此时编码即原始向量
+        self._codec: VectorCodec = Float32Codec()
+        self._codes = np.empty((0, 0), dtype=np.float32)
+        # 仅内存模式下的有损编码保留原始向量，落盘模式从vectors.f32按需映射
+        self._floats: np.ndarray | None = None
+        self._disk: np.memmap | None = None
+        self._rows = np.empty((0, 3), dtype=np.int64)
+        self._live = np.empty(0, dtype=bool)
+        self._size = 0
+        self._deleted = 0
+        self._index: IVFIndex | None = None
+        self._trained_rows = 0
+        self._generation = 0
+        # ((行数, 删除数), 排序后的(doc_id, chunk_index)键, 对应行号)，供按键取向量
+        self._key_index: tuple[tuple[int, int], np.ndarray, np.ndarray] | None = None
+
+    # ---- 加载与落盘 ----
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            if self.path is not None:
+                self._load()
+            self._loaded = True
+
+    def _load(self) -> None:
+        meta_path = self.path / "meta.json"
+        if not meta_path.exists():
+            return
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        if meta.get("version") != _FORMAT_VERSION:
+            return
+        self.dim = meta["dim"]
+        self.codec_name = meta.get("codec", "float32")
+        size = min(
+            _file_rows(self.path / "vectors.f32", self.dim * 4),
+            _file_rows(self.path / "rows.i64", 3 * 8),
+        )
+        # 写入中途中断时各文件的行数可能不一致，截断到完整的行
+        _truncate(self.path / "vectors.f32", size * self.dim * 4)
+        _truncate(self.path / "rows.i64", size * 3 * 8)
+        self._size = size
+        self._rows = np.fromfile(self.path / "rows.i64", dtype=np.int64).reshape(size, 3)
+        self._live = np.ones(size, dtype=bool)
+        dead = _read_array(self.path / "deleted.i64", np.int64)
+        self._live[dead[dead < size]] = False
+        self._deleted = size - int(self._live.sum())
+
+        codec_path = self.path / "codec.npz"
+        if codec_path.exists():
+            with np.load(codec_path) as data:
+                codec = create_codec(str(data["name"]), self.pq_subvectors)
+                generation = int(data["generation"])
+                codec.load_state({k: data[k] for k in data.files if k not in ("name", "generation")})
+            shape, dtype = codec.code_shape(self.dim)
+            codes_path = self.path / f"codes.{generation}.bin"
+            width = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            encoded = min(_file_rows(codes_path, width), size)
+            _truncate(codes_path, encoded * width)
+            codes = _read_array(codes_path, dtype).reshape(encoded, *shape)
+            if encoded < size:
+                tail = codec.encode(np.asarray(self._disk_view()[encoded:size]))
+                with codes_path.open("ab") as f:
+                    f.write(tail.tobytes())
+                codes = np.concatenate((codes, tail))
+            self._codec, self._codes, self._generation = codec, codes, generation
+        else:
+            self._codes = _read_array(self.path / "vectors.f32", np.float32).reshape(size, self.dim)
+
+        index_path = self.path / "ivf.npz"
+        if index_path.exists():
+            with np.load(index_path) as data:
+                centroids, assign = data["centroids"], data["assign"]
+            if len(assign) <= size and centroids.shape[1] == self.dim:
+                index = IVFIndex(centroids)
+                index.add(None, assign)
+                index.add(np.asarray(self._float_source()[len(assign) : size]))
+                self._index = index
+                self._trained_rows = len(assign)
+        self._maybe_rebuild()
+
+    def _write_meta(self) -> None:
+        if self.path is None:
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+        (self.path / "meta.json").write_text(
+            json.dumps({"version": _FORMAT_VERSION, "dim": self.dim, "codec": self.codec_name}),
+            encoding="utf-8",
+        )
+
+    def _persist_rows(self, vectors: np.ndarray, rows: np.ndarray, codes: np.ndarray | None) -> None:
+        if self.path is None:
+            return
+        with (self.path / "vectors.f32").open("ab") as f:
+            f.write(vectors.tobytes())
+        with (self.path / "rows.i64").open("ab") as f:
+            f.write(rows.tobytes())
+        if codes is not None:
+            with (self.path / f"codes.{self._generation}.bin").open("ab") as f:
+                f.write(codes.tobytes())
+
+    def _persist_index(self, index: IVFIndex, codec: "VectorCodec", previous_generation: int) -> None:
+        if self.path is None:
+            return
+        tmp = self.path / "ivf.tmp.npz"
+        np.savez(tmp, centroids=index.centroids, assign=index.assign)
+        os.replace(tmp, self.path / "ivf.npz")
+        if not codec.lossy:
+            return
+        # 先写新一代编码文件，再替换codec.npz，最后删除上一代编码文件
+        self._codes[: self._size].tofile(self.path / f"codes.{self._generation}.bin")
+        tmp = self.path / "codec.tmp.npz"
+        np.savez(tmp, name=codec.name, generation=self._generation, **codec.state())
+        os.replace(tmp, self.path / "codec.npz")
+        if previous_generation != self._generation:
+            (self.path / f"codes.{previous_generation}.bin").unlink(missing_ok=True)
+
+    def _disk_view(self) -> np.memmap:
+        if self._disk is None or len(self._disk) != self._size:
+            self._disk = np.memmap(
+                self.path / "vectors.f32",
+                dtype=np.float32,
+                mode="r",
+                shape=(self._size, self.dim),
+            )
+        return self._disk
+
+    def _float_source(self) -> np.ndarray:
+        """原始向量的来源：未压缩时即编码本身，否则为内存副本或磁盘映射"""
+        if not self._codec.lossy:
+            return self._codes
+        if self._floats is not None:
+            return self._floats
+        return self._disk_view()
+
+    # ---- 写入 ----
+
+    def _append_rows(self, vectors: np.ndarray, codes: np.ndarray, rows: np.ndarray) -> None:
+        size, needed = self._size, self._size + len(vectors)
+        self._codes = _grow(self._codes, size, needed)
+        self._codes[size:needed] = codes
+        self._rows = _grow(self._rows, size, needed)
+        self._rows[size:needed] = rows
+        self._live = _grow(self._live, size, needed)
+        self._live[size:needed] = True
+        if self._floats is not None:
+            self._floats = _grow(self._floats, size, needed)
+            self._floats[size:needed] = vectors
+        self._size = needed
+
+    def add(
+        self,
+        kb_id: int,
+        doc_id: int,
+        chunk_indices: Sequence[int],
+        embeddings: Sequence[Sequence[float]],
+    ) -> None:
+        """写入一个文档的切块向量"""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or not len(vectors):
+            return
+        rows = np.empty((len(vectors), 3), dtype=np.int64)
+        rows[:, 0] = kb_id
+        rows[:, 1] = doc_id
+        rows[:, 2] = np.fromiter(chunk_indices, dtype=np.int64, count=len(vectors))
+        self._ensure_loaded()
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._codes = np.empty((0, self.dim), dtype=np.float32)
+                self._write_meta()
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"向量维度不一致: {vectors.shape[1]} != {self.dim}")
+            codes = self._codec.encode(vectors)
+            self._append_rows(vectors, codes, rows)
+            self._persist_rows(vectors, rows, codes if self._codec.lossy else None)
+            if self._index is not None:
+                self._index.add(vectors)
+            self._maybe_rebuild()
+
+    def delete(self, doc_id: int, chunk_indices: Sequence[int] | None = None) -> int:
+        """删除文档的向量，chunk_indices为None时删除该文档全部向量，返回删除的行数"""
+        self._ensure_loaded()
+        with self._lock:
+            size = self._size
+            mask = (self._rows[:size, 1] == doc_id) & self._live[:size]
+            if chunk_indices is not None:
+                mask &= np.isin(self._rows[:size, 2], np.asarray(list(chunk_indices), dtype=np.int64))
+            dead = np.flatnonzero(mask)
+            if not len(dead):
+                return 0
+            self._live[dead] = False
+            self._deleted += len(dead)
+            if self.path is not None:
+                with (self.path / "deleted.i64").open("ab") as f:
+                    f.write(dead.astype(np.int64).tobytes())
+            return len(dead)
+
+    def replace(
+        self,
+        kb_id: int,
+        doc_id: int,
+        chunk_indices: Sequence[int],
+        embeddings: Sequence[Sequence[float]],
+    ) -> None:
+        """原子地替换文档的全部向量：删除旧向量与写入新向量在同一把锁内完成，检索只会看到其中一组"""
+        self._ensure_loaded()
+        with self._lock:
+            self.delete(doc_id)
+            self.add(kb_id, doc_id, chunk_indices, embeddings)
+
+    # ---- 索引与编码训练 ----
+
+    def _auto_nlist(self, rows: int) -> int:
+        if self.nlist > 0:
+            return self.nlist
+        return max(1, min(int(4 * math.sqrt(rows)), rows // 32, 65536))
+
+    def _maybe_rebuild(self) -> None:
+        if self._size < self.index_min_rows:
+            return
+        if (
+            self._index is not None
+            and self._codec.name == self.codec_name
+            and self._size < _RETRAIN_GROWTH * self._trained_rows
+        ):
+            return
+        if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+            return
+        args = (self._float_source(), self._size)
+        if self._index is None or not self.background_rebuild:
+            self._rebuild(*args)
+            return
+        self._rebuild_thread = threading.Thread(
+            target=self._rebuild,
+            args=args,
+            name="vector-index-rebuild",
+            daemon=True,
+        )
+        self._rebuild_thread.start()
+
+    def _rebuild(self, source: np.ndarray, rows: int) -> None:
+        """用前rows行训练新索引与编码，再补上训练期间新增的行后替换"""
+        rng = np.random.default_rng(rows)
+        nlist = self._auto_nlist(rows)
+        sample_size = min(rows, max(nlist * _TRAIN_SAMPLES_PER_LIST, _CODEC_TRAIN_SAMPLES))
+        sample = np.asarray(source[np.sort(rng.choice(rows, sample_size, replace=False))])
+        index = IVFIndex(train_kmeans(sample, nlist, seed=rows))
+        codec = create_codec(self.codec_name, self.pq_subvectors)
+        codec.train(sample)
+        encoded = []
+        for start in range(0, rows, _REBUILD_BATCH):
+            block = np.asarray(source[start : min(start + _REBUILD_BATCH, rows)])
+            index.add(block)
+            if codec.lossy:
+                encoded.append(codec.encode(block))
+
+        with self._lock:
+            tail = np.asarray(self._float_source()[rows : self._size])
+            index.add(tail)
+            previous_generation = self._generation
+            if codec.lossy:
+                encoded.append(codec.encode(tail))
+                if self.path is None and self._floats is None:
+                    self._floats = self._codes
+                self._codes = np.concatenate(encoded)
+                self._codec = codec
+                self._generation += 1
+            self._index = index
+            self._trained_rows = rows
+            self._persist_index(index, codec, previous_generation)
+
+    def wait_for_rebuild(self, timeout: float | None = None) -> None:
+        """等待后台训练结束"""
+        thread = self._rebuild_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    # ---- 检索 ----
+
+    def search(
+        self,
+        query: Sequence[float],
+        kb_ids: Sequence[int] | None = None,
+        top_k: int = 5,
+        nprobe: int | None = None,
+    ) -> list[dict]:
+        """内积检索，返回按分数降序的[{score, kb_id, doc_id, chunk_index}]"""
+        self._ensure_loaded()
+        with self._lock:
+            size, codes, rows, index, codec = (
+                self._size, self._codes, self._rows, self._index, self._codec,
+            )  # fmt: skip
+            live = self._live if self._deleted else None
+            floats = self._float_source() if codec.lossy and self.rerank > 0 else None
+        if size == 0 or top_k <= 0:
+            return []
+        q = np.asarray(query, dtype=np.float32)
+        kb_filter = np.asarray(list(kb_ids), dtype=np.int64) if kb_ids else None
+        scorer = codec.scorer(q)
+
+        nprobe = nprobe or self.nprobe
+        if index is not None and nprobe < index.nlist:
+            # 过滤后候选不足top_k时逐步扩大探查的列表数
+            while True:
+                # 探查在锁外进行，并发写入可能已把新行加入列表，只保留快照内的行
+                ids = index.probe(q, nprobe)
+                ids = ids[ids < size]
+                if live is not None:
+                    ids = ids[live[ids]]
+                if kb_filter is not None:
+                    ids = ids[np.isin(rows[ids, 0], kb_filter)]
+                if len(ids) >= top_k or nprobe >= index.nlist:
+                    break
+                nprobe *= 2
+            scores = score_in_batches(scorer, codes[ids])
+        elif kb_filter is not None or live is not None:
+            mask = np.ones(size, dtype=bool) if live is None else live[:size].copy()
+            if kb_filter is not None:
+                mask &= np.isin(rows[:size, 0], kb_filter)
+            ids = np.flatnonzero(mask)
+            scores = score_in_batches(scorer, codes[ids])
+        else:
+            ids = None
+            scores = score_in_batches(scorer, codes[:size])
+
+        keep = top_k * self.rerank if floats is not None else top_k
+        top = _top_indices(scores, keep)
+        row_ids = top if ids is None else ids[top]
+        top_scores = scores[top]
+        if floats is not None and len(row_ids):
+            # 按行号顺序读取原始向量，减少磁盘映射的随机访问
+            order = np.argsort(row_ids)
+            exact = np.empty(len(row_ids), dtype=np.float32)
+            exact[order] = np.asarray(floats[row_ids[order]]) @ q
+            best = _top_indices(exact, top_k)
+            row_ids, top_scores = row_ids[best], exact[best]
+
+        hits: list[dict] = []
+        for row_id, score in zip(row_ids, top_scores):
+            row = rows[row_id]
+            hits.append(
+                {
+                    "score": float(score),
+                    "kb_id": int(row[0]),
+                    "doc_id": int(row[1]),
+                    "chunk_index": int(row[2]),
+                }
+            )
+        return hits
+
+    def fetch(self, doc_ids: Sequence[int], chunk_indices: Sequence[int]) -> np.ndarray | None:
+        """按(doc_id, chunk_index)取原始向量，没有或已删除的行为NaN；同一键写入多次时取最后一次
+
+        向量库为空时返回None。
+        """
+        self._ensure_loaded()
+        with self._lock:
+            size = self._size
+            if size == 0:
+                return None
+            version = (size, self._deleted)
+            if self._key_index is None or self._key_index[0] != version:
+                row_ids = np.flatnonzero(self._live[:size])
+                keys = (self._rows[row_ids, 1] << 32) | self._rows[row_ids, 2]
+                order = np.argsort(keys, kind="stable")
+                self._key_index = (version, keys[order], row_ids[order])
+            _, sorted_keys, order = self._key_index
+            source = self._float_source()
+        query = (np.asarray(doc_ids, dtype=np.int64) << 32) | np.asarray(chunk_indices, dtype=np.int64)
+        vectors = np.full((len(query), self.dim), np.nan, dtype=np.float32)
+        if not len(sorted_keys):
+            return vectors
+        pos = np.searchsorted(sorted_keys, query, side="right") - 1
+        found = (pos >= 0) & (sorted_keys[np.maximum(pos, 0)] == query)
+        row_ids = order[pos[found]]
+        # 按行号顺序读取，减少磁盘映射的随机访问
+        sort = np.argsort(row_ids)
+        picked = np.empty((len(row_ids), self.dim), dtype=np.float32)
+        picked[sort] = np.asarray(source[row_ids[sort]])
+        vectors[found] = picked
+        return vectors
+
+    def memory_stats(self) -> dict:
+        """内存占用统计（字节）：编码、内存中的原始向量与索引"""
+        self._ensure_loaded()
+        with self._lock:
+            size = self._size
+            return {
+                "codec": self._codec.name,
+                "rows": size,
+                "deleted": self._deleted,
+                "bytes_per_vector": self._codec.bytes_per_vector(self.dim) if self.dim else 0,
+                "codes_bytes": self._codes[:size].nbytes,
+                "float_bytes": self._floats[:size].nbytes if self._floats is not None else 0,
+                "index_bytes": self._index.nbytes if self._index is not None else 0,
+            }
+
+    def clear(self) -> None:
+        """清空向量、索引与编码（含磁盘文件）"""
+        self.wait_for_rebuild()
+        with self._lock:
+            self._reset()
+            if self.path is not None:
+                for name in (
+                    "meta.json", "vectors.f32", "rows.i64", "deleted.i64", "ivf.npz", "codec.npz",
+                ):  # fmt: skip
+                    (self.path / name).unlink(missing_ok=True)
+                for codes_path in self.path.glob("codes.*.bin"):
+                    codes_path.unlink()
+            self._loaded = True
+
+    def __len__(self) -> int:
+        """未被删除的向量数"""
+        self._ensure_loaded()
+        return self._size - self._deleted
+
+
+def partition_name(kb_id: int) -> str:
+    """知识库对应的分区名，Milvus分区与本地向量库的分段目录共用"""
+    return f"kb_{kb_id}"
+
+
+class PartitionedVectorStore:
+    """按知识库分区的本地向量库：每个知识库一个独立的LocalVectorStore分段
+
+    各分段独立训练索引与编码，小知识库保持精确检索，大知识库不影响其他知识库的检索延迟；
+    检索只访问请求的知识库分段再合并结果，删除知识库直接删除其分段目录。
+    落盘时每个分段位于path下的kb_{id}目录；path下存在旧版未分区的向量库文件时，
+    首次加载按知识库拆分迁移到各分段。
+    """
+
+    def __init__(self, path: str | Path | None = None, **segment_options):
+        self.path = Path(path) if path else None
+        self.segment_options = segment_options
+        self._lock = threading.RLock()
+        self._segments: dict[int, LocalVectorStore] = {}
+        self._loaded = False
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            if self.path is not None:
+                if (self.path / "meta.json").exists():
+                    self.migrate_legacy()
+                for segment_dir in self.path.glob("kb_*"):
+                    kb_id = segment_dir.name[3:]
+                    if segment_dir.is_dir() and kb_id.isdigit() and int(kb_id) not in self._segments:
+                        self._segments[int(kb_id)] = self._new_segment(int(kb_id))
+            self._loaded = True
+
+    def _new_segment(self, kb_id: int) -> LocalVectorStore:
+        path = self.path / partition_name(kb_id) if self.path is not None else None
+        return LocalVectorStore(path, **self.segment_options)
+
+    def _segment(self, kb_id: int) -> LocalVectorStore:
+        self._ensure_loaded()
+        with self._lock:
+            segment = self._segments.get(kb_id)
+            if segment is None:
+                segment = self._segments[kb_id] = self._new_segment(kb_id)
+            return segment
+
+    def migrate_legacy(self, batch_size: int = 100_000) -> int:
+        """将path下旧版未分区的向量库按知识库拆分到各分段，返回迁移的向量数"""
+        legacy = LocalVectorStore(self.path, index_min_rows=2**62)
+        legacy._ensure_loaded()
+        size, rows = legacy._size, legacy._rows
+        if size:
+            vectors = legacy._disk_view()
+            for start in range(0, size, batch_size):
+                block_rows = rows[start : start + batch_size]
+                block = np.asarray(vectors[start : start + batch_size])
+                # 同一知识库同一文档的连续行合并为一次写入
+                keys = block_rows[:, 0] * (1 << 32) + block_rows[:, 1]
+                bounds = np.flatnonzero(np.diff(keys)) + 1
+                for lo, hi in zip(np.r_[0, bounds], np.r_[bounds, len(keys)]):
+                    kb_id, doc_id = int(block_rows[lo, 0]), int(block_rows[lo, 1])
+                    segment = self._segments.get(kb_id)
+                    if segment is None:
+                        segment = self._segments[kb_id] = self._new_segment(kb_id)
+                    segment.add(kb_id, doc_id, block_rows[lo:hi, 2], block[lo:hi])
+        for segment in self._segments.values():
+            segment.wait_for_rebuild()
+        # 分段全部写入后再删除旧文件，中途中断时下次加载重新迁移
+        legacy.clear()
+        return size
+
+    def add(
+        self,
+        kb_id: int,
+        doc_id: int,
+        chunk_indices: Sequence[int],
+        embeddings: Sequence[Sequence[float]],
+    ) -> None:
+        """写入一个文档的切块向量到所属知识库的分段"""
+        self._segment(kb_id).add(kb_id, doc_id, chunk_indices, embeddings)
+
+    def search(
+        self,
+        query: Sequence[float],
+        kb_ids: Sequence[int] | None = None,
+        top_k: int = 5,
+        nprobe: int | None = None,
+    ) -> list[dict]:
+        """只检索kb_ids对应的分段并合并，kb_ids为空时检索全部分段"""
+        self._ensure_loaded()
+        with self._lock:
+            if kb_ids:
+                segments = [self._segments[k] for k in dict.fromkeys(kb_ids) if k in self._segments]
+            else:
+                segments = list(self._segments.values())
+        if len(segments) == 1:
+            return segments[0].search(query, top_k=top_k, nprobe=nprobe)
+        hits: list[dict] = []
+        for segment in segments:
+            hits.extend(segment.search(query, top_k=top_k, nprobe=nprobe))
+        return heapq.nlargest(top_k, hits, key=lambda h: h["score"])
+
+    def fetch(
+        self,
+        kb_id: int,
+        doc_ids: Sequence[int],
+        chunk_indices: Sequence[int],
+    ) -> np.ndarray | None:
+        """从知识库的分段按(doc_id, chunk_index)取原始向量，分段不存在时返回None"""
+        self._ensure_loaded()
+        with self._lock:
+            segment = self._segments.get(kb_id)
+        if segment is None:
+            return None
+        return segment.fetch(doc_ids, chunk_indices)
+
+    def delete(self, kb_id: int, doc_id: int, chunk_indices: Sequence[int] | None = None) -> int:
+        """删除知识库分段中文档的向量，chunk_indices为None时删除该文档全部向量"""
+        self._ensure_loaded()
+        with self._lock:
+            segment = self._segments.get(kb_id)
+        if segment is None:
+            return 0
+        return segment.delete(doc_id, chunk_indices)
+
+    def replace(
+        self,
+        kb_id: int,
+        doc_id: int,
+        chunk_indices: Sequence[int],
+        embeddings: Sequence[Sequence[float]],
+    ) -> None:
+        """替换知识库分段中文档的全部向量"""
+        self._segment(kb_id).replace(kb_id, doc_id, chunk_indices, embeddings)
+
+    def drop_partition(self, kb_id: int) -> None:
+        """删除知识库的分段及其磁盘目录"""
+        self._ensure_loaded()
+        with self._lock:
+            segment = self._segments.pop(kb_id, None)
+        if segment is None:
+            return
+        segment.clear()
+        if segment.path is not None:
+            shutil.rmtree(segment.path, ignore_errors=True)
+
+    def partitions(self) -> list[int]:
+        self._ensure_loaded()
+        with self._lock:
+            return sorted(self._segments)
+
+    def memory_stats(self) -> dict:
+        """各分段内存占用之和，并按知识库列出"""
+        self._ensure_loaded()
+        with self._lock:
+            segments = dict(self._segments)
+        per_kb = {kb_id: segment.memory_stats() for kb_id, segment in segments.items()}
+        total = {
+            key: sum(stats[key] for stats in per_kb.values())
+            for key in ("rows", "codes_bytes", "float_bytes", "index_bytes")
+        }
+        total["partitions"] = per_kb
+        return total
+
+    def warm_up(self) -> int:
+        """加载全部分段的向量与索引，返回向量总数"""
+        self._ensure_loaded()
+        with self._lock:
+            segments = list(self._segments.values())
+        for segment in segments:
+            segment._ensure_loaded()
+        return sum(len(segment) for segment in segments)
+
+    def wait_for_rebuild(self, timeout: float | None = None) -> None:
+        """等待所有分段的后台训练结束"""
+        with self._lock:
+            segments = list(self._segments.values())
+        for segment in segments:
+            segment.wait_for_rebuild(timeout)
+
+    def clear(self) -> None:
+        """删除全部分段"""
+        for kb_id in self.partitions():
+            self.drop_partition(kb_id)
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        with self._lock:
+            segments = list(self._segments.values())
+        return sum(len(segment) for segment in segments)
+
+
+local_store = PartitionedVectorStore(
+    None if settings.TESTING else Path(settings.DATA_DIR) / "vector_store",
+    index_min_rows=settings.LOCAL_ANN_MIN_ROWS,
+    nlist=settings.LOCAL_ANN_NLIST,
+    nprobe=settings.LOCAL_ANN_NPROBE,
+    codec=settings.LOCAL_VECTOR_CODEC,
+    rerank=settings.LOCAL_VECTOR_RERANK,
+    pq_subvectors=settings.LOCAL_PQ_SUBVECTORS,
+)
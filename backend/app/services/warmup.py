@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import time
+
+from sqlalchemy import select, text
+
+from ..config import get_settings
+from ..db import AsyncSessionLocal, engine
+from ..metrics import gauge, stage
+from ..models import ChatMessage, KnowledgeBase
+from .captcha import captcha_service
+from .embedding import default_embedder
+from .keyword_index import keyword_index
+from .milvus_client import warm_up as warm_up_vectors
+from .rag import prefetch_chunks
+
+settings = get_settings()
+
+logger = logging.getLogger(__name__)
+
+WARMUP_SECONDS = gauge("warmup_duration_seconds", "启动预热耗时（秒）")
+APP_READY = gauge("app_ready", "预热是否完成（1为就绪）")
+APP_READY.set(0)
+
+
+class Warmup:
+    """启动预热：依次建立数据库连接、加载向量与关键词索引、预计算向量化查找表、
+    回放最近的用户问题（检索并回填文档块），全部结束（或超时）后才报告就绪
+
+    单个步骤失败只记录日志，不阻止就绪；各步骤耗时计入warmup流水线的阶段指标。
+    """
+
+    def __init__(
+        self,
+        db_connections: int = 5,
+        questions: int = 50,
+        timeout: float = 120.0,
+    ):
+        self.db_connections = db_connections
+        self.questions = questions
+        self.timeout = timeout
+        self.ready = False
+        self.duration: float | None = None
+        self.steps: dict[str, str] = {}
+
+    def mark_ready(self) -> None:
+        self.ready = True
+        APP_READY.set(1)
+
+    def reset(self) -> None:
+        self.ready = False
+        self.duration = None
+        self.steps = {}
+        APP_READY.set(0)
+
+    async def run(self, role: str = "all") -> None:
+        steps = [
+            ("database", self._database),
+            ("vectors", self._vectors),
+            ("captcha", captcha_service.warm_up),
+        ]
+        if role in ("all", "chat"):
+            steps += [
+                ("keyword_index", self._keyword_index),
+                ("embedding", self._embedding),
+                ("replay", self._replay),
+            ]
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._run_steps(steps), self.timeout)
+        except asyncio.TimeoutError:
+            pending = [name for name, status in self.steps.items() if status == "running"]
+            logger.warning("启动预热超时（%.0f秒），中断于: %s", self.timeout, pending)
+        finally:
+            self.duration = time.perf_counter() - started
+            WARMUP_SECONDS.set(self.duration)
+        self.mark_ready()
+
+    async def _run_steps(self, steps) -> None:
+        for name, step in steps:
+            self.steps[name] = "running"
+            try:
+                with stage("warmup", name):
+                    result = await step()
+                self.steps[name] = "ok" if result is None else f"ok: {result}"
+            except Exception as exc:
+                logger.exception("预热步骤失败: %s", name)
+                self.steps[name] = f"failed: {exc}"
+
+    async def _database(self) -> int:
+        """同时打开多个连接，填充连接池"""
+        count = max(1, min(self.db_connections, getattr(engine.pool, "size", lambda: 1)()))
+
+        async def ping() -> None:
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+                # 保持连接直到全部打开，否则会重复使用同一连接
+                await asyncio.sleep(0.05)
+
+        await asyncio.gather(*(ping() for _ in range(count)))
+        return count
+
+    async def _vectors(self) -> int:
+        return await asyncio.to_thread(warm_up_vectors)
+
+    async def _keyword_index(self) -> int:
+        return await asyncio.to_thread(keyword_index.warm_up)
+
+    async def _embedding(self) -> int:
+        return await asyncio.to_thread(default_embedder.prime)
+
+    async def _replay(self) -> int:
+        """回放最近questions个不同的用户问题，在全部知识库上检索并回填文档块"""
+        if self.questions <= 0:
+            return 0
+        async with AsyncSessionLocal() as db:
+            rows = await db.execute(
+                select(ChatMessage.content)
+                .where(ChatMessage.role == "user")
+                .order_by(ChatMessage.id.desc())
+                .limit(self.questions * 4)
+            )
+            questions = list(dict.fromkeys(rows.scalars()))[: self.questions]
+            kb_ids = (
+                await db.execute(select(KnowledgeBase.id).where(KnowledgeBase.deleting.is_(False)))
+            ).scalars().all()
+        if not kb_ids:
+            return 0
+        for question in questions:
+            await prefetch_chunks(kb_ids, question)
+        return len(questions)
+
+
+warmup = Warmup(
+    db_connections=settings.WARMUP_DB_CONNECTIONS,
+    questions=settings.WARMUP_QUESTIONS,
+    timeout=settings.WARMUP_TIMEOUT,
+)
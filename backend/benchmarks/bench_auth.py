@@ -0,0 +1,65 @@
+"""认证依赖微基准：对比get_current_user在无缓存与命中缓存时的解析耗时
+
+用法（在backend目录下）：
+    python benchmarks/bench_auth.py [--iterations 2000]
+
+以TESTING模式运行（SQLite测试库），无缓存一列在每次调用前清空令牌与用户缓存，
+即每次都做JWT签名校验并查询users表；生产环境使用MySQL时查询还需额外的网络往返。
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+os.environ.setdefault("TESTING", "1")
+
+from app import auth, dependencies  # noqa: E402
+from app.auth import create_access_token, get_password_hash  # noqa: E402
+from app.db import AsyncSessionLocal, init_db  # noqa: E402
+from app.models import User  # noqa: E402
+
+
+async def run(iterations: int, cached: bool) -> float:
+    async with AsyncSessionLocal() as db:
+        user = User(username=f"bench_auth_{cached}", password_hash=get_password_hash("x"))
+        db.add(user)
+        await db.commit()
+        token = create_access_token({"sub": str(user.id)})
+
+    auth._token_cache.clear()
+    dependencies._user_cache.clear()
+    samples: list[float] = []
+    for _ in range(iterations):
+        if not cached:
+            auth._token_cache.clear()
+            dependencies._user_cache.clear()
+        async with AsyncSessionLocal() as db:
+            start = time.perf_counter()
+            await dependencies.get_current_user(token, db)
+            samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    await init_db()
+    cold = await run(args.iterations, cached=False)
+    warm = await run(args.iterations, cached=True)
+    print(f"{'mode':<10}{'p50_us':>10}")
+    print(f"{'uncached':<10}{cold * 1e6:>10.1f}")
+    print(f"{'cached':<10}{warm * 1e6:>10.1f}")
+    print(f"加速比: {cold / warm:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,113 @@
+"""切块策略基准：对比fixed与sentence策略的切块吞吐与每次回答的上下文token数
+
+用法（在backend目录下）：
+    python benchmarks/bench_chunking.py [--file 路径] [--repeat 20] [--max-top-k 10]
+
+上下文token数的统计方式：从语料中抽取句子作为问题的出处，取问题为该句的前半段，
+逐步增大top_k直到召回完整包含该句的块，记录此时拼接上下文的token数。
+切块越贴合句子与段落，命中所需的top_k越小，送入大模型的上下文也越短。
+"""
+
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from app.services.embedding import default_embedder  # noqa: E402
+from app.services.file_parser import extract_text, split_text  # noqa: E402
+from app.services.tokenizer import estimate_tokens  # noqa: E402
+
+
+CASES = [
+    ("fixed", 500, 100),
+    ("sentence", 500, 100),
+    ("sentence", 300, 60),
+]
+
+
+def load_corpus(path: str | None) -> str:
+    if path:
+        return extract_text(Path(path))
+    data_dir = Path(BASE_DIR).parent / "data"
+    texts = [extract_text(p) for p in sorted(data_dir.glob("*.pdf"))]
+    if not texts:
+        raise SystemExit("data目录下没有可用的示例文档，请通过--file指定语料")
+    return "\n\n".join(texts)
+
+
+def measure_throughput(text: str, strategy: str, size: int, overlap: int, repeat: int):
+    best = float("inf")
+    chunks: list[str] = []
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            chunks = split_text(text, size, overlap, strategy)
+        best = min(best, time.perf_counter() - start)
+    return chunks, len(chunks) * repeat / best, len(text) * repeat / best
+
+
+def sample_questions(text: str, limit: int = 60) -> list[str]:
+    sentences = [
+        s.strip()
+        for s in re.split(r"(?<=[。！？；])", text)
+        if 12 <= len(s.strip()) <= 80
+    ]
+    step = max(1, len(sentences) // limit)
+    return sentences[::step][:limit]
+
+
+def measure_context_tokens(chunks: list[str], questions: list[str], max_top_k: int):
+    vectors = default_embedder.embed_batch(chunks)
+    token_counts = [estimate_tokens(c) for c in chunks]
+    tokens_per_answer: list[int] = []
+    top_ks: list[int] = []
+    for sentence in questions:
+        query = default_embedder.embed(sentence[: len(sentence) // 2])
+        scores = [sum(q * v for q, v in zip(query, vec)) for vec in vectors]
+        ranked = sorted(range(len(chunks)), key=scores.__getitem__, reverse=True)
+        for k, idx in enumerate(ranked[:max_top_k], start=1):
+            if sentence in chunks[idx]:
+                top_ks.append(k)
+                tokens_per_answer.append(sum(token_counts[i] for i in ranked[:k]))
+                break
+    return tokens_per_answer, top_ks
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--file", help="语料文件，默认使用data目录下的PDF")
+    parser.add_argument("--repeat", type=int, default=20, help="吞吐测试的重复次数")
+    parser.add_argument("--max-top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    text = load_corpus(args.file)
+    questions = sample_questions(text)
+    print(f"语料: {len(text)} 字符, 约 {estimate_tokens(text)} tokens, 问题 {len(questions)} 个")
+    print(
+        f"{'strategy':<10}{'size':>6}{'overlap':>8}{'chunks':>8}"
+        f"{'chunks/s':>12}{'kchar/s':>10}{'hit':>7}{'top_k':>7}{'ctx_tokens':>12}"
+    )
+    for strategy, size, overlap in CASES:
+        chunks, chunks_per_sec, chars_per_sec = measure_throughput(
+            text, strategy, size, overlap, args.repeat
+        )
+        tokens, top_ks = measure_context_tokens(chunks, questions, args.max_top_k)
+        hit_rate = len(top_ks) / len(questions) if questions else 0.0
+        mean_k = statistics.mean(top_ks) if top_ks else float("nan")
+        mean_tokens = statistics.mean(tokens) if tokens else float("nan")
+        print(
+            f"{strategy:<10}{size:>6}{overlap:>8}{len(chunks):>8}"
+            f"{chunks_per_sec:>12.0f}{chars_per_sec / 1000:>10.0f}"
+            f"{hit_rate:>7.0%}{mean_k:>7.2f}{mean_tokens:>12.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
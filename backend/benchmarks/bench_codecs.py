@@ -0,0 +1,95 @@
+"""本地向量库压缩编码：float32、int8与pq的每向量字节数、recall@k与QPS，对比是否精确重排
+
+用法（在backend目录下）：
+    python benchmarks/bench_codecs.py [--size 100000] [--dim 256] [--noise 1.5] [--queries 200] [--k 10]
+        [--pq-subvectors 16 32 64] [--rerank 0 4] [--nprobe 0]
+
+语料与查询为高斯混合的合成向量（与bench_ann.py相同）。每种编码在临时目录中落盘建库，
+有损编码下内存只保留编码，重排时从磁盘读取候选的原始向量。recall@k相对float32精确检索的前k个结果，
+bytes/vec为内存中每个向量编码的字节数（不含IVF索引）。
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+os.environ.setdefault("TESTING", "1")
+
+import numpy as np  # noqa: E402
+
+from app.services.vector_store import LocalVectorStore  # noqa: E402
+
+
+def _clustered(
+    rng: np.random.Generator, n: int, centers: np.ndarray, noise: float
+) -> np.ndarray:
+    data = centers[rng.integers(len(centers), size=n)]
+    data = data + noise * rng.normal(size=data.shape).astype(np.float32)
+    return (data / np.linalg.norm(data, axis=1, keepdims=True)).astype(np.float32)
+
+
+def _build(path: str | None, data: np.ndarray, index_min_rows: int = 1, **kwargs) -> LocalVectorStore:
+    store = LocalVectorStore(path, index_min_rows=index_min_rows, background_rebuild=False, **kwargs)
+    for offset in range(0, len(data), 10_000):
+        batch = data[offset : offset + 10_000]
+        store.add(1, offset, range(len(batch)), batch)
+    return store
+
+
+def _run(store: LocalVectorStore, queries: np.ndarray, k: int, nprobe: int | None):
+    results = []
+    start = time.perf_counter()
+    for q in queries:
+        hits = store.search(q, top_k=k, nprobe=nprobe)
+        results.append({(h["doc_id"], h["chunk_index"]) for h in hits})
+    return results, len(queries) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--clusters", type=int, default=1000)
+    parser.add_argument("--noise", type=float, default=1.5, help="簇内噪声的标准差，越大簇间重叠越多")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, default=0, help="0表示探查全部列表，只衡量编码带来的召回损失")
+    parser.add_argument("--pq-subvectors", type=int, nargs="+", default=[16, 32, 64])
+    parser.add_argument("--rerank", type=int, nargs="+", default=[0, 4])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(args.clusters, args.dim)).astype(np.float32)
+    data = _clustered(rng, args.size, centers, args.noise)
+    queries = _clustered(rng, args.queries, centers, args.noise)
+
+    truth, _ = _run(_build(None, data, index_min_rows=10**9), queries, args.k, None)
+
+    variants = [("float32", 0)] + [("int8", 0)] + [("pq", m) for m in args.pq_subvectors]
+    print(f"语料 {args.size} 条，维度 {args.dim}，nprobe={args.nprobe or 'all'}")
+    print(f"{'codec':>10}{'rerank':>8}{'bytes/vec':>11}{'ratio':>8}{'recall@' + str(args.k):>12}{'QPS':>10}")
+    for codec, m in variants:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = _build(tmp, data, codec=codec, pq_subvectors=m or 32)
+            stats = store.memory_stats()
+            nprobe = args.nprobe or store._index.nlist
+            name = f"pq{stats['bytes_per_vector']}" if codec == "pq" else codec
+            ratio = args.dim * 4 / stats["bytes_per_vector"]
+            for rerank in args.rerank if codec != "float32" else [0]:
+                store.rerank = rerank
+                got, qps = _run(store, queries, args.k, nprobe)
+                recall = np.mean([len(t & g) / len(t) for t, g in zip(truth, got)])
+                print(
+                    f"{name:>10}{rerank:>8}{stats['bytes_per_vector']:>11}{ratio:>8.1f}"
+                    f"{recall:>12.3f}{qps:>10.0f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""对冲请求基准：对比关闭与开启对冲时大模型流式调用的首token延迟分布
+
+用法（在backend目录下）：
+    python benchmarks/bench_hedging.py [--requests 400] [--concurrency 5]
+        [--ttft-ms 200] [--slow-rate 0.05] [--slow-ms 3000] [--hedge-after-ms 600]
+        [--hedge-model qwen-turbo] [--hedge-ttft-ms 150]
+
+启动本地模拟接口（benchmarks/fake_qwen.py），slow-rate比例的请求首token延迟为slow-ms（长尾），
+分别以LLM_HEDGE_AFTER=0与给定阈值调用call_qwen_stream，报告p50/p95/p99首token延迟、
+对冲路径胜出比例与额外发出的请求比例。
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+os.environ.setdefault("TESTING", "1")
+
+from app.config import get_settings  # noqa: E402
+from app.services import rag  # noqa: E402
+from benchmarks.fake_qwen import FakeQwenConfig, FakeQwenServer  # noqa: E402
+
+settings = get_settings()
+
+
+def _percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run(requests: int, concurrency: int) -> list[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    samples: list[float] = []
+
+    async def one() -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            stream = await rag.call_qwen_stream(
+                question="苏州园林", context="", history=[], temperature=0.8, top_p=0.8, max_tokens=32
+            )
+            first = True
+            async for _ in stream:
+                if first:
+                    samples.append(time.perf_counter() - started)
+                    first = False
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return samples
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--ttft-ms", type=float, default=200)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-ms", type=float, default=3000)
+    parser.add_argument("--hedge-after-ms", type=float, default=600)
+    parser.add_argument("--hedge-model", default="qwen-turbo")
+    parser.add_argument("--hedge-ttft-ms", type=float, default=150)
+    args = parser.parse_args()
+
+    config = FakeQwenConfig(
+        ttft=args.ttft_ms / 1000,
+        token_interval=0,
+        tokens=8,
+        model_ttft={args.hedge_model: args.hedge_ttft_ms / 1000},
+        slow_rate=args.slow_rate,
+        slow_ttft=args.slow_ms / 1000,
+        seed=0,
+    )
+    server = FakeQwenServer(config).start()
+    settings.QWEN_API_BASE = server.base_url
+    settings.QWEN_API_KEY = "bench-key"
+    settings.QWEN_MODEL = "qwen-max"
+    settings.LLM_HEDGE_MODEL = args.hedge_model
+
+    print(f"{'mode':<10}{'p50_ms':>10}{'p95_ms':>10}{'p99_ms':>10}{'hedge_win':>11}{'extra_req':>11}")
+    try:
+        for mode, hedge_after in (("off", 0.0), ("hedged", args.hedge_after_ms / 1000)):
+            settings.LLM_HEDGE_AFTER = hedge_after
+            wins_before = sum(
+                v for k, v in rag.LLM_STREAM_WINS._values.items() if k[0] == "hedge"
+            )
+            requests_before = server.app.state.requests
+            samples = await run(args.requests, args.concurrency)
+            wins = sum(v for k, v in rag.LLM_STREAM_WINS._values.items() if k[0] == "hedge")
+            extra = server.app.state.requests - requests_before - args.requests
+            print(
+                f"{mode:<10}"
+                f"{_percentile(samples, 0.5) * 1000:>10.0f}"
+                f"{_percentile(samples, 0.95) * 1000:>10.0f}"
+                f"{_percentile(samples, 0.99) * 1000:>10.0f}"
+                f"{(wins - wins_before) / args.requests:>11.1%}"
+                f"{extra / args.requests:>11.1%}"
+            )
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
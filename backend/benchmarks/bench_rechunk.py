@@ -0,0 +1,89 @@
+"""重新切块基准：对比删除后重新上传与按缓存文本重新切块的耗时
+
+用法（在backend目录下）：
+    python benchmarks/bench_rechunk.py [--file ../data/苏州旅游攻略.pdf] [--sizes 500/100,400/80,500/100]
+
+在临时目录中以TESTING模式运行应用，先以第一组chunk_size/chunk_overlap上传文件，
+随后依次按其余各组参数分别“重新上传”（解析、切块、全部向量化）与“重新切块”，
+报告两者的耗时、块数，以及重新切块复用与重新向量化的块数。
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+WORKDIR = tempfile.mkdtemp(prefix="bench_rechunk_")
+os.environ.setdefault("TESTING", "1")
+os.environ.setdefault("DATA_DIR", os.path.join(WORKDIR, "storage"))
+os.environ.setdefault("WARMUP_ENABLED", "0")
+DEFAULT_FILE = next((Path(BASE_DIR).parent / "data").glob("*.pdf"), None)
+# TESTING模式的SQLite库位于当前目录，切换到临时目录以免覆盖测试库
+os.chdir(WORKDIR)
+
+from httpx import AsyncClient  # noqa: E402
+
+from app.db import init_db  # noqa: E402
+from app.main import app  # noqa: E402
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--file", type=Path, default=DEFAULT_FILE)
+    parser.add_argument("--sizes", default="500/100,400/80,500/100")
+    args = parser.parse_args()
+    sizes = [tuple(int(v) for v in pair.split("/")) for pair in args.sizes.split(",")]
+    content = Path(args.file).resolve().read_bytes()
+
+    await init_db()
+    async with AsyncClient(app=app, base_url="http://bench", timeout=None) as client:
+        await client.post("/api/auth/register", json={"username": "bench", "password": "bench"})
+        login = await client.post(
+            "/api/auth/login",
+            json={"username": "bench", "password": "bench", "captcha_id": "", "captcha_code": ""},
+        )
+        headers = {"Authorization": f"Bearer {login.json()['data']['token']}"}
+        kb_id = (
+            await client.post("/api/knowledge/bases", json={"name": "基准知识库"}, headers=headers)
+        ).json()["data"]["id"]
+
+        async def upload(size: int, overlap: int) -> tuple[float, dict]:
+            started = time.perf_counter()
+            resp = await client.post(
+                f"/api/knowledge/bases/{kb_id}/documents",
+                params={"chunk_size": size, "chunk_overlap": overlap},
+                headers=headers,
+                files={"file": (args.file.name, content, "application/octet-stream")},
+            )
+            resp.raise_for_status()
+            return time.perf_counter() - started, resp.json()["data"]
+
+        _, doc = await upload(*sizes[0])
+        print(f"{'size/overlap':<14}{'reupload_ms':>12}{'rechunk_ms':>12}{'chunks':>8}{'reused':>8}{'embedded':>10}")
+        for size, overlap in sizes[1:]:
+            reupload_seconds, _ = await upload(size, overlap)
+            started = time.perf_counter()
+            resp = await client.post(
+                f"/api/knowledge/documents/{doc['id']}/rechunk",
+                params={"chunk_size": size, "chunk_overlap": overlap},
+                headers=headers,
+            )
+            resp.raise_for_status()
+            rechunk_seconds = time.perf_counter() - started
+            stats = resp.json()["data"]
+            doc = stats["document"]
+            print(
+                f"{f'{size}/{overlap}':<14}{reupload_seconds * 1000:>12.0f}{rechunk_seconds * 1000:>12.0f}"
+                f"{stats['chunks']:>8}{stats['reused']:>8}{stats['embedded']:>10}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,116 @@
+"""知识库快照基准：对比上传文档（解析、切块、向量化）与导入快照的入库吞吐
+
+用法（在backend目录下）：
+    python benchmarks/bench_snapshot.py [--docs 20] [--sections 200] [--batch-size 2000]
+
+在临时目录中以TESTING模式运行应用，上传docs篇各含sections个小节的Markdown文档，
+报告上传耗时与每秒入库块数；再导出快照并以新名称导入，报告快照大小（及与未压缩的
+文本加float32向量之比）、导出耗时与导入的每秒块数。
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+WORKDIR = tempfile.mkdtemp(prefix="bench_snapshot_")
+os.environ.setdefault("TESTING", "1")
+os.environ.setdefault("DATA_DIR", os.path.join(WORKDIR, "storage"))
+os.environ.setdefault("WARMUP_ENABLED", "0")
+# TESTING模式的SQLite库位于当前目录，切换到临时目录以免覆盖测试库
+os.chdir(WORKDIR)
+
+from httpx import AsyncClient  # noqa: E402
+
+from app.config import get_settings  # noqa: E402
+from app.db import init_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.services.embedding import default_embedder  # noqa: E402
+
+settings = get_settings()
+
+_SCENES = ("拙政园", "虎丘", "寒山寺", "平江路", "周庄", "同里", "留园", "狮子林")
+
+
+def make_document(doc: int, sections: int) -> bytes:
+    rng = random.Random(doc)
+    parts = [f"# 苏州导览{doc}\n\n"]
+    for i in range(sections):
+        scene, other = rng.sample(_SCENES, 2)
+        parts.append(
+            f"## {scene}{i}\n\n{scene}建于{rng.randint(900, 1900)}年，门票{rng.randint(20, 90)}元，"
+            f"距{other}约{rng.randint(1, 30)}公里。游客可在附近品尝苏式面点，"
+            f"傍晚沿河散步欣赏古城夜景，推荐停留{rng.randint(1, 5)}小时。\n"
+        )
+    return "".join(parts).encode("utf-8")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--sections", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=settings.SNAPSHOT_BATCH_SIZE)
+    args = parser.parse_args()
+    settings.SNAPSHOT_BATCH_SIZE = args.batch_size
+
+    await init_db()
+    async with AsyncClient(app=app, base_url="http://bench", timeout=None) as client:
+        await client.post("/api/auth/register", json={"username": "bench", "password": "bench"})
+        login = await client.post(
+            "/api/auth/login",
+            json={"username": "bench", "password": "bench", "captcha_id": "", "captcha_code": ""},
+        )
+        headers = {"Authorization": f"Bearer {login.json()['data']['token']}"}
+        kb_id = (
+            await client.post("/api/knowledge/bases", json={"name": "基准知识库"}, headers=headers)
+        ).json()["data"]["id"]
+
+        started = time.perf_counter()
+        for doc in range(args.docs):
+            resp = await client.post(
+                f"/api/knowledge/bases/{kb_id}/documents",
+                params={"chunk_size": 200, "chunk_overlap": 0},
+                headers=headers,
+                files={"file": (f"guide{doc}.md", make_document(doc, args.sections), "text/markdown")},
+            )
+            resp.raise_for_status()
+        upload_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        resp = await client.get(f"/api/knowledge/bases/{kb_id}/snapshot", headers=headers)
+        resp.raise_for_status()
+        export_seconds = time.perf_counter() - started
+        data = resp.content
+
+        resp = await client.post(
+            "/api/knowledge/bases/import",
+            headers=headers,
+            data={"name": "基准知识库副本"},
+            files={"file": ("kb.wlkb", data, "application/octet-stream")},
+        )
+        resp.raise_for_status()
+        stats = resp.json()["data"]
+
+    chunks = stats["chunks"]
+    raw = sum(
+        len(make_document(doc, args.sections)) for doc in range(args.docs)
+    ) + chunks * default_embedder.dim * 4
+    print(f"chunks={chunks} dim={default_embedder.dim} batch_size={args.batch_size}")
+    print(f"snapshot      {len(data) / 2**20:>8.2f} MB  ({len(data) / raw:.0%} of text+float32)")
+    print(f"export        {export_seconds * 1000:>8.0f} ms  {chunks / export_seconds:>10.0f} chunks/s")
+    print(f"upload        {upload_seconds * 1000:>8.0f} ms  {chunks / upload_seconds:>10.0f} chunks/s")
+    print(
+        f"import        {stats['seconds'] * 1000:>8.0f} ms  {stats['chunks_per_sec']:>10.0f} chunks/s"
+        f"  ({upload_seconds / stats['seconds']:.1f}x upload)"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""启动基准：各进程角色导入app.main的耗时与导入后的常驻内存
+
+用法（在backend目录下）：
+    python benchmarks/bench_startup.py [--repeat 5] [--roles all,chat,ingest] [--eager]
+
+每次在新的子进程中以给定WORKER_ROLE导入app.main，报告导入耗时中位数、导入后的RSS中位数，
+以及已被加载的重量级依赖（PyPDF2、python-docx、python-pptx、captcha/PIL、pymilvus）。
+--eager额外给出预先导入这些依赖时的结果，作为延迟导入之前的对照。
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("PyPDF2", "docx", "pptx", "captcha", "PIL", "pymilvus")
+
+_PROBE = """
+import importlib, json, sys, time
+eager = sys.argv[1] == "1"
+heavy = sys.argv[2].split(",")
+started = time.perf_counter()
+if eager:
+    for name in heavy:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            pass
+import app.main
+elapsed = time.perf_counter() - started
+rss = 0
+with open("/proc/self/status") as f:
+    for line in f:
+        if line.startswith("VmRSS:"):
+            rss = int(line.split()[1]) * 1024
+print(json.dumps({
+    "seconds": elapsed,
+    "rss": rss,
+    "heavy": [name for name in heavy if name in sys.modules],
+}))
+"""
+
+
+def probe(role: str, eager: bool) -> dict:
+    env = {**os.environ, "WORKER_ROLE": role, "TESTING": "1", "PYTHONWARNINGS": "ignore"}
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE, "1" if eager else "0", ",".join(HEAVY_MODULES)],
+        cwd=BASE_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--roles", default="all,chat,ingest")
+    parser.add_argument("--eager", action="store_true")
+    args = parser.parse_args()
+
+    modes = [(role, False) for role in args.roles.split(",")]
+    if args.eager:
+        modes.insert(0, ("all", True))
+    print(f"{'role':<14}{'import_ms':>10}{'rss_mb':>9}  heavy_loaded")
+    for role, eager in modes:
+        runs = [probe(role, eager) for _ in range(args.repeat)]
+        seconds = statistics.median(r["seconds"] for r in runs)
+        rss = statistics.median(r["rss"] for r in runs)
+        label = f"{role}(eager)" if eager else role
+        heavy = ",".join(runs[-1]["heavy"]) or "-"
+        print(f"{label:<14}{seconds * 1000:>10.0f}{rss / 2**20:>9.1f}  {heavy}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""本地模拟的通义千问（OpenAI兼容）对话接口，用于压测与调度、对冲等逻辑的测试
+
+用法（在backend目录下）：
+    python benchmarks/fake_qwen.py [--port 18080] [--ttft-ms 300] [--token-ms 20]
+        [--tokens 80] [--error-rate 0] [--rate-limit-rate 0] [--slow-rate 0 --slow-ms 3000]
+
+提供 POST /v1/chat/completions，支持stream为真（SSE逐token输出）与为假（一次性JSON）。
+首token延迟、逐token间隔、回答长度以及返回500/429的比例均可配置；
+请求体中的model会原样写入响应，可通过 --model-delay qwen-turbo=50 为指定模型单独设置首token延迟；
+--slow-rate 比例的请求首token延迟改为 --slow-ms，用于模拟长尾延迟。
+将后端的 QWEN_API_BASE 指向 http://127.0.0.1:<port>/v1 并设置任意 QWEN_API_KEY 即可使用。
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+_ANSWER_TOKENS = "苏州园林以拙政园、留园为代表，建议避开节假日高峰，提前在线预约门票。"
+
+
+@dataclass
+class FakeQwenConfig:
+    ttft: float = 0.3
+    token_interval: float = 0.02
+    tokens: int = 80
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    model_ttft: dict[str, float] = field(default_factory=dict)
+    # slow_rate比例的请求首token延迟为slow_ttft（长尾）
+    slow_rate: float = 0.0
+    slow_ttft: float = 0.0
+    seed: int | None = None
+
+
+def create_fake_qwen_app(config: FakeQwenConfig) -> FastAPI:
+    """创建模拟接口应用；app.state.requests记录收到的请求数"""
+    app = FastAPI(title="fake-qwen")
+    app.state.requests = 0
+    rng = random.Random(config.seed)
+
+    def _tokens() -> list[str]:
+        text = _ANSWER_TOKENS * (config.tokens // len(_ANSWER_TOKENS) + 1)
+        return list(text[: config.tokens])
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        app.state.requests += 1
+        body = await request.json()
+        model = body.get("model", "qwen-max")
+        roll = rng.random()
+        if roll < config.rate_limit_rate:
+            return JSONResponse({"error": {"message": "rate limited"}}, status_code=429)
+        if roll < config.rate_limit_rate + config.error_rate:
+            return JSONResponse({"error": {"message": "internal error"}}, status_code=500)
+
+        ttft = config.model_ttft.get(model, config.ttft)
+        if config.slow_rate and rng.random() < config.slow_rate:
+            ttft = max(ttft, config.slow_ttft)
+        tokens = _tokens()
+        created = int(time.time())
+
+        if not body.get("stream"):
+            await asyncio.sleep(ttft + config.token_interval * len(tokens))
+            return {
+                "id": "fake",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "".join(tokens)},
+                        "finish_reason": "stop",
+                    }
+                ],
+            }
+
+        async def events():
+            await asyncio.sleep(ttft)
+            for token in tokens:
+                chunk = {
+                    "id": "fake",
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": token}}],
+                }
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                await asyncio.sleep(config.token_interval)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+class FakeQwenServer:
+    """在后台线程中运行模拟接口，便于在压测脚本或测试中启停"""
+
+    def __init__(self, config: FakeQwenConfig, port: int = 0, host: str = "127.0.0.1"):
+        self.app = create_fake_qwen_app(config)
+        self._server = uvicorn.Server(
+            uvicorn.Config(self.app, host=host, port=port, log_level="warning")
+        )
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.servers[0].sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeQwenServer":
+        self._thread.start()
+        while not self._server.started:
+            if not self._thread.is_alive():
+                raise RuntimeError("模拟接口启动失败")
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        self._server.should_exit = True
+        self._thread.join()
+
+
+def _parse_model_delay(values: list[str]) -> dict[str, float]:
+    result: dict[str, float] = {}
+    for value in values:
+        model, _, ms = value.partition("=")
+        result[model] = float(ms) / 1000
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--ttft-ms", type=float, default=300)
+    parser.add_argument("--token-ms", type=float, default=20)
+    parser.add_argument("--tokens", type=int, default=80)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--model-delay", action="append", default=[])
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-ms", type=float, default=3000)
+    args = parser.parse_args()
+
+    config = FakeQwenConfig(
+        ttft=args.ttft_ms / 1000,
+        token_interval=args.token_ms / 1000,
+        tokens=args.tokens,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        model_ttft=_parse_model_delay(args.model_delay),
+        slow_rate=args.slow_rate,
+        slow_ttft=args.slow_ms / 1000,
+    )
+    uvicorn.run(create_fake_qwen_app(config), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
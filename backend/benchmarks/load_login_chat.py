@@ -0,0 +1,127 @@
+"""登录压测对流式对话的影响：并发登录的同时进行对话，统计对话耗时与事件循环停顿
+
+用法（在backend目录下）：
+    python benchmarks/load_login_chat.py [--logins 200] [--login-concurrency 50] [--chats 20]
+
+以TESTING模式在进程内运行应用，分别以两种方式各跑一轮：
+- sync：在事件循环中直接计算密码哈希（改造前的行为）
+- pool：经哈希线程池与并发上限计算（当前实现）
+事件循环停顿由一个每1ms唤醒一次的探针协程测得，取其最大超时；
+对话耗时为在登录压测期间发起的流式对话从请求到收到[DONE]的时间。
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+os.environ.setdefault("TESTING", "1")
+
+from httpx import AsyncClient  # noqa: E402
+
+from app import auth  # noqa: E402
+from app.db import init_db  # noqa: E402
+from app.main import app  # noqa: E402
+from app.routers import auth as auth_router  # noqa: E402
+
+
+async def _sync_verify(plain: str, hashed: str) -> bool:
+    return auth.verify_password(plain, hashed)
+
+
+async def _login(client: AsyncClient, username: str, password: str) -> str:
+    r = await client.post(
+        "/api/auth/login",
+        json={
+            "username": username,
+            "password": password,
+            "captcha_id": "",
+            "captcha_code": "",
+        },
+    )
+    return r.json()["data"]["token"]
+
+
+async def _probe_loop_lag(stop: asyncio.Event, lags: list[float]) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - start - 0.001)
+
+
+async def run(mode: str, args: argparse.Namespace) -> dict:
+    auth_router.verify_password_async = (
+        _sync_verify if mode == "sync" else auth.verify_password_async
+    )
+    async with AsyncClient(app=app, base_url="http://bench", timeout=120) as client:
+        username, password = f"load_{mode}", "load_password"
+        await client.post(
+            "/api/auth/register",
+            json={"username": username, "password": password},
+        )
+        token = await _login(client, username, password)
+        headers = {"Authorization": f"Bearer {token}"}
+        r = await client.post("/api/chat/sessions", json={"name": "压测"}, headers=headers)
+        session_id = r.json()["data"]["id"]
+
+        stop = asyncio.Event()
+        lags: list[float] = []
+        probe = asyncio.create_task(_probe_loop_lag(stop, lags))
+
+        login_slots = asyncio.Semaphore(args.login_concurrency)
+
+        async def one_login() -> None:
+            async with login_slots:
+                await _login(client, username, password)
+
+        async def one_chat() -> float:
+            start = time.perf_counter()
+            await client.post(
+                "/api/chat/stream",
+                json={"session_id": session_id, "kb_ids": [], "question": "苏州有哪些园林"},
+                headers=headers,
+            )
+            return time.perf_counter() - start
+
+        logins = asyncio.gather(*(one_login() for _ in range(args.logins)))
+        await asyncio.sleep(0.05)
+        chat_latencies = []
+        for _ in range(args.chats):
+            chat_latencies.append(await one_chat())
+        await logins
+        stop.set()
+        await probe
+
+    chat_latencies.sort()
+    return {
+        "chat_p50_ms": statistics.median(chat_latencies) * 1000,
+        "chat_max_ms": chat_latencies[-1] * 1000,
+        "loop_lag_max_ms": max(lags) * 1000,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--login-concurrency", type=int, default=50)
+    parser.add_argument("--chats", type=int, default=20)
+    args = parser.parse_args()
+
+    await init_db()
+    print(f"{'mode':<6}{'chat_p50_ms':>13}{'chat_max_ms':>13}{'loop_lag_max_ms':>17}")
+    for mode in ("sync", "pool"):
+        row = await run(mode, args)
+        print(
+            f"{mode:<6}{row['chat_p50_ms']:>13.1f}{row['chat_max_ms']:>13.1f}"
+            f"{row['loop_lag_max_ms']:>17.1f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
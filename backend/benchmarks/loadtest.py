@@ -0,0 +1,447 @@
+"""RAG压测：以TESTING模式启动后端与本地模拟大模型，灌入合成知识库并并发驱动上传与流式对话
+
+用法（在backend目录下）：
+    python benchmarks/loadtest.py run [--kbs 2] [--docs-per-kb 10] [--sessions 20]
+        [--requests 5] [--ttft-ms 300] [--output results/base.json]
+    python benchmarks/loadtest.py compare results/base.json results/new.json
+
+run 在临时目录中启动一个uvicorn后端子进程（TESTING=1，SQLite测试库、内存向量库），
+并在本进程内启动模拟的通义千问接口（benchmarks/fake_qwen.py），后端经QWEN_API_BASE调用它。
+流程：注册用户 → 建知识库并并发上传合成Markdown文档（上传阶段）→ 多个会话并发提问（对话阶段，
+可用 --chat-uploads 在对话期间同时上传）。报告吞吐、首token时间（TTFT）、p50/p95/p99延迟、
+后端峰值RSS以及/api/metrics中各阶段的平均耗时，--output 写出JSON结果；
+compare 对比两份结果并输出各指标的变化比例，用于提交前后对比。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+import httpx  # noqa: E402
+
+from benchmarks.fake_qwen import FakeQwenConfig, FakeQwenServer  # noqa: E402
+
+_PLACES = ["拙政园", "留园", "西湖", "灵隐寺", "黄山", "宏村", "平遥古城", "鼓浪屿", "乌镇", "周庄"]
+_TOPICS = ["门票", "交通", "开放时间", "美食", "住宿", "最佳季节", "游览路线", "注意事项"]
+_PHRASES = [
+    "建议提前在线预约，节假日客流较大。",
+    "可乘坐地铁或旅游专线到达，自驾需提前查询停车位。",
+    "园内步行约需两到三小时，适合慢游。",
+    "周边有多家特色餐馆，推荐品尝当地小吃。",
+    "景区提供讲解服务，可在入口处租借导览设备。",
+    "雨季路面湿滑，请注意安全并携带雨具。",
+    "夜游项目需单独购票，开放时间以当日公告为准。",
+]
+_FALLBACK_ANSWER = "对话服务暂时不可用"
+
+
+def _synthetic_document(rng: random.Random, paragraphs: int) -> str:
+    place = rng.choice(_PLACES)
+    lines = [f"# {place}旅游指南", ""]
+    for topic in rng.sample(_TOPICS, k=min(len(_TOPICS), max(1, paragraphs // 4))):
+        lines.extend([f"## {topic}", ""])
+        for _ in range(max(1, paragraphs // len(_TOPICS))):
+            sentences = rng.choices(_PHRASES, k=rng.randint(3, 6))
+            lines.extend([f"{place}{topic}：" + "".join(sentences), ""])
+    return "\n".join(lines)
+
+
+def _percentiles(samples: list[float]) -> dict[str, float]:
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {"p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99), "max": ordered[-1] * 1000}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+class BackendProcess:
+    """在临时工作目录中以子进程运行后端，隔离测试库与本地数据目录"""
+
+    def __init__(self, qwen_base: str):
+        self.workdir = tempfile.mkdtemp(prefix="loadtest_")
+        self.port = _free_port()
+        self.env = {
+            **os.environ,
+            "PYTHONPATH": BASE_DIR,
+            "TESTING": "1",
+            "QWEN_API_BASE": qwen_base,
+            "QWEN_API_KEY": "loadtest",
+            "DATA_DIR": os.path.join(self.workdir, "storage"),
+            "METRICS_ENABLED": "1",
+        }
+        self.proc: subprocess.Popen | None = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> None:
+        subprocess.run(
+            [sys.executable, "-c", "import asyncio; from app.db import init_db; asyncio.run(init_db())"],
+            cwd=self.workdir,
+            env=self.env,
+            check=True,
+        )
+        self.proc = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "app.main:app",
+                "--host", "127.0.0.1", "--port", str(self.port),
+                "--log-level", "warning",
+            ],
+            cwd=self.workdir,
+            env=self.env,
+        )  # fmt: skip
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError("后端进程启动失败")
+            try:
+                if httpx.get(f"{self.base_url}/api/metrics", timeout=1).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.1)
+        raise RuntimeError("等待后端启动超时")
+
+    def peak_rss_mb(self) -> float | None:
+        """读取子进程的峰值RSS（Linux的VmHWM），进程退出后退回getrusage"""
+        if self.proc is not None and self.proc.poll() is None:
+            try:
+                with open(f"/proc/{self.proc.pid}/status", encoding="ascii") as f:
+                    for line in f:
+                        if line.startswith("VmHWM:"):
+                            return int(line.split()[1]) / 1024
+            except OSError:
+                pass
+            return None
+        maxrss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        return maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+    def stop(self) -> None:
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.terminate()
+            self.proc.wait(timeout=30)
+
+
+async def _register_and_login(client: httpx.AsyncClient, username: str) -> dict[str, str]:
+    password = "loadtest_password"
+    await client.post("/api/auth/register", json={"username": username, "password": password})
+    r = await client.post(
+        "/api/auth/login",
+        json={"username": username, "password": password, "captcha_id": "", "captcha_code": ""},
+    )
+    r.raise_for_status()
+    return {"Authorization": f"Bearer {r.json()['data']['token']}"}
+
+
+async def _upload(
+    client: httpx.AsyncClient,
+    headers: dict[str, str],
+    kb_id: int,
+    name: str,
+    text: str,
+    args: argparse.Namespace,
+) -> tuple[float, bool]:
+    start = time.perf_counter()
+    r = await client.post(
+        f"/api/knowledge/bases/{kb_id}/documents",
+        params={
+            "chunk_strategy": args.chunk_strategy,
+            "use_hybrid": str(args.hybrid).lower(),
+        },
+        files={"file": (name, text.encode("utf-8"), "text/markdown")},
+        headers=headers,
+    )
+    ok = r.status_code == 200 and r.json().get("code") == 0
+    return time.perf_counter() - start, ok
+
+
+async def _chat(
+    client: httpx.AsyncClient,
+    headers: dict[str, str],
+    session_id: int,
+    kb_ids: list[int],
+    question: str,
+) -> dict:
+    start = time.perf_counter()
+    ttft = None
+    done = degraded = False
+    async with client.stream(
+        "POST",
+        "/api/chat/stream",
+        json={"session_id": session_id, "kb_ids": kb_ids, "question": question},
+        headers=headers,
+    ) as resp:
+        if resp.status_code != 200:
+            await resp.aread()
+            return {"ok": False, "latency": time.perf_counter() - start, "ttft": None}
+        async for line in resp.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            data = line[len("data: "):]
+            if data == "[DONE]":
+                done = True
+                break
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            if data.startswith(_FALLBACK_ANSWER):
+                degraded = True
+    return {
+        "ok": done,
+        "degraded": degraded,
+        "latency": time.perf_counter() - start,
+        "ttft": ttft,
+    }
+
+
+def _stage_means(metrics_text: str) -> dict[str, float]:
+    """从Prometheus文本中计算各阶段平均耗时（毫秒）"""
+    sums: dict[str, float] = {}
+    counts: dict[str, float] = {}
+    for line in metrics_text.splitlines():
+        if not line.startswith("rag_stage_duration_seconds_"):
+            continue
+        name, value = line.rsplit(" ", 1)
+        kind, _, labels = name.partition("{")
+        labels = dict(part.split("=", 1) for part in labels.rstrip("}").split(","))
+        key = ".".join(labels[name].strip('"') for name in ("pipeline", "stage"))
+        if kind.endswith("_sum"):
+            sums[key] = float(value)
+        elif kind.endswith("_count"):
+            counts[key] = float(value)
+    return {k: sums[k] / counts[k] * 1000 for k in sorted(sums) if counts.get(k)}
+
+
+async def _drive(backend: BackendProcess, args: argparse.Namespace) -> dict:
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.sessions + args.upload_concurrency + 8)
+    async with httpx.AsyncClient(
+        base_url=backend.base_url, timeout=args.timeout, limits=limits
+    ) as client:
+        users = [
+            await _register_and_login(client, f"loadtest_{i}")
+            for i in range(max(1, min(args.users, args.sessions)))
+        ]
+
+        kb_ids: list[int] = []
+        for i in range(args.kbs):
+            r = await client.post(
+                "/api/knowledge/bases",
+                json={"name": f"压测知识库{i}"},
+                headers=users[0],
+            )
+            kb_ids.append(r.json()["data"]["id"])
+
+        upload_slots = asyncio.Semaphore(args.upload_concurrency)
+
+        async def one_upload(kb_id: int, n: int) -> tuple[float, bool]:
+            text = _synthetic_document(rng, args.paragraphs)
+            async with upload_slots:
+                return await _upload(client, users[0], kb_id, f"doc_{kb_id}_{n}.md", text, args)
+
+        upload_start = time.perf_counter()
+        uploads = await asyncio.gather(
+            *(one_upload(kb_id, n) for kb_id in kb_ids for n in range(args.docs_per_kb))
+        )
+        upload_elapsed = time.perf_counter() - upload_start
+        seeded = len(uploads)
+
+        async def one_session(index: int) -> list[dict]:
+            headers = users[index % len(users)]
+            r = await client.post(
+                "/api/chat/sessions",
+                json={"name": f"压测会话{index}"},
+                headers=headers,
+            )
+            session_id = r.json()["data"]["id"]
+            session_rng = random.Random(args.seed + index)
+            results = []
+            for _ in range(args.requests):
+                question = (
+                    f"{session_rng.choice(_PLACES)}的{session_rng.choice(_TOPICS)}有什么建议？"
+                )
+                results.append(await _chat(client, headers, session_id, kb_ids, question))
+            return results
+
+        chat_start = time.perf_counter()
+        background_uploads = [
+            asyncio.create_task(one_upload(kb_ids[n % len(kb_ids)], args.docs_per_kb + n))
+            for n in range(args.chat_uploads if kb_ids else 0)
+        ]
+        sessions = await asyncio.gather(*(one_session(i) for i in range(args.sessions)))
+        chat_elapsed = time.perf_counter() - chat_start
+        uploads.extend(await asyncio.gather(*background_uploads))
+
+        metrics_text = (await client.get("/api/metrics")).text
+
+    chats = [c for s in sessions for c in s]
+    return {
+        "upload": {
+            "documents": len(uploads),
+            "errors": sum(1 for _, ok in uploads if not ok),
+            "throughput_docs_per_s": seeded / upload_elapsed if upload_elapsed else 0.0,
+            "latency_ms": _percentiles([t for t, _ in uploads]),
+        },
+        "chat": {
+            "requests": len(chats),
+            "errors": sum(1 for c in chats if not c["ok"]),
+            "degraded": sum(1 for c in chats if c.get("degraded")),
+            "throughput_rps": len(chats) / chat_elapsed if chat_elapsed else 0.0,
+            "ttft_ms": _percentiles([c["ttft"] for c in chats if c["ttft"] is not None]),
+            "latency_ms": _percentiles([c["latency"] for c in chats]),
+        },
+        "stages_mean_ms": _stage_means(metrics_text),
+    }
+
+
+def run(args: argparse.Namespace) -> dict:
+    fake = FakeQwenServer(
+        FakeQwenConfig(
+            ttft=args.ttft_ms / 1000,
+            token_interval=args.token_ms / 1000,
+            tokens=args.tokens,
+            error_rate=args.error_rate,
+            seed=args.seed,
+        )
+    ).start()
+    backend = BackendProcess(fake.base_url)
+    try:
+        backend.start()
+        results = asyncio.run(_drive(backend, args))
+        peak_rss = backend.peak_rss_mb()
+    finally:
+        backend.stop()
+        fake.stop()
+    if peak_rss is None:
+        peak_rss = backend.peak_rss_mb()
+
+    results["server"] = {"peak_rss_mb": peak_rss}
+    results["meta"] = {
+        "label": args.label,
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "params": {k: v for k, v in vars(args).items() if k not in {"command", "output", "label"}},
+    }
+    return results
+
+
+def _flatten(data: dict, prefix: str = "") -> dict[str, float]:
+    flat: dict[str, float] = {}
+    for key, value in data.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{path}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = float(value)
+    return flat
+
+
+def _print_results(results: dict) -> None:
+    for key, value in _flatten({k: v for k, v in results.items() if k != "meta"}).items():
+        print(f"{key:<40}{value:>12.1f}")
+
+
+def compare(base_path: str, new_path: str) -> None:
+    with open(base_path, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"base: {base['meta'].get('label') or base['meta'].get('commit')}  "
+          f"new: {new['meta'].get('label') or new['meta'].get('commit')}")  # fmt: skip
+    print(f"{'metric':<40}{'base':>12}{'new':>12}{'change':>10}")
+    base_flat = _flatten({k: v for k, v in base.items() if k != "meta"})
+    new_flat = _flatten({k: v for k, v in new.items() if k != "meta"})
+    for key in sorted(base_flat.keys() | new_flat.keys()):
+        old, cur = base_flat.get(key), new_flat.get(key)
+        if old is None or cur is None:
+            change = "n/a"
+        elif old == 0:
+            change = "0.0%" if cur == 0 else "inf"
+        else:
+            change = f"{(cur - old) / old * 100:+.1f}%"
+        fmt = lambda v: "-" if v is None else f"{v:.1f}"  # noqa: E731
+        print(f"{key:<40}{fmt(old):>12}{fmt(cur):>12}{change:>10}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="执行一轮压测")
+    run_parser.add_argument("--kbs", type=int, default=2)
+    run_parser.add_argument("--docs-per-kb", type=int, default=10)
+    run_parser.add_argument("--paragraphs", type=int, default=40, help="每篇合成文档的段落数")
+    run_parser.add_argument("--chunk-strategy", default="sentence")
+    run_parser.add_argument("--hybrid", action="store_true", help="上传时写入关键词索引")
+    run_parser.add_argument("--upload-concurrency", type=int, default=4)
+    run_parser.add_argument("--users", type=int, default=5)
+    run_parser.add_argument("--sessions", type=int, default=20, help="并发会话数")
+    run_parser.add_argument("--requests", type=int, default=5, help="每个会话的提问次数")
+    run_parser.add_argument("--chat-uploads", type=int, default=0, help="对话阶段同时上传的文档数")
+    run_parser.add_argument("--ttft-ms", type=float, default=300)
+    run_parser.add_argument("--token-ms", type=float, default=20)
+    run_parser.add_argument("--tokens", type=int, default=80)
+    run_parser.add_argument("--error-rate", type=float, default=0.0)
+    run_parser.add_argument("--timeout", type=float, default=120)
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--label", default=None)
+    run_parser.add_argument("--output", default=None, help="结果JSON的写出路径")
+
+    compare_parser = sub.add_parser("compare", help="对比两份压测结果")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        compare(args.base, args.new)
+        return
+
+    results = run(args)
+    _print_results(results)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
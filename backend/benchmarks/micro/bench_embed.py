@@ -0,0 +1,35 @@
+"""SimpleChineseEmbedder的单条与批量向量化耗时"""
+
+import pytest
+
+from app.services.embedding import default_embedder
+
+_SAMPLE = "苏州园林以拙政园、留园为代表，建议避开节假日高峰，提前在线预约门票。"
+
+
+def _text(length: int) -> str:
+    return (_SAMPLE * (length // len(_SAMPLE) + 1))[:length]
+
+
+@pytest.mark.parametrize(
+    ("length", "budget_ms"),
+    [
+        pytest.param(50, 1, id="50"),
+        pytest.param(500, 10, id="500"),
+        pytest.param(5000, 100, id="5000"),
+    ],
+)
+def bench_embed(bench, length, budget_ms):
+    text = _text(length)
+    vec = bench(default_embedder.embed, text, budget_ms=budget_ms)
+    assert len(vec) == default_embedder.dim
+
+
+@pytest.mark.parametrize(
+    ("batch", "budget_ms"),
+    [pytest.param(10, 20, id="10"), pytest.param(100, 200, id="100")],
+)
+def bench_embed_batch(bench, batch, budget_ms):
+    texts = [_text(500)] * batch
+    vecs = bench(default_embedder.embed_batch, texts, budget_ms=budget_ms)
+    assert len(vecs) == batch
@@ -0,0 +1,35 @@
+"""本地向量检索（非Milvus路径）随语料规模、top_k与知识库过滤数量的耗时变化"""
+
+import random
+
+import pytest
+
+from app.services.milvus_client import search_embeddings
+
+_N_KBS = 20
+
+
+def _query(dim: int = 256) -> list[float]:
+    rng = random.Random(1)
+    vec = [rng.gauss(0.0, 1.0) for _ in range(dim)]
+    norm = sum(v * v for v in vec) ** 0.5
+    return [v / norm for v in vec]
+
+
+# 语料规模放在最外层参数，同一规模的用例复用同一份语料
+@pytest.mark.parametrize("filter_kbs", [0, 1, 5], ids=lambda n: f"kbs{n}")
+@pytest.mark.parametrize("top_k", [5, 50], ids=lambda k: f"top{k}")
+@pytest.mark.parametrize(
+    ("size", "budget_ms"),
+    [
+        pytest.param(1_000, 5, id="1k"),
+        pytest.param(10_000, 20, id="10k"),
+        pytest.param(100_000, 50, id="100k", marks=pytest.mark.large),
+        pytest.param(1_000_000, 200, id="1m", marks=pytest.mark.large),
+    ],
+)
+def bench_search_embeddings(bench, vector_corpus, size, budget_ms, top_k, filter_kbs):
+    vector_corpus(size, n_kbs=_N_KBS)
+    kb_ids = list(range(1, filter_kbs + 1))
+    hits = bench(search_embeddings, kb_ids, _query(), top_k, budget_ms=budget_ms)
+    assert len(hits) == min(top_k, size if not kb_ids else size * filter_kbs // _N_KBS)
@@ -0,0 +1,26 @@
+"""固定长度与按句切块在不同文本长度下的耗时"""
+
+import pytest
+
+from app.services.file_parser import split_text
+
+_PARAGRAPH = (
+    "苏州园林以拙政园、留园为代表。建议避开节假日高峰，提前在线预约门票！"
+    "园内步行约需两到三小时，适合慢游？周边有多家特色餐馆。\n\n"
+)
+
+
+@pytest.mark.parametrize("strategy", ["fixed", "sentence"])
+@pytest.mark.parametrize(
+    ("length", "budget_ms"),
+    [
+        pytest.param(1_000, 2, id="1k"),
+        pytest.param(10_000, 20, id="10k"),
+        pytest.param(100_000, 200, id="100k"),
+        pytest.param(1_000_000, 2_000, id="1m", marks=pytest.mark.large),
+    ],
+)
+def bench_split_text(bench, strategy, length, budget_ms):
+    text = (_PARAGRAPH * (length // len(_PARAGRAPH) + 1))[:length]
+    chunks = bench(split_text, text, 500, 100, strategy, budget_ms=budget_ms)
+    assert chunks
@@ -0,0 +1,237 @@
+"""微基准套件的公共设施：bench计时夹具、基线对比与剖析输出
+
+运行（在backend目录下）：
+    python -m pytest benchmarks/micro [--bench-large] [--bench-json out.json]
+        [--bench-compare base.json] [--bench-profile prof/]
+
+bench(fn, *args, **kwargs) 先预热一次，再按 --bench-min-time 自动确定每轮调用次数，
+共计时 --bench-rounds 轮，记录每次调用耗时的中位数与最小值。回归门槛有两种：
+用例内的 budget_ms 对中位数的绝对上限，以及与 --bench-compare 基线相比最小值的
+相对退化上限（--bench-max-regression，默认50%；最小值受调度噪声影响最小）。
+超出任一门槛则该用例失败。
+"""
+
+import cProfile
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+os.environ.setdefault("TESTING", "1")
+
+from app.services import milvus_client  # noqa: E402
+from app.services.vector_store import local_store  # noqa: E402
+
+_results_key = pytest.StashKey[dict]()
+_baseline_key = pytest.StashKey[dict]()
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("bench", "微基准")
+    group.addoption("--bench-min-time", type=float, default=0.2, help="每个用例的计时总时长下限（秒）")
+    group.addoption("--bench-rounds", type=int, default=5, help="计时轮数")
+    group.addoption("--bench-large", action="store_true", help="运行large标记的大规模用例")
+    group.addoption("--bench-json", default=None, help="结果JSON的写出路径")
+    group.addoption("--bench-compare", default=None, help="作为基线的结果JSON")
+    group.addoption("--bench-max-regression", type=float, default=0.5, help="相对基线允许的最大退化比例")
+    group.addoption("--bench-profile", default=None, help="剖析结果输出目录，每个用例一个文件")
+    group.addoption(
+        "--bench-profiler",
+        choices=("cprofile", "pyinstrument"),
+        default="cprofile",
+        help="cprofile输出.prof，pyinstrument输出.html（需另行安装）",
+    )  # fmt: skip
+
+
+def pytest_configure(config):
+    config.stash[_results_key] = {}
+    baseline = {}
+    path = config.getoption("--bench-compare")
+    if path:
+        with open(path, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    config.stash[_baseline_key] = baseline
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--bench-large"):
+        return
+    skip = pytest.mark.skip(reason="大规模用例，使用 --bench-large 运行")
+    for item in items:
+        if "large" in item.keywords:
+            item.add_marker(skip)
+
+
+def _profile_path(directory: str, nodeid: str, suffix: str) -> str:
+    name = re.sub(r"[^\w.-]+", "_", nodeid).strip("_")
+    return os.path.join(directory, f"{name}.{suffix}")
+
+
+class Bench:
+    def __init__(self, request):
+        self._config = request.config
+        self._nodeid = request.node.nodeid
+
+    def _profile(self, fn, args, kwargs, number: int) -> None:
+        directory = self._config.getoption("--bench-profile")
+        os.makedirs(directory, exist_ok=True)
+        if self._config.getoption("--bench-profiler") == "pyinstrument":
+            from pyinstrument import Profiler
+
+            profiler = Profiler()
+            profiler.start()
+            for _ in range(number):
+                fn(*args, **kwargs)
+            profiler.stop()
+            with open(_profile_path(directory, self._nodeid, "html"), "w", encoding="utf-8") as f:
+                f.write(profiler.output_html())
+            return
+        profiler = cProfile.Profile()
+        profiler.enable()
+        for _ in range(number):
+            fn(*args, **kwargs)
+        profiler.disable()
+        profiler.dump_stats(_profile_path(directory, self._nodeid, "prof"))
+
+    def __call__(self, fn, *args, budget_ms: float | None = None, **kwargs):
+        result = fn(*args, **kwargs)
+
+        rounds = self._config.getoption("--bench-rounds")
+        per_round = self._config.getoption("--bench-min-time") / rounds
+        start = time.perf_counter()
+        fn(*args, **kwargs)
+        single = max(time.perf_counter() - start, 1e-9)
+        number = max(1, int(per_round / single))
+
+        samples: list[float] = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(number):
+                fn(*args, **kwargs)
+            samples.append((time.perf_counter() - start) / number)
+
+        median = statistics.median(samples)
+        stats = {
+            "median_ms": median * 1000,
+            "min_ms": min(samples) * 1000,
+            "mean_ms": statistics.fmean(samples) * 1000,
+            "stdev_ms": statistics.pstdev(samples) * 1000,
+            "ops_per_s": 1 / median,
+            "calls_per_round": number,
+            "rounds": rounds,
+        }
+        self._config.stash[_results_key][self._nodeid] = stats
+
+        if self._config.getoption("--bench-profile"):
+            self._profile(fn, args, kwargs, number)
+
+        if budget_ms is not None and stats["median_ms"] > budget_ms:
+            pytest.fail(f"中位耗时 {stats['median_ms']:.3f}ms 超出上限 {budget_ms}ms")
+        base = self._config.stash[_baseline_key].get(self._nodeid)
+        if base is not None:
+            limit = base["min_ms"] * (1 + self._config.getoption("--bench-max-regression"))
+            if stats["min_ms"] > limit:
+                pytest.fail(
+                    f"最小耗时 {stats['min_ms']:.3f}ms 相对基线 {base['min_ms']:.3f}ms 退化超出门槛"
+                )
+        return result
+
+
+@pytest.fixture
+def bench(request) -> Bench:
+    """计时夹具：bench(fn, *args, budget_ms=None, **kwargs)，返回fn的结果"""
+    return Bench(request)
+
+
+_corpus_key: tuple | None = None
+
+
+@pytest.fixture
+def vector_corpus():
+    """构建本地向量库语料：vector_corpus(size, n_kbs, dim)，相同参数时复用上次构建的结果
+
+    语料达到LOCAL_ANN_MIN_ROWS后本地向量库会自动建立IVF索引，构建完成后等待后台训练结束。
+    """
+
+    def build(size: int, n_kbs: int = 20, dim: int = 256, seed: int = 0) -> None:
+        global _corpus_key
+        key = (size, n_kbs, dim, seed)
+        if _corpus_key == key:
+            return
+        local_store.clear()
+        rng = np.random.default_rng(seed)
+        per_kb = size // n_kbs
+        for kb_id in range(1, n_kbs + 1):
+            count = per_kb + (1 if kb_id <= size % n_kbs else 0)
+            for start in range(0, count, 10_000):
+                batch = rng.normal(size=(min(10_000, count - start), dim)).astype(np.float32)
+                batch /= np.linalg.norm(batch, axis=1, keepdims=True)
+                milvus_client.insert_embeddings(
+                    kb_id=kb_id,
+                    doc_id=kb_id * 1_000_000 + start // 10_000,
+                    chunk_indices=range(len(batch)),
+                    embeddings=batch,
+                )
+        local_store.wait_for_rebuild()
+        _corpus_key = key
+
+    return build
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    results = config.stash[_results_key]
+    if not results:
+        return
+    baseline = config.stash[_baseline_key]
+    terminalreporter.section("微基准结果")
+    terminalreporter.write_line(
+        f"{'case':<60}{'median_ms':>12}{'min_ms':>12}{'ops/s':>12}{'vs base':>10}"
+    )
+    for nodeid, stats in results.items():
+        base = baseline.get(nodeid)
+        change = f"{(stats['min_ms'] / base['min_ms'] - 1) * 100:+.1f}%" if base else "-"
+        terminalreporter.write_line(
+            f"{nodeid:<60}{stats['median_ms']:>12.4f}{stats['min_ms']:>12.4f}"
+            f"{stats['ops_per_s']:>12.1f}{change:>10}"
+        )
+
+    path = config.getoption("--bench-json")
+    if path:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        payload = {
+            "meta": {
+                "commit": _git_commit(),
+                "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+            },
+            "results": results,
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+        terminalreporter.write_line(f"结果已写入 {path}")
@@ -0,0 +1,114 @@
+"""向量分区迁移：把旧版共用一个集合（未分区）的向量按知识库迁移到各自的分区
+
+用法（在backend目录下，迁移期间停止写入）：
+    python scripts/migrate_vector_partitions.py [--batch-size 1000] [--drop-orphans] [--dry-run]
+
+Milvus：逐批读取集合_default分区中的向量，按kb_id写入kb_{id}分区后从_default删除，
+中途中断可重复执行，已迁移的向量不会重复写入。--drop-orphans 直接删除所属知识库已不存在的向量。
+每个知识库一个分区，知识库数量不能超过Milvus单集合的分区数上限（rootCoord.maxPartitionNum，
+默认4096，含_default分区），迁移前确认现有知识库数量在上限以内。
+未连接Milvus时迁移本地向量库：DATA_DIR/vector_store下的旧版文件拆分到各知识库分段
+（服务启动后首次加载时也会自动执行）。
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from collections import defaultdict
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from sqlalchemy import select  # noqa: E402
+
+from app.db import AsyncSessionLocal  # noqa: E402
+from app.models import KnowledgeBase  # noqa: E402
+from app.services import milvus_client  # noqa: E402
+from app.services.vector_store import local_store  # noqa: E402
+
+
+async def _existing_kb_ids() -> set[int]:
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(KnowledgeBase.id))
+        return set(result.scalars().all())
+
+
+def migrate_milvus(batch_size: int, live_kb_ids: set[int] | None, dry_run: bool) -> dict[int, int]:
+    """迁移_default分区中的向量，返回各知识库迁移的向量数（删除的孤儿向量记在-1下）"""
+    collection = milvus_client._ensure_collection()
+    collection.load()
+    iterator = collection.query_iterator(
+        batch_size=batch_size,
+        expr="id >= 0",
+        output_fields=["id", "kb_id", "doc_id", "chunk_index", "embedding"],
+        partition_names=["_default"],
+    )
+    moved: dict[int, int] = defaultdict(int)
+    try:
+        while True:
+            batch = iterator.next()
+            if not batch:
+                break
+            by_kb: dict[int, list[dict]] = defaultdict(list)
+            for entity in batch:
+                by_kb[int(entity["kb_id"])].append(entity)
+            for kb_id, entities in by_kb.items():
+                orphan = live_kb_ids is not None and kb_id not in live_kb_ids
+                moved[-1 if orphan else kb_id] += len(entities)
+                if dry_run:
+                    continue
+                if not orphan:
+                    partition = milvus_client._ensure_partition(collection, kb_id)
+                    collection.insert(
+                        [
+                            [kb_id] * len(entities),
+                            [int(e["doc_id"]) for e in entities],
+                            [int(e["chunk_index"]) for e in entities],
+                            [list(e["embedding"]) for e in entities],
+                        ],
+                        partition_name=partition,
+                        timeout=60,
+                    )
+                ids = [int(e["id"]) for e in entities]
+                collection.delete(f"id in {ids}", partition_name="_default")
+    finally:
+        iterator.close()
+    if not dry_run:
+        collection.flush()
+    return dict(moved)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--drop-orphans", action="store_true", help="删除所属知识库已不存在的向量")
+    parser.add_argument("--dry-run", action="store_true", help="只统计，不写入也不删除")
+    args = parser.parse_args()
+
+    if milvus_client.settings.TESTING or not milvus_client._load_pymilvus():
+        if args.dry_run:
+            legacy = local_store.path is not None and (local_store.path / "meta.json").exists()
+            print("存在旧版未分区的本地向量库文件，将按知识库拆分" if legacy else "本地向量库无需迁移")
+            return
+        # 加载时自动拆分旧版文件
+        print(f"本地向量库已按知识库分区: {len(local_store.partitions())} 个分区，{len(local_store)} 条向量")
+        if args.drop_orphans:
+            live = asyncio.run(_existing_kb_ids())
+            for kb_id in local_store.partitions():
+                if kb_id not in live:
+                    local_store.drop_partition(kb_id)
+                    print(f"删除孤儿分区 kb_{kb_id}")
+        return
+
+    live = asyncio.run(_existing_kb_ids()) if args.drop_orphans else None
+    moved = migrate_milvus(args.batch_size, live, args.dry_run)
+    for kb_id, count in sorted(moved.items()):
+        label = "孤儿向量（已删除）" if kb_id == -1 else f"kb_{kb_id}"
+        print(f"{label}: {count}")
+    print(f"{'将' if args.dry_run else '已'}迁移 {sum(moved.values())} 条向量")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,7 @@ CREATE TABLE IF NOT EXISTS knowledge_bases (
     description VARCHAR(255),
     created_by INT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    deleting TINYINT(1) NOT NULL DEFAULT 0,
     CONSTRAINT fk_kb_creator FOREIGN KEY (created_by) REFERENCES users(id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
@@ -20,8 +21,10 @@ CREATE TABLE IF NOT EXISTS documents (
     kb_id INT NOT NULL,
     filename VARCHAR(255) NOT NULL,
     original_path VARCHAR(255),
+    text_hash CHAR(64),
     status VARCHAR(32) DEFAULT 'pending',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX ix_documents_text_hash (text_hash),
     CONSTRAINT fk_doc_kb FOREIGN KEY (kb_id) REFERENCES knowledge_bases(id)
         ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -32,7 +35,10 @@ CREATE TABLE IF NOT EXISTS document_chunks (
     kb_id INT NOT NULL,
     chunk_index INT NOT NULL,
     content MEDIUMTEXT NOT NULL,
+    heading VARCHAR(255),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX ix_document_chunks_doc_chunk (doc_id, chunk_index),
+    FULLTEXT INDEX ft_document_chunks_content (content) WITH PARSER ngram,
     CONSTRAINT fk_chunk_doc FOREIGN KEY (doc_id) REFERENCES documents(id)
         ON DELETE CASCADE,
     CONSTRAINT fk_chunk_kb FOREIGN KEY (kb_id) REFERENCES knowledge_bases(id)
@@ -43,7 +49,10 @@ CREATE TABLE IF NOT EXISTS chat_sessions (
     id INT AUTO_INCREMENT PRIMARY KEY,
     user_id INT NOT NULL,
     name VARCHAR(128) NOT NULL,
+    summary MEDIUMTEXT,
+    message_count INT NOT NULL DEFAULT 0,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    deleting TINYINT(1) NOT NULL DEFAULT 0,
     CONSTRAINT fk_session_user FOREIGN KEY (user_id) REFERENCES users(id)
         ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -54,6 +63,7 @@ CREATE TABLE IF NOT EXISTS chat_messages (
     role VARCHAR(16) NOT NULL,
     content MEDIUMTEXT NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX ix_chat_messages_session_created (session_id, created_at),
     CONSTRAINT fk_message_session FOREIGN KEY (session_id) REFERENCES chat_sessions(id)
         ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
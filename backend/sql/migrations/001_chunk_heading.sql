@@ -0,0 +1,2 @@
+-- 文档块增加标题路径元数据（Markdown按标题层级切块）
+ALTER TABLE document_chunks ADD COLUMN heading VARCHAR(255) NULL AFTER content;
@@ -0,0 +1,3 @@
+-- 文档块预览：按(doc_id, chunk_index)做键集分页，按ngram全文索引做关键词检索
+ALTER TABLE document_chunks ADD INDEX ix_document_chunks_doc_chunk (doc_id, chunk_index);
+ALTER TABLE document_chunks ADD FULLTEXT INDEX ft_document_chunks_content (content) WITH PARSER ngram;
@@ -0,0 +1,7 @@
+-- 对话历史：按(session_id, created_at)取最近消息的索引，会话的滚动摘要与消息计数
+ALTER TABLE chat_messages ADD INDEX ix_chat_messages_session_created (session_id, created_at);
+ALTER TABLE chat_sessions
+    ADD COLUMN summary MEDIUMTEXT NULL AFTER name,
+    ADD COLUMN message_count INT NOT NULL DEFAULT 0 AFTER summary;
+UPDATE chat_sessions s
+    SET message_count = (SELECT COUNT(*) FROM chat_messages m WHERE m.session_id = s.id);
@@ -0,0 +1,4 @@
+-- 文档记录提取文本在文本缓存（DATA_DIR/texts）中的内容哈希，供重新切块使用
+ALTER TABLE documents
+    ADD COLUMN text_hash CHAR(64) NULL AFTER original_path,
+    ADD INDEX ix_documents_text_hash (text_hash);
@@ -0,0 +1,3 @@
+-- 知识库与会话的删除中标记：删除请求在同一事务中置位，后台删除期间列表与查询接口据此隐藏
+ALTER TABLE knowledge_bases ADD COLUMN deleting TINYINT(1) NOT NULL DEFAULT 0 AFTER created_at;
+ALTER TABLE chat_sessions ADD COLUMN deleting TINYINT(1) NOT NULL DEFAULT 0 AFTER created_at;
@@ -1,5 +1,9 @@
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import select
+
+from app.dependencies import get_current_user
+from app.models import User
 
 
 @pytest.mark.asyncio
@@ -31,3 +35,61 @@ async def test_register_and_login(client: AsyncClient):
     )
     assert r.status_code in (200, 400)
 
+
+@pytest.mark.asyncio
+async def test_deactivated_user_is_evicted_from_auth_cache(client: AsyncClient, db_session):
+    username = "cache_user"
+    password = "cache_password"
+    await client.post(
+        "/api/auth/register",
+        json={"username": username, "password": password},
+    )
+    r = await client.post(
+        "/api/auth/login",
+        json={
+            "username": username,
+            "password": password,
+            "captcha_id": "",
+            "captcha_code": "",
+        },
+    )
+    headers = {"Authorization": f"Bearer {r.json()['data']['token']}"}
+
+    r = await client.get("/api/chat/sessions", headers=headers)
+    assert r.status_code == 200
+
+    result = await db_session.execute(select(User).where(User.username == username))
+    user = result.scalar_one()
+    user.is_active = False
+    await db_session.commit()
+
+    r = await client.get("/api/chat/sessions", headers=headers)
+    assert r.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_auth_cache_does_not_share_orm_instances(client: AsyncClient, db_session):
+    username = "cache_share_user"
+    password = "cache_share_password"
+    await client.post(
+        "/api/auth/register",
+        json={"username": username, "password": password},
+    )
+    r = await client.post(
+        "/api/auth/login",
+        json={
+            "username": username,
+            "password": password,
+            "captcha_id": "",
+            "captcha_code": "",
+        },
+    )
+    token = r.json()["data"]["token"]
+
+    first = await get_current_user(token, db_session)
+    second = await get_current_user(token, db_session)
+    third = await get_current_user(token, db_session)
+    # 命中缓存时每次得到新的User，且不绑定任何会话
+    assert second is not first and third is not second
+    assert second not in db_session
+    assert (second.id, second.username, second.is_active) == (first.id, username, True)
@@ -0,0 +1,30 @@
+import asyncio
+
+import pytest
+
+from app.services.captcha import CaptchaService
+
+
+@pytest.mark.asyncio
+async def test_captcha_is_single_use_and_bounded():
+    service = CaptchaService(ttl=60, max_entries=2, pool_size=0)
+    first_id, image = await service.issue()
+    assert image
+    code = service._store.get(first_id)
+    assert service.verify(first_id, code)
+    assert not service.verify(first_id, code)
+
+    ids = [(await service.issue())[0] for _ in range(3)]
+    assert len(service) == 2
+    assert service._store.get(ids[0]) is None
+
+
+@pytest.mark.asyncio
+async def test_captcha_pool_is_refilled_in_background():
+    service = CaptchaService(ttl=60, max_entries=10, pool_size=3)
+    await service.warm_up()
+    assert len(service._pool) == 3
+    await service.issue()
+    assert len(service._pool) == 2
+    await asyncio.wait_for(service._refill_task, timeout=10)
+    assert len(service._pool) == 3
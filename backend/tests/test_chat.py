@@ -1,5 +1,18 @@
+import asyncio
+import time
+
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import select, update
+
+from app.config import get_settings
+from app.models import ChatSession, KnowledgeBase
+from app.routers import chat as chat_router
+from app.services.bulk_delete import delete_jobs, resume_deletes
+from app.services.llm_scheduler import LLMScheduler
+from app.services import rag
+from app.services.rag import call_qwen_stream
+from benchmarks.fake_qwen import FakeQwenConfig, FakeQwenServer
 
 
 @pytest.mark.asyncio
@@ -51,3 +64,282 @@ async def test_chat_flow(client: AsyncClient):
         headers=headers,
     )
     assert chat_resp.status_code == 200
+
+    # 删除会话：后台按批删除消息
+    delete_resp = await client.delete(f"/api/chat/sessions/{session_id}", headers=headers)
+    job = delete_resp.json()["data"]
+    await delete_jobs.wait(job["id"])
+    job = (await client.get(f"/api/jobs/{job['id']}", headers=headers)).json()["data"]
+    assert job["status"] == "done"
+    assert job["deleted"] == {"messages": 2, "sessions": 1}
+    sessions = (await client.get("/api/chat/sessions", headers=headers)).json()["data"]
+    assert session_id not in [s["id"] for s in sessions]
+
+
+@pytest.mark.asyncio
+async def test_qwen_api_base_override_uses_remote(monkeypatch):
+    settings = get_settings()
+    server = FakeQwenServer(FakeQwenConfig(ttft=0, token_interval=0, tokens=5)).start()
+    try:
+        monkeypatch.setattr(settings, "QWEN_API_BASE", server.base_url)
+        monkeypatch.setattr(settings, "QWEN_API_KEY", "test-key")
+        stream = await call_qwen_stream(
+            question="测试问题",
+            context="",
+            history=[],
+            temperature=0.8,
+            top_p=0.8,
+            max_tokens=32,
+        )
+        answer = "".join([token async for token in stream])
+    finally:
+        server.stop()
+    assert answer == "苏州园林以"
+    assert server.app.state.requests == 1
+
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_uses_faster_path(monkeypatch):
+    settings = get_settings()
+    config = FakeQwenConfig(
+        ttft=0, token_interval=0, tokens=5, model_ttft={"qwen-max": 2.0, "qwen-turbo": 0}
+    )
+    server = FakeQwenServer(config).start()
+    try:
+        monkeypatch.setattr(settings, "QWEN_API_BASE", server.base_url)
+        monkeypatch.setattr(settings, "QWEN_API_KEY", "test-key")
+        monkeypatch.setattr(settings, "QWEN_MODEL", "qwen-max")
+        monkeypatch.setattr(settings, "LLM_HEDGE_MODEL", "qwen-turbo")
+        monkeypatch.setattr(settings, "LLM_HEDGE_AFTER", 0.1)
+        before = rag.LLM_STREAM_WINS._values.get(("hedge", "qwen-turbo"), 0)
+
+        async def ask() -> str:
+            stream = await call_qwen_stream(
+                question="测试问题", context="", history=[], temperature=0.8, top_p=0.8, max_tokens=32
+            )
+            return "".join([token async for token in stream])
+
+        # 主请求首token慢于阈值：对冲到qwen-turbo，先返回的一路胜出，慢的一路被取消
+        started = time.perf_counter()
+        assert await ask() == "苏州园林以"
+        assert time.perf_counter() - started < 1.5
+        assert server.app.state.requests == 2
+        assert rag.LLM_STREAM_WINS._values[("hedge", "qwen-turbo")] == before + 1
+
+        # 首token在阈值内到达时不发起对冲
+        config.model_ttft["qwen-max"] = 0
+        assert await ask() == "苏州园林以"
+        assert server.app.state.requests == 3
+    finally:
+        server.stop()
+
+async def _login(client: AsyncClient, username: str) -> dict[str, str]:
+    await client.post("/api/auth/register", json={"username": username, "password": "pw_123456"})
+    login_resp = await client.post(
+        "/api/auth/login",
+        json={"username": username, "password": "pw_123456", "captcha_id": "", "captcha_code": ""},
+    )
+    return {"Authorization": f"Bearer {login_resp.json()['data']['token']}"}
+
+
+@pytest.mark.asyncio
+async def test_deleting_flag_persists_in_database(client: AsyncClient, db_session):
+    headers = await _login(client, "chat_deleting_user")
+    session_id = (
+        await client.post("/api/chat/sessions", json={"name": "删除中"}, headers=headers)
+    ).json()["data"]["id"]
+
+    # 模拟其他进程已受理删除、或删除期间进程重启：数据库中有标记，本进程没有删除任务
+    await db_session.execute(
+        update(ChatSession).where(ChatSession.id == session_id).values(deleting=True)
+    )
+    await db_session.commit()
+    assert delete_jobs.find_active("chat_session", session_id) is None
+    sessions = (await client.get("/api/chat/sessions", headers=headers)).json()["data"]
+    assert session_id not in [s["id"] for s in sessions]
+    resp = await client.post(
+        "/api/chat/stream",
+        json={"session_id": session_id, "question": "测试问题"},
+        headers=headers,
+    )
+    assert resp.status_code == 404
+
+    # 启动时为标记为删除中的对象重新提交删除任务
+    assert await resume_deletes(("chat_session",)) >= 1
+    job = delete_jobs.find_active("chat_session", session_id)
+    await delete_jobs.wait(job.id)
+    assert job.status == "done"
+    remaining = await db_session.scalar(select(ChatSession.id).where(ChatSession.id == session_id))
+    assert remaining is None
+
+
+@pytest.mark.asyncio
+async def test_chat_ignores_deleting_and_missing_knowledge_bases(client: AsyncClient, db_session):
+    headers = await _login(client, "chat_kb_filter_user")
+    kb_id = (
+        await client.post("/api/knowledge/bases", json={"name": "删除中的知识库"}, headers=headers)
+    ).json()["data"]["id"]
+    session_id = (
+        await client.post("/api/chat/sessions", json={"name": "知识库过滤"}, headers=headers)
+    ).json()["data"]["id"]
+    await db_session.execute(
+        update(KnowledgeBase).where(KnowledgeBase.id == kb_id).values(deleting=True)
+    )
+    await db_session.commit()
+
+    assert await rag.live_kb_ids([kb_id, 10**9]) == []
+    assert await rag.prefetch_chunks([kb_id, 10**9], "测试问题") == ([], {})
+    resp = await client.post(
+        "/api/chat/stream",
+        json={"session_id": session_id, "kb_ids": [kb_id, 10**9], "question": "测试问题"},
+        headers=headers,
+    )
+    assert resp.status_code == 200 and "[DONE]" in resp.text
+
+
+@pytest.mark.asyncio
+async def test_stream_ends_with_done_when_persist_fails(client: AsyncClient, monkeypatch):
+    headers = await _login(client, "chat_persist_user")
+    session_id = (
+        await client.post("/api/chat/sessions", json={"name": "落库失败"}, headers=headers)
+    ).json()["data"]["id"]
+
+    async def failing_save(*args, **kwargs):
+        raise RuntimeError("数据库暂时不可用")
+
+    monkeypatch.setattr(chat_router, "save_chat_messages", failing_save)
+    resp = await client.post(
+        "/api/chat/stream",
+        json={"session_id": session_id, "question": "测试问题"},
+        headers=headers,
+    )
+    assert resp.status_code == 200
+    # 回答已完整推送，落库失败不影响结束标记
+    assert resp.text.rstrip().endswith("data: [DONE]")
+    assert "暂无可用回答" not in resp.text
+
+
+@pytest.mark.asyncio
+async def test_retrieval_overlaps_history_and_cancels_on_404(client: AsyncClient, monkeypatch):
+    headers = await _login(client, "chat_prefetch_user")
+    session_id = (
+        await client.post("/api/chat/sessions", json={"name": "并发"}, headers=headers)
+    ).json()["data"]["id"]
+
+    retrieval_started = asyncio.Event()
+    history_started = asyncio.Event()
+    cancelled = []
+    original_history = chat_router.get_chat_history
+
+    async def fake_prefetch(kb_ids, question, **kwargs):
+        retrieval_started.set()
+        try:
+            # 历史加载开始前检索已在进行，二者串行执行时这里会超时
+            await asyncio.wait_for(history_started.wait(), timeout=2)
+            await asyncio.sleep(10 if question == "挂起" else 0)
+        except asyncio.CancelledError:
+            cancelled.append(question)
+            raise
+        return [], {}
+
+    async def fake_history(db, session, rounds):
+        history_started.set()
+        await asyncio.wait_for(retrieval_started.wait(), timeout=2)
+        return await original_history(db, session, rounds)
+
+    monkeypatch.setattr(chat_router, "prefetch_chunks", fake_prefetch)
+    monkeypatch.setattr(chat_router, "get_chat_history", fake_history)
+
+    resp = await client.post(
+        "/api/chat/stream",
+        json={"session_id": session_id, "question": "测试问题"},
+        headers=headers,
+    )
+    assert resp.status_code == 200 and "[DONE]" in resp.text
+
+    # 会话不存在时立即返回404，并取消仍在进行的检索
+    resp = await client.post(
+        "/api/chat/stream",
+        json={"session_id": 10**9, "question": "挂起"},
+        headers=headers,
+    )
+    assert resp.status_code == 404
+    await asyncio.sleep(0)
+    assert cancelled == ["挂起"]
+
+
+@pytest.mark.asyncio
+async def test_scheduler_queue_event_and_backoff_on_429(client: AsyncClient, monkeypatch):
+    settings = get_settings()
+    headers = await _login(client, "chat_scheduler_user")
+    session_id = (
+        await client.post("/api/chat/sessions", json={"name": "排队"}, headers=headers)
+    ).json()["data"]["id"]
+    scheduler = LLMScheduler(max_concurrency=2, max_queue=1, queue_timeout=5)
+    monkeypatch.setattr(chat_router, "llm_scheduler", scheduler)
+
+    server = FakeQwenServer(FakeQwenConfig(ttft=0, token_interval=0, rate_limit_rate=1.0)).start()
+    try:
+        monkeypatch.setattr(settings, "QWEN_API_BASE", server.base_url)
+        monkeypatch.setattr(settings, "QWEN_API_KEY", "test-key")
+
+        # 名额被其他用户占满时排队，并推送排队位置
+        holders = [scheduler.submit(user_id=0), scheduler.submit(user_id=0)]
+        body = {"session_id": session_id, "question": "测试问题"}
+        queued = asyncio.create_task(client.post("/api/chat/stream", json=body, headers=headers))
+        for _ in range(200):
+            if scheduler.queued:
+                break
+            await asyncio.sleep(0.01)
+        assert scheduler.queued == 1
+
+        # 队列已满时快速拒绝
+        resp = await client.post("/api/chat/stream", json=body, headers=headers)
+        assert resp.status_code == 429
+
+        for ticket in holders:
+            ticket.release(first_token_latency=0.01)
+        resp = await queued
+    finally:
+        server.stop()
+    assert 'event: queue\ndata: {"position": 0}' in resp.text
+    # 模拟服务返回429：回退提示，并发上限减半
+    assert "对话服务暂时不可用" in resp.text and "[DONE]" in resp.text
+    assert server.app.state.requests == 1
+    assert scheduler.limit == 1 and scheduler.inflight == 0
+
+
+@pytest.mark.asyncio
+async def test_resume_stream_with_last_event_id(client: AsyncClient, monkeypatch):
+    headers = await _login(client, "chat_resume_user")
+    session_id = (
+        await client.post("/api/chat/sessions", json={"name": "续传"}, headers=headers)
+    ).json()["data"]["id"]
+    calls = []
+    original_call = chat_router.call_qwen_stream
+
+    async def counting_call(**kwargs):
+        calls.append(kwargs["question"])
+        return await original_call(**kwargs)
+
+    monkeypatch.setattr(chat_router, "call_qwen_stream", counting_call)
+    body = {"session_id": session_id, "question": "测试问题"}
+    resp = await client.post("/api/chat/stream", json=body, headers=headers)
+    frames = [frame for frame in resp.text.split("\n\n") if frame]
+    ids = [frame.split("\n")[0].removeprefix("id: ") for frame in frames]
+    assert frames[-1].endswith("data: [DONE]") and len(set(ids)) == len(frames)
+
+    # 携带Last-Event-ID重连：从缓冲续传剩余事件，不重新调用大模型
+    resumed = await client.post(
+        "/api/chat/stream", json=body, headers={**headers, "Last-Event-ID": ids[2]}
+    )
+    assert resumed.text == "\n\n".join(frames[3:]) + "\n\n"
+    assert calls == ["测试问题"]
+
+    # 其他用户或已过期的id不能续传
+    other = await _login(client, "chat_resume_other")
+    resp = await client.post(
+        "/api/chat/stream", json=body, headers={**other, "Last-Event-ID": ids[2]}
+    )
+    assert resp.status_code == 410
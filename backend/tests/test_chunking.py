@@ -0,0 +1,66 @@
+from app.services.chunking import split_text_by_sentences
+from app.services.file_parser import split_text
+from app.services.tokenizer import estimate_tokens
+
+
+TEXT = (
+    "# 苏州\n\n"
+    "苏州是一座历史文化名城。拙政园位于姑苏区东北街！园内以水为中心？\n\n"
+    "## 交通\n\n"
+    "地铁4号线北寺塔站下车即到；公交游2路、游5路均可到达。"
+    "开放时间为每日七点半至十七点半。旺季需提前预约门票。\n"
+)
+
+
+def test_short_text_takes_fast_path():
+    assert split_text_by_sentences("  拙政园开放时间为每日七点半。 ", 50, 10) == [
+        "拙政园开放时间为每日七点半。"
+    ]
+    assert split_text_by_sentences("", 50, 10) == []
+
+
+def test_chunks_end_on_sentence_boundaries_and_respect_budget():
+    chunks = split_text_by_sentences(TEXT, 30, 10)
+    assert chunks
+    for chunk in chunks:
+        assert chunk[-1] in "。！？；"
+        assert estimate_tokens(chunk) <= 30
+
+
+def test_heading_starts_new_chunk():
+    chunks = split_text_by_sentences(TEXT, 60, 10)
+    assert any(c.startswith("## 交通") for c in chunks)
+    assert not any("园内以水为中心？" in c and "## 交通" in c for c in chunks)
+
+
+def test_overlap_is_whole_sentences():
+    text = "".join(f"第{i}句介绍苏州的景点。" for i in range(40))
+    chunks = split_text_by_sentences(text, 40, 12)
+    for prev, nxt in zip(chunks, chunks[1:]):
+        first_sentence = nxt.split("。")[0] + "。"
+        assert first_sentence in prev
+
+
+def test_long_sentence_is_hard_split():
+    text = "苏" * 100
+    chunks = split_text_by_sentences(text, 30, 5)
+    assert "".join(chunks) == text
+    assert all(estimate_tokens(c) <= 30 for c in chunks)
+
+
+def test_split_text_dispatches_strategy():
+    assert split_text(TEXT, 500, 100, "fixed") == [TEXT]
+    assert split_text(TEXT, 500, 100, "sentence") == [TEXT.strip()]
+
+
+def test_markdown_sections_drop_markup_and_keep_heading_path():
+    from app.services.markdown_text import markdown_to_sections
+
+    content = (
+        "# 苏州\n\n介绍**拙政园**与[虎丘](https://example.com)。\n\n"
+        "## 交通\n\n- 地铁<b>4号线</b>\n\n| 线路 | 站点 |\n|---|---|\n| 4号线 | 北寺塔 |\n"
+    )
+    assert markdown_to_sections(content) == [
+        ("苏州", "介绍拙政园与虎丘。"),
+        ("苏州 > 交通", "地铁4号线\n\n线路 站点\n4号线 北寺塔"),
+    ]
@@ -0,0 +1,49 @@
+from app.models import DocumentChunk
+from app.services.context import assemble_context, overlap_length, trim_history
+
+
+def _chunk(doc_id: int, idx: int, content: str, heading: str | None = None):
+    return DocumentChunk(doc_id=doc_id, kb_id=1, chunk_index=idx, content=content, heading=heading)
+
+
+def test_overlap_length():
+    assert overlap_length("拙政园位于姑苏区", "姑苏区东北街", 10) == 3
+    assert overlap_length("abc", "xyz", 10) == 0
+    assert overlap_length("aaaa", "aaaa", 2) == 2
+
+
+def test_adjacent_chunks_are_merged_without_overlap():
+    chunks = [
+        _chunk(1, 0, "拙政园位于姑苏区。东北街178号。"),
+        _chunk(1, 1, "东北街178号。开放时间七点半。"),
+        _chunk(2, 5, "虎丘山风景区。"),
+    ]
+    scores = {(1, 0): 0.9, (1, 1): 0.8, (2, 5): 0.5}
+    context = assemble_context(chunks, scores)
+    assert context == "拙政园位于姑苏区。东北街178号。开放时间七点半。\n\n虎丘山风景区。"
+
+
+def test_budget_packs_by_score():
+    chunks = [_chunk(1, 0, "甲" * 50), _chunk(2, 0, "乙" * 50), _chunk(3, 0, "丙" * 50)]
+    scores = {(1, 0): 0.2, (2, 0): 0.9, (3, 0): 0.5}
+    context = assemble_context(chunks, scores, budget=100, unit="char")
+    assert context == "乙" * 50 + "\n\n" + "丙" * 50
+
+
+def test_budget_truncates_single_oversized_chunk():
+    chunks = [_chunk(1, 0, "甲" * 50, heading="苏州")]
+    context = assemble_context(chunks, {(1, 0): 1.0}, budget=10)
+    assert context.startswith("【苏州】")
+    assert len(context) < 20
+
+
+def test_trim_history_keeps_latest_whole_rounds():
+    history = [
+        {"role": "user", "content": "一" * 10},
+        {"role": "assistant", "content": "二" * 10},
+        {"role": "user", "content": "三" * 10},
+        {"role": "assistant", "content": "四" * 10},
+    ]
+    kept, used = trim_history(history, 30, "char")
+    assert kept == history[2:]
+    assert used == 20
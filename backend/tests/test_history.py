@@ -0,0 +1,40 @@
+import pytest
+
+from app.models import ChatSession, User
+from app.services.history import HistoryCache, fold_summary, summarize_round
+
+
+def test_fold_summary_is_bounded():
+    line = summarize_round("拙政园门票多少钱？", "旺季80元，淡季70元。学生半价。")
+    assert line == "用户问：拙政园门票多少钱？ 答：旺季80元，淡季70元。"
+
+    summary = ""
+    for i in range(50):
+        summary = fold_summary(summary, [(f"问题{i}", f"回答{i}。")], budget=60, unit="char")
+        assert len(summary) <= 60
+    # 超出预算时丢弃最早的条目
+    assert summary.endswith("问题49 答：回答49。") and "问题0 " not in summary
+
+
+@pytest.mark.asyncio
+async def test_history_window_and_summary(db_session):
+    user = User(username="history_user", password_hash="x")
+    db_session.add(user)
+    await db_session.commit()
+    session = ChatSession(user_id=user.id, name="历史")
+    db_session.add(session)
+    await db_session.commit()
+
+    cache = HistoryCache(window_rounds=2, summary_budget=200)
+    for i in range(5):
+        await cache.append(db_session, session, f"问题{i}", f"回答{i}。")
+
+    history = await cache.get(db_session, session, rounds=10)
+    assert [m["content"] for m in history[1:]] == ["问题3", "回答3。", "问题4", "回答4。"]
+    assert history[0]["role"] == "system"
+    assert "问题0" in history[0]["content"] and "问题2" in history[0]["content"]
+
+    # 缓存失效（如其他进程）时从数据库的摘要与最近消息重建出相同的历史
+    await db_session.refresh(session)
+    assert session.message_count == 10
+    assert await HistoryCache(window_rounds=2).get(db_session, session, rounds=10) == history
@@ -0,0 +1,343 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.services import milvus_client
+from app.services.index_manager import IndexManager, choose_index_params, search_params_for
+
+
+class FakeCollection:
+    """本地模拟的Milvus集合：记录索引操作与检索参数，检索为暴力内积，表达式按Python表达式求值"""
+
+    _next_id = 0
+
+    def __init__(self, dim: int = 8, index: dict | None = None):
+        self.dim = dim
+        self.schema = SimpleNamespace(
+            fields=[SimpleNamespace(name="embedding", params={"dim": dim})]
+        )
+        self.num_entities = 0
+        self.calls: list[tuple] = []
+        self.searches: list[dict] = []
+        self.rows: dict[str, list[dict]] = {}
+        self._index = index
+
+    @property
+    def indexes(self):
+        if self._index is None:
+            return []
+        return [SimpleNamespace(field_name="embedding", params=self._index)]
+
+    @property
+    def partitions(self):
+        return [SimpleNamespace(name=name) for name in self.rows]
+
+    def has_index(self) -> bool:
+        return self._index is not None
+
+    def create_index(self, field_name: str, index_params: dict) -> None:
+        self.calls.append(("create_index", index_params["index_type"]))
+        self._index = index_params
+
+    def drop_index(self) -> None:
+        self.calls.append(("drop_index",))
+        self._index = None
+
+    def release(self) -> None:
+        self.calls.append(("release",))
+
+    def load(self) -> None:
+        pass
+
+    def drop(self) -> None:
+        self.calls.append(("drop",))
+
+    def has_partition(self, name: str) -> bool:
+        return name in self.rows
+
+    def create_partition(self, name: str, description: str = "") -> None:
+        self.rows[name] = []
+
+    def partition(self, name: str):
+        return SimpleNamespace(release=lambda: None)
+
+    def drop_partition(self, name: str) -> None:
+        self.num_entities -= len(self.rows.pop(name))
+
+    def insert(self, data, partition_name: str, timeout: float | None = None):
+        ids = []
+        for kb_id, doc_id, chunk_index, embedding in zip(*data):
+            FakeCollection._next_id += 1
+            ids.append(FakeCollection._next_id)
+            self.rows[partition_name].append(
+                {
+                    "id": FakeCollection._next_id,
+                    "kb_id": kb_id,
+                    "doc_id": doc_id,
+                    "chunk_index": chunk_index,
+                    "embedding": list(embedding),
+                }
+            )
+        self.num_entities += len(ids)
+        return SimpleNamespace(primary_keys=ids)
+
+    def _select(self, expr: str, partition_names=None) -> list[dict]:
+        names = partition_names or list(self.rows)
+        return [row for name in names for row in self.rows[name] if eval(expr, {}, dict(row))]
+
+    def delete(self, expr: str, partition_name: str | None = None) -> None:
+        doomed = {row["id"] for row in self._select(expr, [partition_name] if partition_name else None)}
+        for name, rows in self.rows.items():
+            self.rows[name] = [row for row in rows if row["id"] not in doomed]
+        self.num_entities -= len(doomed)
+
+    def query(self, expr: str, output_fields, partition_names=None) -> list[dict]:
+        return [{f: row[f] for f in output_fields} for row in self._select(expr, partition_names)]
+
+    def query_iterator(self, batch_size: int, expr: str, output_fields, partition_names=None):
+        rows = self.query(expr, output_fields, partition_names)
+        pages = iter([rows[i : i + batch_size] for i in range(0, len(rows), batch_size)])
+        return SimpleNamespace(next=lambda: next(pages, []), close=lambda: None)
+
+    def search(self, data, anns_field, param, limit, partition_names, output_fields):
+        self.searches.append({"param": param, "partition_names": partition_names})
+        for name in partition_names or []:
+            if name not in self.rows:
+                raise Exception(f"partition not found[partition={name}]")
+        rows = self._select("True", partition_names)
+        q = np.asarray(data[0])
+        scored = sorted(rows, key=lambda r: -float(np.dot(r["embedding"], q)))[:limit]
+        hits = [
+            SimpleNamespace(
+                score=float(np.dot(r["embedding"], q)),
+                entity={f: r[f] for f in output_fields},
+            )
+            for r in scored
+        ]
+        return [hits]
+
+
+class FakeAlias:
+    """模拟集合别名：影子集合与当前集合结构相同，切换后经别名访问的都是影子集合"""
+
+    def __init__(self, collection: FakeCollection):
+        self.active = collection
+        self.retired: list[FakeCollection] = []
+
+    def create_shadow(self, collection: FakeCollection) -> FakeCollection:
+        return FakeCollection(dim=collection.dim)
+
+    def activate(self, collection: FakeCollection, shadow: FakeCollection) -> None:
+        self.retired.append(self.active)
+        self.active = shadow
+
+
+def use_fake_milvus(monkeypatch, alias: FakeAlias, manager: IndexManager) -> None:
+    monkeypatch.setattr(milvus_client, "_pymilvus_available", True)
+    monkeypatch.setattr(milvus_client.settings, "TESTING", False)
+    monkeypatch.setattr(milvus_client, "_ensure_collection", lambda dim=256: alias.active)
+    monkeypatch.setattr(milvus_client, "_known_partitions", set())
+    monkeypatch.setattr(milvus_client, "index_manager", manager)
+
+
+def test_choose_index_params_by_size():
+    assert choose_index_params(500, 256)["index_type"] == "FLAT"
+    hnsw = choose_index_params(50_000, 1024)
+    assert hnsw["index_type"] == "HNSW" and hnsw["params"]["M"] == 32
+    ivf = choose_index_params(5_000_000, 256)
+    assert ivf["index_type"] == "IVF_SQ8" and 8000 < ivf["params"]["nlist"] < 10000
+
+    assert search_params_for(hnsw, top_k=5)["params"] == {"ef": 64}
+    assert search_params_for(hnsw, top_k=100, ef=10)["params"] == {"ef": 100}
+    legacy = {"index_type": "IVF_FLAT", "metric_type": "IP", "params": {"nlist": 1024}}
+    assert search_params_for(legacy, top_k=5)["params"] == {"nprobe": 20}
+    assert search_params_for(legacy, top_k=5, nprobe=4096)["params"] == {"nprobe": 1024}
+
+
+def test_rebuild_when_threshold_crossed():
+    collection = FakeCollection()
+    alias = FakeAlias(collection)
+    manager = IndexManager(
+        check_rows=1000,
+        background=False,
+        create_shadow=alias.create_shadow,
+        activate=alias.activate,
+    )
+    manager.attach(collection)
+    assert collection.calls == [("create_index", "FLAT")]
+
+    collection.num_entities = 9_000
+    manager.note_inserted(collection, 9_000)
+    assert manager.current_params["index_type"] == "FLAT"
+
+    collection.num_entities = 12_000
+    manager.note_inserted(collection, 500)
+    assert alias.active is collection
+    manager.note_inserted(collection, 500)
+    # 新索引建在影子集合上，正在服务的集合不释放、不删除索引
+    assert collection.calls == [("create_index", "FLAT")]
+    assert alias.active is not collection and alias.retired == [collection]
+    assert alias.active.calls == [("create_index", "HNSW")]
+    assert manager.current_params["index_type"] == "HNSW"
+
+    # 同一档位内增长不重建
+    alias.active.num_entities = 500_000
+    assert manager.maybe_rebuild(alias.active) is False
+
+
+def test_search_during_rebuild_returns_hits(monkeypatch):
+    collection = FakeCollection()
+    alias = FakeAlias(collection)
+    manager = IndexManager(
+        check_rows=10**9,
+        copy_batch_size=3,
+        create_shadow=alias.create_shadow,
+        activate=alias.activate,
+    )
+    manager.attach(collection)
+    use_fake_milvus(monkeypatch, alias, manager)
+
+    vectors = np.eye(8, dtype=np.float32)
+    milvus_client.insert_embeddings(1, 10, range(4), vectors[:4].tolist())
+    milvus_client.insert_embeddings(2, 20, range(2), vectors[4:6].tolist())
+
+    # 影子集合建索引时阻塞，模拟大规模下耗时很长的重建
+    building = threading.Event()
+    release = threading.Event()
+    original_shadow = alias.create_shadow
+
+    def slow_shadow(c):
+        shadow = original_shadow(c)
+        create_index = shadow.create_index
+
+        def blocking_create_index(field_name, index_params):
+            building.set()
+            assert release.wait(5)
+            create_index(field_name, index_params)
+
+        shadow.create_index = blocking_create_index
+        return shadow
+
+    manager.create_shadow = slow_shadow
+    collection.num_entities = 12_000
+    assert manager.maybe_rebuild(collection) is True
+    assert building.wait(5)
+
+    started = time.perf_counter()
+    hits = milvus_client.search_embeddings([1], vectors[2], top_k=1)
+    assert time.perf_counter() - started < 1
+    assert hits[0]["doc_id"] == 10 and hits[0]["chunk_index"] == 2
+    # 重建期间的写入在旧集合上立即生效，并在切换前重放到影子集合
+    milvus_client.insert_embeddings(2, 21, [0], vectors[6:7].tolist())
+    milvus_client.delete_embeddings(1, 10, [3])
+    milvus_client.drop_kb_embeddings(2)
+    milvus_client.insert_embeddings(3, 30, [0], vectors[7:].tolist())
+    assert milvus_client.search_embeddings([3], vectors[7], top_k=1)[0]["doc_id"] == 30
+
+    release.set()
+    manager.wait_for_rebuild(5)
+    shadow = alias.active
+    assert shadow is not collection and manager.current_params["index_type"] == "HNSW"
+    assert sorted((r["doc_id"], r["chunk_index"]) for r in shadow._select("True")) == [
+        (10, 0),
+        (10, 1),
+        (10, 2),
+        (30, 0),
+    ]
+    assert [p.name for p in shadow.partitions] == ["kb_1", "kb_3"]
+    assert milvus_client.search_embeddings([1], vectors[3], top_k=4)[0]["chunk_index"] != 3
+    assert milvus_client.search_embeddings([3], vectors[7], top_k=1)[0]["doc_id"] == 30
+
+
+def test_search_uses_partitions_and_overrides(monkeypatch):
+    collection = FakeCollection(
+        index={"index_type": "IVF_FLAT", "metric_type": "IP", "params": {"nlist": 1024}}
+    )
+    manager = IndexManager(background=False)
+    manager.attach(collection)
+    use_fake_milvus(monkeypatch, FakeAlias(collection), manager)
+
+    vectors = np.eye(8, dtype=np.float32)
+    milvus_client.insert_embeddings(1, 10, range(4), vectors[:4].tolist())
+    milvus_client.insert_embeddings(2, 20, range(4), vectors[4:].tolist())
+
+    hits = milvus_client.search_embeddings([2], vectors[5], top_k=2)
+    assert hits[0]["kb_id"] == 2 and hits[0]["chunk_index"] == 1
+    assert collection.searches[-1] == {
+        "param": {"metric_type": "IP", "params": {"nprobe": 20}},
+        "partition_names": ["kb_2"],
+    }
+
+    milvus_client.search_embeddings([1, 3], vectors[0], top_k=2, nprobe=64)
+    assert collection.searches[-1]["param"]["params"] == {"nprobe": 64}
+    assert collection.searches[-1]["partition_names"] == ["kb_1"]
+    assert milvus_client.search_embeddings([3], vectors[0]) == []
+
+
+def test_fetch_embeddings_queries_only_requested_rows(monkeypatch):
+    collection = FakeCollection()
+    manager = IndexManager(background=False)
+    manager.attach(collection)
+    use_fake_milvus(monkeypatch, FakeAlias(collection), manager)
+    monkeypatch.setattr(milvus_client, "_FETCH_BATCH", 3)
+
+    vectors = np.eye(8, dtype=np.float32)
+    milvus_client.insert_embeddings(1, 10, range(6), vectors[:6].tolist())
+    milvus_client.insert_embeddings(1, 11, range(2), vectors[6:].tolist())
+
+    returned = []
+    query = collection.query
+
+    def counting_query(expr, output_fields, partition_names=None):
+        rows = query(expr, output_fields, partition_names)
+        returned.append(len(rows))
+        return rows
+
+    collection.query = counting_query
+    fetched = milvus_client.fetch_embeddings(1, [10, 10, 11, 10, 10], [4, 0, 1, 9, 5])
+    # 每次查询只返回请求的行，且不超过_FETCH_BATCH行
+    assert sum(returned) == 4 and max(returned) <= 3
+    assert np.array_equal(fetched[[0, 1, 2, 4]], vectors[[4, 0, 7, 5]])
+    assert np.isnan(fetched[3]).all()
+
+
+def test_replace_embeddings_deletes_old_rows_by_expression(monkeypatch):
+    collection = FakeCollection()
+    manager = IndexManager(background=False)
+    manager.attach(collection)
+    use_fake_milvus(monkeypatch, FakeAlias(collection), manager)
+
+    vectors = np.eye(8, dtype=np.float32)
+    milvus_client.insert_embeddings(1, 10, range(5), vectors[:5].tolist())
+    milvus_client.insert_embeddings(1, 11, range(1), vectors[5:6].tolist())
+    # 不查询旧主键：查询有结果条数上限，超出部分的旧向量会留成孤儿
+    monkeypatch.setattr(collection, "query", None)
+
+    milvus_client.replace_embeddings(1, 10, [0, 1], vectors[6:].tolist())
+    rows = sorted((r["doc_id"], r["chunk_index"]) for r in collection._select("True"))
+    assert rows == [(10, 0), (10, 1), (11, 0)]
+    assert collection.num_entities == 3
+
+    milvus_client.replace_embeddings(1, 10, [], [])
+    assert [(r["doc_id"], r["chunk_index"]) for r in collection._select("True")] == [(11, 0)]
+
+
+def test_search_skips_partition_dropped_by_another_process(monkeypatch):
+    collection = FakeCollection()
+    manager = IndexManager(background=False)
+    manager.attach(collection)
+    use_fake_milvus(monkeypatch, FakeAlias(collection), manager)
+
+    vectors = np.eye(8, dtype=np.float32)
+    milvus_client.insert_embeddings(1, 10, range(2), vectors[:2].tolist())
+    milvus_client.insert_embeddings(2, 20, range(2), vectors[2:4].tolist())
+    assert len(milvus_client.search_embeddings([1, 2], vectors[2], top_k=4)) == 4
+
+    # 其他进程删除了知识库2的分区，本进程的分区缓存中仍有它
+    collection.drop_partition("kb_2")
+    hits = milvus_client.search_embeddings([1, 2], vectors[2], top_k=4)
+    assert {h["kb_id"] for h in hits} == {1}
+    assert "kb_2" not in milvus_client._known_partitions
+    assert milvus_client.search_embeddings([2], vectors[2]) == []
@@ -0,0 +1,54 @@
+from app.services.keyword_index import KeywordIndex, reciprocal_rank_fusion
+
+
+CHUNKS = [
+    (1, 1, 10, 0, "拙政园位于姑苏区东北街，是苏州四大名园之一。"),
+    (2, 1, 10, 1, "地铁4号线北寺塔站下车步行即到。"),
+    (3, 2, 20, 0, "虎丘山风景区位于苏州古城西北。"),
+]
+
+
+def test_search_ranks_exact_names_and_filters_kb():
+    index = KeywordIndex()
+    index.add_chunks(CHUNKS)
+    hits = index.search("北寺塔站怎么走", [], top_k=2)
+    assert (hits[0]["doc_id"], hits[0]["chunk_index"]) == (10, 1)
+    assert index.search("虎丘", [1]) == []
+    assert index.search("虎丘", [2])[0]["doc_id"] == 20
+
+
+def test_update_and_remove_are_incremental():
+    index = KeywordIndex()
+    index.add_chunks(CHUNKS)
+    assert index.update_chunk(2, "平江路历史街区")
+    assert not index.update_chunk(99, "不存在")
+    assert index.search("北寺塔", []) == []
+    index.remove_kb(2)
+    assert len(index) == 2
+    assert index.search("虎丘", []) == []
+
+
+def test_persisted_index_is_reloaded_with_journal(tmp_path):
+    index = KeywordIndex(tmp_path, compact_threshold=2)
+    index.add_chunks(CHUNKS[:2])
+    index.maybe_compact()
+    assert (tmp_path / "postings.bin").exists()
+    index.add_chunks(CHUNKS[2:])
+    index.remove_chunks([1])
+
+    reloaded = KeywordIndex(tmp_path)
+    assert len(reloaded) == 2
+    assert reloaded.search("拙政园", []) == []
+    assert reloaded.search("虎丘", [])[0]["doc_id"] == 20
+    reloaded.compact()
+    assert KeywordIndex(tmp_path).search("北寺塔", [])[0]["chunk_index"] == 1
+
+
+def test_reciprocal_rank_fusion_merges_lists():
+    vector = [
+        {"score": 0.9, "kb_id": 1, "doc_id": 1, "chunk_index": 0},
+        {"score": 0.8, "kb_id": 1, "doc_id": 1, "chunk_index": 1},
+    ]
+    keyword = [{"score": 7.0, "kb_id": 1, "doc_id": 1, "chunk_index": 1}]
+    fused = reciprocal_rank_fusion(vector, keyword, top_k=2)
+    assert [h["chunk_index"] for h in fused] == [1, 0]
@@ -1,8 +1,24 @@
+import io
 from pathlib import Path
 
+import numpy as np
 import pytest
 from httpx import AsyncClient
 
+from app.models import Document
+from app.services import rechunk, snapshot
+from app.services.bulk_delete import delete_jobs
+from app.services.embedding import default_embedder
+from app.services.keyword_index import keyword_index
+from app.services.milvus_client import fetch_embeddings
+from app.services.text_store import text_store
+from app.services.vector_store import local_store
+
+
+def live_vectors(kb_id: int) -> int:
+    stats = local_store.memory_stats()["partitions"][kb_id]
+    return stats["rows"] - stats["deleted"]
+
 
 @pytest.mark.asyncio
 async def test_full_document_flow(client: AsyncClient):
@@ -53,3 +69,352 @@ async def test_full_document_flow(client: AsyncClient):
     assert upload_resp.status_code == 200
     upload_body = upload_resp.json()
     assert upload_body["code"] == 0
+
+
+@pytest.mark.asyncio
+async def test_chunk_search_and_keyset_pagination(client: AsyncClient, db_session):
+    username = "kb_page_user"
+    password = "kb_page_password"
+
+    await client.post(
+        "/api/auth/register",
+        json={"username": username, "password": password},
+    )
+    login_resp = await client.post(
+        "/api/auth/login",
+        json={
+            "username": username,
+            "password": password,
+            "captcha_id": "",
+            "captcha_code": "",
+        },
+    )
+    token = login_resp.json()["data"]["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    kb_resp = await client.post(
+        "/api/knowledge/bases",
+        json={"name": "分页知识库"},
+        headers=headers,
+    )
+    kb_id = kb_resp.json()["data"]["id"]
+
+    # 每个标题下一个块，其中一半提到园林
+    sections = [
+        f"## 景点{i}\n\n{'拙政园是园林。' if i % 2 == 0 else '平江路是街区。'}\n"
+        for i in range(10)
+    ]
+    content = ("# 苏州\n\n" + "".join(sections)).encode("utf-8")
+    upload_resp = await client.post(
+        f"/api/knowledge/bases/{kb_id}/documents",
+        headers=headers,
+        files={"file": ("guide.md", content, "text/markdown")},
+    )
+    doc = upload_resp.json()["data"]
+
+    url = f"/api/knowledge/documents/{doc['id']}/chunks"
+    first = (
+        await client.get(url, params={"page_size": 3, "keyword": "园林"}, headers=headers)
+    ).json()["data"]
+    assert first["total"] == 5
+    assert [c["heading"] for c in first["items"]] == [
+        "苏州 > 景点0",
+        "苏州 > 景点2",
+        "苏州 > 景点4",
+    ]
+    second = (
+        await client.get(
+            url,
+            params={"page_size": 3, "keyword": "园林", "after": first["next_cursor"]},
+            headers=headers,
+        )
+    ).json()["data"]
+    assert [c["chunk_index"] for c in second["items"]] == [6, 8]
+    assert second["next_cursor"] is None
+
+    # 删除知识库在后台按批删除文档块、文档与不再被引用的提取文本，并直接删除其向量分区
+    assert kb_id in local_store.partitions()
+    text_hash = (await db_session.get(Document, doc["id"])).text_hash
+    assert text_store.exists(text_hash)
+    delete_resp = await client.delete(f"/api/knowledge/bases/{kb_id}", headers=headers)
+    job = delete_resp.json()["data"]
+    assert job["kind"] == "knowledge_base" and job["target_id"] == kb_id
+    bases = (await client.get("/api/knowledge/bases", headers=headers)).json()["data"]
+    assert kb_id not in [b["id"] for b in bases]
+
+    await delete_jobs.wait(job["id"])
+    job = (await client.get(f"/api/jobs/{job['id']}", headers=headers)).json()["data"]
+    assert job["status"] == "done"
+    assert job["deleted"] == {"chunks": 10, "documents": 1, "knowledge_bases": 1}
+    assert kb_id not in local_store.partitions()
+    assert not text_store.exists(text_hash)
+    chunks_resp = await client.get(url, headers=headers)
+    assert chunks_resp.json()["data"]["total"] == 0
+
+
+@pytest.mark.asyncio
+async def test_snapshot_export_and_import(client: AsyncClient, monkeypatch):
+    username = "kb_snapshot_user"
+    password = "kb_snapshot_password"
+
+    await client.post(
+        "/api/auth/register",
+        json={"username": username, "password": password},
+    )
+    login_resp = await client.post(
+        "/api/auth/login",
+        json={
+            "username": username,
+            "password": password,
+            "captcha_id": "",
+            "captcha_code": "",
+        },
+    )
+    token = login_resp.json()["data"]["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    kb_resp = await client.post(
+        "/api/knowledge/bases",
+        json={"name": "快照知识库", "description": "导出源"},
+        headers=headers,
+    )
+    kb_id = kb_resp.json()["data"]["id"]
+    for name in ("a.md", "b.md"):
+        content = "".join(f"## {name}段落{i}\n\n寒山寺钟声{i}。\n" for i in range(4))
+        await client.post(
+            f"/api/knowledge/bases/{kb_id}/documents",
+            params={"use_hybrid": name == "a.md"},
+            headers=headers,
+            files={"file": (name, content.encode("utf-8"), "text/markdown")},
+        )
+
+    # 每批3个块，8个块分成3个数据块
+    monkeypatch.setattr(snapshot.settings, "SNAPSHOT_BATCH_SIZE", 3)
+    export_resp = await client.get(f"/api/knowledge/bases/{kb_id}/snapshot", headers=headers)
+    assert export_resp.status_code == 200
+    data = export_resp.content
+    reader = snapshot.SnapshotReader(io.BytesIO(data))
+    assert reader.manifest["chunks"] == 8
+    assert [len(b["content"]) for b in reader.blocks()] == [3, 3, 2]
+
+    # 同名导入被拒绝，损坏的快照被拒绝
+    conflict = await client.post(
+        "/api/knowledge/bases/import",
+        headers=headers,
+        files={"file": ("kb.wlkb", data, "application/octet-stream")},
+    )
+    assert conflict.status_code == 400
+    corrupted = bytearray(data)
+    corrupted[len(corrupted) // 2] ^= 0xFF
+    bad = await client.post(
+        "/api/knowledge/bases/import",
+        headers=headers,
+        data={"name": "损坏的快照"},
+        files={"file": ("kb.wlkb", bytes(corrupted), "application/octet-stream")},
+    )
+    assert bad.status_code == 400
+    assert bad.json()["detail"] == "快照校验和不匹配"
+
+    import_resp = await client.post(
+        "/api/knowledge/bases/import",
+        headers=headers,
+        data={"name": "快照副本"},
+        files={"file": ("kb.wlkb", data, "application/octet-stream")},
+    )
+    assert import_resp.status_code == 200
+    stats = import_resp.json()["data"]
+    assert stats["kb"]["name"] == "快照副本"
+    assert stats["kb"]["description"] == "导出源"
+    assert stats["documents"] == 2 and stats["chunks"] == 8
+    assert stats["chunks_per_sec"] > 0
+    new_kb_id = stats["kb"]["id"]
+
+    async def chunks_of(kb: int) -> list[tuple]:
+        docs = (
+            await client.get(f"/api/knowledge/bases/{kb}/documents", headers=headers)
+        ).json()["data"]
+        rows = []
+        for doc in docs:
+            items = (
+                await client.get(f"/api/knowledge/documents/{doc['id']}/chunks", headers=headers)
+            ).json()["data"]["items"]
+            rows.append(
+                (doc["id"], doc["filename"], [(c["chunk_index"], c["heading"], c["content"]) for c in items])
+            )
+        return rows
+
+    source, copy = await chunks_of(kb_id), await chunks_of(new_kb_id)
+    assert [r[1:] for r in source] == [r[1:] for r in copy]
+    for (src_doc, _, src_rows), (new_doc, _, new_rows) in zip(source, copy):
+        indices = [r[0] for r in src_rows]
+        assert np.array_equal(
+            fetch_embeddings(kb_id, [src_doc] * len(indices), indices),
+            fetch_embeddings(new_kb_id, [new_doc] * len(indices), indices),
+        )
+
+    # 只有源知识库中写入关键词索引的文档在副本中也写入
+    hits = keyword_index.search("寒山寺", kb_ids=[new_kb_id], top_k=20)
+    assert len(hits) == 4 and {h["doc_id"] for h in hits} == {copy[0][0]}
+
+
+@pytest.mark.asyncio
+async def test_rechunk_reuses_unchanged_embeddings(client: AsyncClient, db_session, monkeypatch):
+    username = "kb_rechunk_user"
+    password = "kb_rechunk_password"
+
+    await client.post(
+        "/api/auth/register",
+        json={"username": username, "password": password},
+    )
+    login_resp = await client.post(
+        "/api/auth/login",
+        json={
+            "username": username,
+            "password": password,
+            "captcha_id": "",
+            "captcha_code": "",
+        },
+    )
+    token = login_resp.json()["data"]["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    kb_resp = await client.post(
+        "/api/knowledge/bases",
+        json={"name": "重新切块知识库"},
+        headers=headers,
+    )
+    kb_id = kb_resp.json()["data"]["id"]
+
+    # 三个短段落在两种切块大小下不变，一个长段落被切得更细
+    content = (
+        "## 短一\n\n网师园夜花园。\n## 短二\n\n沧浪亭。\n## 短三\n\n艺圃。\n"
+        "## 长\n\n" + "虎丘塔斜而不倒，" * 20 + "\n"
+    )
+    upload_resp = await client.post(
+        f"/api/knowledge/bases/{kb_id}/documents",
+        params={"chunk_size": 500, "chunk_overlap": 0, "use_hybrid": True},
+        headers=headers,
+        files={"file": ("rechunk.md", content.encode("utf-8"), "text/markdown")},
+    )
+    doc = upload_resp.json()["data"]
+    stored = await db_session.get(Document, doc["id"])
+    assert text_store.get(stored.text_hash)[0] == ("短一", "网师园夜花园。")
+
+    old_items = (
+        await client.get(f"/api/knowledge/documents/{doc['id']}/chunks", headers=headers)
+    ).json()["data"]["items"]
+    old_vectors = fetch_embeddings(kb_id, [doc["id"]] * 4, list(range(4)))
+
+    # 替换块时失败：旧块保留，刚写入的向量被撤销，文档恢复为可用
+    def fail_insert(*args, **kwargs):
+        raise RuntimeError("插入失败")
+
+    monkeypatch.setattr(rechunk, "insert", fail_insert)
+    with pytest.raises(RuntimeError):
+        await client.post(
+            f"/api/knowledge/documents/{doc['id']}/rechunk",
+            params={"chunk_size": 50, "chunk_overlap": 0},
+            headers=headers,
+        )
+    monkeypatch.undo()
+    items = (
+        await client.get(f"/api/knowledge/documents/{doc['id']}/chunks", headers=headers)
+    ).json()["data"]["items"]
+    assert items == old_items
+    assert np.array_equal(fetch_embeddings(kb_id, [doc["id"]] * 4, list(range(4))), old_vectors)
+    assert live_vectors(kb_id) == 4
+
+    resp = await client.post(
+        f"/api/knowledge/documents/{doc['id']}/rechunk",
+        params={"chunk_size": 50, "chunk_overlap": 0},
+        headers=headers,
+    )
+    assert resp.status_code == 200
+    stats = resp.json()["data"]
+    assert stats["document"]["id"] == doc["id"] and stats["document"]["status"] == "done"
+    assert stats["chunks"] == 7 and stats["reused"] == 3 and stats["embedded"] == 4
+
+    # 文档id不变，旧块与旧向量整体被替换，不留下旧向量
+    docs = (await client.get(f"/api/knowledge/bases/{kb_id}/documents", headers=headers)).json()["data"]
+    assert [d["id"] for d in docs] == [doc["id"]]
+    items = (
+        await client.get(
+            f"/api/knowledge/documents/{doc['id']}/chunks",
+            params={"page_size": 20},
+            headers=headers,
+        )
+    ).json()["data"]["items"]
+    assert [c["chunk_index"] for c in items] == list(range(7))
+    assert all(len(c["content"]) <= 50 for c in items)
+    vectors = fetch_embeddings(kb_id, [doc["id"]] * 7, list(range(7)))
+    expected = np.asarray(default_embedder.embed_batch([c["content"] for c in items]), dtype=np.float32)
+    assert np.allclose(vectors, expected)
+    assert live_vectors(kb_id) == 7
+
+    # 原文档写入了关键词索引，重新切块后的块同样写入
+    hits = keyword_index.search("虎丘塔", kb_ids=[kb_id], top_k=20)
+    assert len(hits) == 4 and {h["doc_id"] for h in hits} == {doc["id"]}
+    assert {(h["doc_id"], h["chunk_index"]) for h in hits} == {(doc["id"], i) for i in range(3, 7)}
+
+    # 再次切块回到原参数，全部复用向量
+    resp = await client.post(
+        f"/api/knowledge/documents/{doc['id']}/rechunk",
+        params={"chunk_size": 500, "chunk_overlap": 0},
+        headers=headers,
+    )
+    stats = resp.json()["data"]
+    assert stats["chunks"] == 4 and stats["reused"] == 3 and stats["embedded"] == 1
+    assert live_vectors(kb_id) == 4
+
+    stored = await db_session.get(Document, doc["id"])
+    await db_session.refresh(stored)
+    stored.text_hash = None
+    await db_session.commit()
+    missing = await client.post(f"/api/knowledge/documents/{doc['id']}/rechunk", headers=headers)
+    assert missing.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_delete_chunk_removes_vector(client: AsyncClient):
+    username = "kb_delete_chunk_user"
+    password = "kb_delete_chunk_password"
+
+    await client.post(
+        "/api/auth/register",
+        json={"username": username, "password": password},
+    )
+    login_resp = await client.post(
+        "/api/auth/login",
+        json={
+            "username": username,
+            "password": password,
+            "captcha_id": "",
+            "captcha_code": "",
+        },
+    )
+    token = login_resp.json()["data"]["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    kb_resp = await client.post(
+        "/api/knowledge/bases",
+        json={"name": "删除文档块知识库"},
+        headers=headers,
+    )
+    kb_id = kb_resp.json()["data"]["id"]
+    content = "## 甲\n\n留园冠云峰。\n## 乙\n\n狮子林假山。\n"
+    upload_resp = await client.post(
+        f"/api/knowledge/bases/{kb_id}/documents",
+        headers=headers,
+        files={"file": ("delete.md", content.encode("utf-8"), "text/markdown")},
+    )
+    doc_id = upload_resp.json()["data"]["id"]
+    items = (
+        await client.get(f"/api/knowledge/documents/{doc_id}/chunks", headers=headers)
+    ).json()["data"]["items"]
+
+    delete_resp = await client.delete(f"/api/knowledge/chunks/{items[0]['id']}", headers=headers)
+    assert delete_resp.status_code == 200
+    vectors = fetch_embeddings(kb_id, [doc_id, doc_id], [0, 1])
+    assert np.isnan(vectors[0]).all() and not np.isnan(vectors[1]).any()
+    hits = local_store.search(default_embedder.embed("留园冠云峰"), kb_ids=[kb_id], top_k=5)
+    assert [h["chunk_index"] for h in hits] == [1]
@@ -0,0 +1,111 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.llm_scheduler import LLMScheduler, SchedulerRejected
+
+
+def _rate_limited() -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "http://llm/v1/chat/completions")
+    return httpx.HTTPStatusError("429", request=request, response=httpx.Response(429, request=request))
+
+
+@pytest.mark.asyncio
+async def test_round_robin_between_users():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=10)
+    running = scheduler.submit(user_id=0)
+    assert running.granted
+
+    heavy = [scheduler.submit(user_id=1) for _ in range(3)]
+    light = scheduler.submit(user_id=2)
+    # 用户2只有一个请求，排在用户1的第二个请求之前
+    assert [scheduler.position(t) for t in heavy] == [0, 2, 3]
+    assert scheduler.position(light) == 1
+
+    order = []
+    current = running
+    for _ in range(4):
+        current.release(first_token_latency=0.1)
+        current = next(t for t in heavy + [light] if t.granted and not t.released)
+        order.append(current.user_id)
+    assert order == [1, 2, 1, 1]
+
+
+@pytest.mark.asyncio
+async def test_fast_rejection_and_queue_timeout():
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=1, queue_timeout=0.05)
+    running = scheduler.submit(user_id=1)
+    waiting = scheduler.submit(user_id=2)
+    with pytest.raises(SchedulerRejected) as exc:
+        scheduler.submit(user_id=3)
+    assert exc.value.reason == "queue_full"
+
+    positions = []
+    with pytest.raises(SchedulerRejected) as exc:
+        async for position in waiting.wait(interval=0.01):
+            positions.append(position)
+    assert exc.value.reason == "timeout" and positions == [0]
+    assert scheduler.queued == 0
+
+    # 按平均占用时长估算等待超过时限时不进入队列
+    scheduler._hold_time = 10.0
+    with pytest.raises(SchedulerRejected) as exc:
+        scheduler.submit(user_id=3)
+    assert exc.value.reason == "wait_too_long"
+    running.release()
+
+
+@pytest.mark.asyncio
+async def test_single_fast_outlier_does_not_collapse_limit():
+    scheduler = LLMScheduler(max_concurrency=8, min_concurrency=1)
+    for latency in [0.5] * 20 + [0.05] + [0.5] * 200:
+        scheduler._last_decrease = 0.0
+        scheduler.submit(user_id=0).release(first_token_latency=latency)
+    assert scheduler.limit == 8
+    assert scheduler.baseline_latency == 0.5
+
+    # 异常值是第一个样本时同样不影响
+    scheduler = LLMScheduler(max_concurrency=8, min_concurrency=1)
+    for latency in [0.05] + [0.5] * 200:
+        scheduler._last_decrease = 0.0
+        scheduler.submit(user_id=0).release(first_token_latency=latency)
+    assert scheduler.limit == 8
+
+    # 延迟持续升高时先减小并发上限，窗口滑过后以新的延迟为基准
+    for _ in range(30):
+        scheduler._last_decrease = 0.0
+        scheduler.submit(user_id=0).release(first_token_latency=2.0)
+    assert scheduler.limit < 2
+    for _ in range(100):
+        scheduler.submit(user_id=0).release(first_token_latency=2.0)
+    assert scheduler.baseline_latency == 2.0 and scheduler.limit == 8
+
+
+@pytest.mark.asyncio
+async def test_adaptive_limit_on_429_and_latency():
+    scheduler = LLMScheduler(max_concurrency=8, min_concurrency=1)
+    tickets = [scheduler.submit(user_id=i) for i in range(4)]
+    tickets[0].release(error=_rate_limited())
+    assert scheduler.limit == 4
+    # 同一轮拥塞中的其他429不重复减小
+    tickets[1].release(error=_rate_limited())
+    assert scheduler.limit == 4
+
+    scheduler._last_decrease = 0.0
+    tickets[2].release(first_token_latency=0.1)
+    assert scheduler.limit == pytest.approx(4.25)
+    # 样本足够后，首token延迟超过基准的latency_tolerance倍时减小
+    scheduler._latencies.extend([0.1] * 10)
+    tickets[3].release(first_token_latency=1.0)
+    assert scheduler.limit == pytest.approx(4.25 * 0.9)
+    assert scheduler.inflight == 0
+
+    # 排队中断开的请求离开队列，不占用名额
+    scheduler = LLMScheduler(max_concurrency=1)
+    running = scheduler.submit(user_id=1)
+    waiting = scheduler.submit(user_id=2)
+    waiting.release()
+    running.release()
+    assert scheduler.queued == 0 and scheduler.inflight == 0
+    await asyncio.sleep(0)
@@ -0,0 +1,61 @@
+import pytest
+from httpx import AsyncClient
+
+from app.config import get_settings
+from app.metrics import Histogram
+
+
+def test_histogram_renders_cumulative_buckets():
+    hist = Histogram("demo_seconds", "示例", ("stage",), buckets=(0.1, 1.0))
+    hist.observe(0.05, "a")
+    hist.observe(0.5, "a")
+    hist.observe(5.0, "a")
+    lines = hist.render()
+    assert 'demo_seconds_bucket{stage="a",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{stage="a",le="1.0"} 2' in lines
+    assert 'demo_seconds_bucket{stage="a",le="+Inf"} 3' in lines
+    assert 'demo_seconds_count{stage="a"} 3' in lines
+
+
+@pytest.mark.asyncio
+async def test_chat_stages_exported(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(get_settings(), "SERVER_TIMING", True)
+    await client.post(
+        "/api/auth/register",
+        json={"username": "metrics_user", "password": "metrics_password"},
+    )
+    login_resp = await client.post(
+        "/api/auth/login",
+        json={
+            "username": "metrics_user",
+            "password": "metrics_password",
+            "captcha_id": "",
+            "captcha_code": "",
+        },
+    )
+    headers = {"Authorization": f"Bearer {login_resp.json()['data']['token']}"}
+    session_resp = await client.post(
+        "/api/chat/sessions",
+        json={"name": "指标会话"},
+        headers=headers,
+    )
+    chat_resp = await client.post(
+        "/api/chat/stream",
+        json={
+            "session_id": session_resp.json()["data"]["id"],
+            "kb_ids": [],
+            "question": "测试问题",
+        },
+        headers=headers,
+    )
+    assert chat_resp.status_code == 200
+    server_timing = chat_resp.headers["server-timing"]
+    assert "session;dur=" in server_timing
+    assert "embedding;dur=" in server_timing
+
+    metrics_resp = await client.get("/api/metrics")
+    assert metrics_resp.status_code == 200
+    text = metrics_resp.text
+    for stage in ("session", "history", "embedding", "llm_first_token", "persist"):
+        assert f'rag_stage_duration_seconds_count{{pipeline="chat",stage="{stage}"}}' in text
+    assert 'route="/api/chat/stream"' in text
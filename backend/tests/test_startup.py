@@ -0,0 +1,71 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app.main import create_app
+from app.models import ChatMessage, ChatSession, KnowledgeBase, User
+from app.services.warmup import warmup
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _paths(role: str) -> set[str]:
+    return {route.path for route in create_app(role).routes}
+
+
+def test_worker_roles_mount_routers():
+    chat_paths = _paths("chat")
+    ingest_paths = _paths("ingest")
+    assert "/api/chat/stream" in chat_paths and "/api/knowledge/bases" not in chat_paths
+    assert "/api/knowledge/bases" in ingest_paths and "/api/chat/stream" not in ingest_paths
+    for paths in (chat_paths, ingest_paths):
+        assert "/api/auth/login" in paths and "/api/jobs/{job_id}" in paths
+    with pytest.raises(ValueError):
+        create_app("worker")
+
+
+def test_heavy_dependencies_load_lazily():
+    code = (
+        "import sys, app.main; "
+        "print(','.join(m for m in ('PyPDF2', 'docx', 'pptx', 'captcha', 'PIL', 'pymilvus') "
+        "if m in sys.modules))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=BASE_DIR,
+        env={**os.environ, "TESTING": "1", "PYTHONWARNINGS": "ignore"},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert out.stdout.strip() == ""
+
+
+@pytest.mark.asyncio
+async def test_ready_after_warmup(client, db_session, monkeypatch):
+    user = User(username="warmup_user", password_hash="x")
+    db_session.add(user)
+    await db_session.commit()
+    db_session.add(KnowledgeBase(name="预热知识库", created_by=user.id))
+    session = ChatSession(user_id=user.id, name="预热")
+    db_session.add(session)
+    await db_session.commit()
+    for question in ("拙政园门票", "留园开放时间", "拙政园门票"):
+        db_session.add(ChatMessage(session_id=session.id, role="user", content=question))
+    await db_session.commit()
+
+    monkeypatch.setattr(warmup, "questions", 2)
+    warmup.reset()
+    assert (await client.get("/api/health/live")).status_code == 200
+    assert (await client.get("/api/health/ready")).status_code == 503
+
+    await warmup.run("chat")
+    resp = await client.get("/api/health/ready")
+    assert resp.status_code == 200
+    steps = resp.json()["data"]["steps"]
+    assert set(steps) == {"database", "vectors", "captcha", "keyword_index", "embedding", "replay"}
+    assert all(status.startswith("ok") for status in steps.values())
+    assert steps["replay"] == "ok: 2" and "ok: " in steps["embedding"]
+    assert "warmup_duration_seconds " in (await client.get("/api/metrics")).text
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from app.services.stream_buffer import StreamRegistry, format_event, parse_event_id
+
+
+def test_event_encoding():
+    assert format_event("第一行\n第二行", event_id="abc-3") == "id: abc-3\ndata: 第一行\ndata: 第二行\n\n"
+    assert parse_event_id("abc-3") == ("abc", 3)
+    assert parse_event_id("abc") is None and parse_event_id(None) is None
+
+
+@pytest.mark.asyncio
+async def test_resume_and_grace_cancel():
+    registry = StreamRegistry(grace=0.05)
+    release = asyncio.Event()
+    cancelled = []
+
+    async def produce(buffer):
+        buffer.publish("甲")
+        buffer.publish("乙")
+        try:
+            await release.wait()
+        except asyncio.CancelledError:
+            cancelled.append(buffer.id)
+            raise
+        buffer.publish("[DONE]")
+
+    buffer = registry.start(1, produce)
+    reader = buffer.read(0, registry.grace)
+    assert await reader.__anext__() == f"id: {buffer.id}-1\ndata: 甲\n\n"
+    await reader.aclose()
+
+    # 宽限期内重连：从第1条之后续传，生成继续
+    assert registry.get(buffer.id, user_id=2) is None
+    resumed = registry.get(buffer.id, user_id=1).read(1, registry.grace)
+    assert await resumed.__anext__() == f"id: {buffer.id}-2\ndata: 乙\n\n"
+    await asyncio.sleep(0.1)
+    assert not cancelled
+    release.set()
+    assert [frame async for frame in resumed] == [f"id: {buffer.id}-3\ndata: [DONE]\n\n"]
+
+    # 断开后宽限期内无人重连时取消生成
+    release.clear()
+    buffer = registry.start(1, produce)
+    reader = buffer.read(0, registry.grace)
+    await reader.__anext__()
+    await reader.aclose()
+    await asyncio.sleep(0.1)
+    assert cancelled == [buffer.id] and buffer.done
+
+
+@pytest.mark.asyncio
+async def test_finished_streams_expire():
+    registry = StreamRegistry(max_streams=2, ttl=60)
+
+    async def produce(buffer):
+        buffer.publish("[DONE]")
+
+    first = registry.start(1, produce)
+    await first.task
+    second = registry.start(1, produce)
+    await second.task
+    third = registry.start(1, produce)
+    assert registry.get(first.id, 1) is None and registry.get(second.id, 1) is second
+    await third.task
+
+    registry.ttl = 0
+    await asyncio.sleep(0.01)
+    assert registry.get(second.id, 1) is None and len(registry) == 0
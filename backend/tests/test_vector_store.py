@@ -0,0 +1,202 @@
+import threading
+
+import numpy as np
+
+from app.services.vector_store import LocalVectorStore, PartitionedVectorStore
+
+
+def _clustered(n: int, dim: int = 32, clusters: int = 50, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    data = centers[rng.integers(clusters, size=n)] + 0.3 * rng.normal(size=(n, dim))
+    return (data / np.linalg.norm(data, axis=1, keepdims=True)).astype(np.float32)
+
+
+def _add(store: LocalVectorStore, data: np.ndarray, kb_id: int = 1, doc_id: int = 1) -> None:
+    store.add(kb_id, doc_id, range(len(data)), data)
+
+
+def test_exact_search_and_kb_filter():
+    store = LocalVectorStore(index_min_rows=10_000)
+    data = _clustered(500)
+    _add(store, data[:300], kb_id=1, doc_id=1)
+    _add(store, data[300:], kb_id=2, doc_id=2)
+
+    hits = store.search(data[42], top_k=3)
+    assert hits[0]["doc_id"] == 1 and hits[0]["chunk_index"] == 42
+    assert [h["score"] for h in hits] == sorted((h["score"] for h in hits), reverse=True)
+
+    hits = store.search(data[42], kb_ids=[2], top_k=5)
+    assert len(hits) == 5 and all(h["kb_id"] == 2 for h in hits)
+    assert store.search(data[0], kb_ids=[3]) == []
+
+
+def test_ivf_recall_and_incremental_add():
+    data = _clustered(6000)
+    queries = _clustered(50, seed=1)
+    store = LocalVectorStore(index_min_rows=2000, background_rebuild=False)
+    for start in range(0, 4000, 500):
+        _add(store, data[start : start + 500], doc_id=start)
+    assert store._index is not None and store._index.n_indexed == 4000
+
+    exact = LocalVectorStore(index_min_rows=10**9)
+    _add(exact, data[:4000])
+    total = found = 0
+    for q in queries:
+        truth = {h["chunk_index"] for h in exact.search(q, top_k=10)}
+        got = {h["doc_id"] + h["chunk_index"] for h in store.search(q, top_k=10, nprobe=8)}
+        total += len(truth)
+        found += len(truth & got)
+    assert found / total >= 0.9
+
+    # 索引之后新增的向量无需重新训练即可检索到
+    _add(store, data[4000:4001], doc_id=99)
+    assert store.search(data[4000], top_k=1)[0]["doc_id"] == 99
+
+
+def test_search_during_concurrent_add():
+    data = _clustered(6000)
+    for kb_ids in (None, [1]):
+        store = LocalVectorStore(index_min_rows=1000, background_rebuild=False)
+        _add(store, data[:1000])
+        index = store._index
+        probe = index.probe
+
+        def probe_while_writing(query, nprobe):
+            # 在检索取得快照之后、探查之前由另一个线程写入：新行已进入倒排列表，
+            # 写入中的扩容也替换了行数组
+            index.probe = probe
+            writer = threading.Thread(target=_add, args=(store, data[1000:]), kwargs={"doc_id": 2})
+            writer.start()
+            writer.join()
+            return probe(query, nprobe)
+
+        index.probe = probe_while_writing
+        hits = store.search(data[1000], kb_ids=kb_ids, top_k=10, nprobe=4)
+        assert hits and all(h["doc_id"] == 1 and h["chunk_index"] < 1000 for h in hits)
+        assert store.search(data[1000], kb_ids=kb_ids, top_k=1)[0]["doc_id"] == 2
+
+
+def test_persistence_roundtrip(tmp_path):
+    data = _clustered(1500)
+    store = LocalVectorStore(tmp_path, index_min_rows=1000, background_rebuild=False)
+    _add(store, data[:1200])
+    _add(store, data[1200:], doc_id=2)
+    expected = store.search(data[7], top_k=5, nprobe=4)
+
+    reloaded = LocalVectorStore(tmp_path, index_min_rows=1000, background_rebuild=False)
+    assert len(reloaded) == 1500
+    assert reloaded._index is not None and reloaded._index.n_indexed == 1500
+    assert reloaded.search(data[7], top_k=5, nprobe=4) == expected
+
+    # 模拟写入中断：只写入了部分向量文件，加载时截断到完整的行
+    with (tmp_path / "vectors.f32").open("ab") as f:
+        f.write(b"\x00" * 10)
+    assert len(LocalVectorStore(tmp_path, index_min_rows=1000)) == 1500
+
+
+def test_delete_writes_tombstones(tmp_path):
+    data = _clustered(1500)
+    for index_min_rows in (1000, 10_000):
+        path = tmp_path / str(index_min_rows)
+        store = LocalVectorStore(path, index_min_rows=index_min_rows, background_rebuild=False)
+        _add(store, data[:1200], doc_id=1)
+        _add(store, data[1200:], doc_id=2)
+
+        assert store.delete(1, range(10)) == 10
+        assert store.delete(1, range(10)) == 0
+        assert store.delete(2) == 300
+        assert len(store) == 1190
+        for kb_ids in (None, [1]):
+            hits = store.search(data[5], kb_ids=kb_ids, top_k=10, nprobe=8)
+            assert hits and all(h["doc_id"] == 1 and h["chunk_index"] >= 10 for h in hits)
+        vectors = store.fetch([1, 1, 2], [5, 20, 0])
+        assert np.isnan(vectors[[0, 2]]).all() and np.allclose(vectors[1], data[20])
+
+        reloaded = LocalVectorStore(path, index_min_rows=index_min_rows, background_rebuild=False)
+        assert len(reloaded) == 1190
+        assert reloaded.search(data[5], top_k=10, nprobe=64) == store.search(data[5], top_k=10, nprobe=64)
+        # 删除后重新写入同一键，只有新写入的向量生效
+        _add(reloaded, data[1200:1201], doc_id=2)
+        assert np.allclose(reloaded.fetch([2], [0])[0], data[1200])
+
+
+def _recall(store: LocalVectorStore, exact: LocalVectorStore, queries: np.ndarray) -> float:
+    total = found = 0
+    for q in queries:
+        truth = {h["chunk_index"] for h in exact.search(q, top_k=10)}
+        got = {h["chunk_index"] for h in store.search(q, top_k=10)}
+        total += len(truth)
+        found += len(truth & got)
+    return found / total
+
+
+def test_compressed_codecs_recall_and_memory():
+    data = _clustered(3000, dim=64)
+    queries = _clustered(30, dim=64, seed=1)
+    exact = LocalVectorStore(index_min_rows=10**9)
+    _add(exact, data)
+    for codec in ("int8", "pq"):
+        store = LocalVectorStore(
+            index_min_rows=2000, nlist=8, nprobe=8, codec=codec, pq_subvectors=16,
+            background_rebuild=False,
+        )  # fmt: skip
+        _add(store, data)
+        stats = store.memory_stats()
+        assert stats["codec"] == codec
+        assert stats["bytes_per_vector"] == (64 if codec == "int8" else 16)
+        assert stats["codes_bytes"] == 3000 * stats["bytes_per_vector"]
+        # 精确重排弥补量化误差
+        assert _recall(store, exact, queries) >= 0.9
+        store.rerank = 0
+        assert _recall(store, exact, queries) >= (0.9 if codec == "int8" else 0.4)
+
+
+def test_pq_persistence_roundtrip(tmp_path):
+    data = _clustered(1500, dim=64)
+    store = LocalVectorStore(
+        tmp_path, index_min_rows=1000, nlist=8, codec="pq", pq_subvectors=16,
+        background_rebuild=False,
+    )  # fmt: skip
+    _add(store, data[:1200])
+    _add(store, data[1200:], doc_id=2)
+    expected = store.search(data[7], top_k=5)
+    assert store.memory_stats()["float_bytes"] == 0
+
+    # 已有向量库沿用记录的编码，忽略构造参数
+    reloaded = LocalVectorStore(tmp_path, index_min_rows=1000, codec="int8", background_rebuild=False)
+    assert reloaded.memory_stats()["codec"] == "pq"
+    assert reloaded.search(data[7], top_k=5) == expected
+    assert [p.name for p in tmp_path.glob("codes.*.bin")] == ["codes.1.bin"]
+
+
+def test_partitions_search_and_drop(tmp_path):
+    data = _clustered(900)
+    store = PartitionedVectorStore(tmp_path, index_min_rows=10_000)
+    for kb_id in (1, 2, 3):
+        _add(store, data[(kb_id - 1) * 300 : kb_id * 300], kb_id=kb_id, doc_id=kb_id)
+    assert store.partitions() == [1, 2, 3] and len(store) == 900
+
+    hits = store.search(data[310], kb_ids=[2, 3], top_k=5)
+    assert hits[0]["kb_id"] == 2 and hits[0]["chunk_index"] == 10
+    assert {h["kb_id"] for h in hits} <= {2, 3}
+    assert store.search(data[310], kb_ids=[4]) == []
+
+    store.drop_partition(2)
+    assert not (tmp_path / "kb_2").exists()
+    reloaded = PartitionedVectorStore(tmp_path, index_min_rows=10_000)
+    assert reloaded.partitions() == [1, 3] and len(reloaded) == 600
+    assert all(h["kb_id"] != 2 for h in reloaded.search(data[310], top_k=10))
+
+
+def test_migrate_legacy_layout(tmp_path):
+    data = _clustered(600)
+    legacy = LocalVectorStore(tmp_path, index_min_rows=10_000)
+    _add(legacy, data[:200], kb_id=1, doc_id=1)
+    _add(legacy, data[200:], kb_id=2, doc_id=2)
+
+    store = PartitionedVectorStore(tmp_path, index_min_rows=10_000)
+    assert store.partitions() == [1, 2] and len(store) == 600
+    assert not (tmp_path / "vectors.f32").exists()
+    hit = store.search(data[250], kb_ids=[2], top_k=1)[0]
+    assert (hit["kb_id"], hit["doc_id"], hit["chunk_index"]) == (2, 2, 50)
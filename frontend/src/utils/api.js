@@ -53,59 +53,99 @@ export const apiClient = {
   }
 };
 
-export async function apiStream(url, data, onToken) {
-  const fullUrl = `${baseURL}${url}`;
-  const auth = useAuthStore();
-  const headers = { "Content-Type": "application/json" };
-  if (auth.token) {
-    headers.Authorization = `Bearer ${auth.token}`;
-  }
-  const response = await fetch(fullUrl, {
-    method: "POST",
-    headers,
-    body: JSON.stringify(data)
-  });
+// 断线后携带 Last-Event-ID 重连的最大次数与首次等待（毫秒，逐次翻倍）
+const STREAM_RETRIES = 3;
+const STREAM_RETRY_DELAY = 1000;
 
-  if (!response.ok) {
-    throw new Error(`服务异常：${response.status}`);
+// 解析一条 SSE 事件：data 行按换行拼接，冒号后的一个空格不属于数据
+function parseEvent(block) {
+  const event = { id: null, event: "message", data: [] };
+  for (const line of block.split("\n")) {
+    const index = line.indexOf(":");
+    const field = index === -1 ? line : line.slice(0, index);
+    let value = index === -1 ? "" : line.slice(index + 1);
+    if (value.startsWith(" ")) value = value.slice(1);
+    if (field === "data") event.data.push(value);
+    else if (field === "id") event.id = value;
+    else if (field === "event") event.event = value;
   }
+  return { ...event, data: event.data.join("\n") };
+}
+
+export async function apiStream(url, data, onToken, onQueue) {
+  const fullUrl = `${baseURL}${url}`;
+  const auth = useAuthStore();
+  let lastEventId = null;
+  let hasToken = false;
 
-  // 非流式或环境不支持 ReadableStream 时，整体读取一次
-  if (!response.body || !response.body.getReader) {
-    const text = await response.text();
-    if (onToken && text) {
-      onToken(text);
+  for (let attempt = 0; ; attempt++) {
+    const headers = { "Content-Type": "application/json" };
+    if (auth.token) {
+      headers.Authorization = `Bearer ${auth.token}`;
     }
-    return;
-  }
+    if (lastEventId) {
+      headers["Last-Event-ID"] = lastEventId;
+    }
+    let buffer = "";
+    try {
+      const response = await fetch(fullUrl, {
+        method: "POST",
+        headers,
+        body: JSON.stringify(data)
+      });
 
-  const reader = response.body.getReader();
-  const decoder = new TextDecoder("utf-8");
-  let buffer = "";
-  let hasToken = false;
+      if (!response.ok) {
+        throw Object.assign(new Error(`服务异常：${response.status}`), { fatal: true });
+      }
 
-  while (true) {
-    const { done, value } = await reader.read();
-    if (done) break;
-    buffer += decoder.decode(value, { stream: true });
-    const parts = buffer.split(/\n\n/);
-    buffer = parts.pop() || "";
-    for (const part of parts) {
-      const line = part.trim();
-      if (!line.startsWith("data:")) continue;
-      const content = line.replace(/^data:\s*/, "");
-      if (content === "[DONE]") {
+      // 非流式或环境不支持 ReadableStream 时，整体读取一次
+      if (!response.body || !response.body.getReader) {
+        const text = await response.text();
+        if (onToken && text) {
+          onToken(text);
+        }
         return;
       }
-      hasToken = true;
-      if (onToken) {
-        onToken(content);
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder("utf-8");
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const parts = buffer.split(/\n\n/);
+        buffer = parts.pop() || "";
+        for (const part of parts) {
+          const event = parseEvent(part);
+          if (event.id) lastEventId = event.id;
+          if (event.event === "queue") {
+            if (onQueue) onQueue(JSON.parse(event.data).position);
+            continue;
+          }
+          if (event.data === "[DONE]") {
+            return;
+          }
+          hasToken = true;
+          if (onToken) {
+            onToken(event.data);
+          }
+        }
       }
+    } catch (err) {
+      // 网络中断：已收到事件时凭 Last-Event-ID 续传，服务端从缓冲继续输出，不重新生成
+      if (err.fatal || !lastEventId || attempt >= STREAM_RETRIES) throw err;
+      await new Promise((resolve) => setTimeout(resolve, STREAM_RETRY_DELAY * 2 ** attempt));
+      continue;
     }
-  }
 
-  // 如果没有收到任何 token，但响应有文本内容，作为兜底展示
-  if (!hasToken && buffer && onToken) {
-    onToken(buffer);
+    // 连接在 [DONE] 之前正常结束（如代理超时），同样尝试续传
+    if (lastEventId && attempt < STREAM_RETRIES) {
+      continue;
+    }
+    // 如果没有收到任何 token，但响应有文本内容，作为兜底展示
+    if (!hasToken && buffer && onToken) {
+      onToken(buffer);
+    }
+    return;
   }
 }